@@ -0,0 +1,202 @@
+"""
+Orchestration benchmarks for lm_batch_runner against the mock LM Studio server.
+
+Measures what the batch loop itself costs, without real models:
+
+  ops      time and HTTP calls per _load_model, _poll_loading, _unload_model,
+           _force_unload_all and _generate call
+  scaling  whole BatchRunner.run() over 1…N models and 1…N prompts, reporting
+           wall-clock overhead per model (wall time minus time the mock spent
+           generating) and HTTP calls per model
+
+    python benchmarks/bench_batch.py                       # ops + default scaling
+    python benchmarks/bench_batch.py scaling --models 1,10,100,500 --prompts 1
+    python benchmarks/bench_batch.py ops --repeat 50 --json results.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lm_batch_runner import BatchConfig, BatchEvents, BatchRunner, LMStudioClient  # noqa: E402
+from mock_lmstudio import MockLMStudio, MockSettings, mock_models  # noqa: E402
+
+
+def make_runner(mock: MockLMStudio, models: list[str], prompts: list[dict], output_folder: str,
+                **overrides) -> BatchRunner:
+    config = BatchConfig(models=models, prompts=prompts, output_folder=output_folder,
+                         server_url=mock.url, delay=0, cache_path=None, journal=False,
+                         # Keep mock runs out of the user's results store, load profiles and warm-model state
+                         results_db=None, load_profiles_path=None, residency_path=None)
+    for key, value in overrides.items():
+        setattr(config, key, value)
+    return BatchRunner(config, client=LMStudioClient(mock.url), events=BatchEvents())
+
+
+def make_prompts(count: int) -> list[dict]:
+    return [{"id": f"p{i + 1:03d}", "system": None, "prompt": f"Benchmark prompt {i + 1}"} for i in range(count)]
+
+
+# ──────────────────────────────────────────────
+#  Per-operation benchmarks
+# ──────────────────────────────────────────────
+def bench_ops(settings: MockSettings, repeat: int) -> list[dict]:
+    """Time each runner API helper in isolation, `repeat` times."""
+    results = []
+    settings.models = mock_models(2)
+    model_a, model_b = list(settings.models)
+    with MockLMStudio(settings) as mock, tempfile.TemporaryDirectory() as out:
+        runner = make_runner(mock, [model_a], make_prompts(1), out)
+        payload = runner._build_payload(model_a, None, "Benchmark prompt")
+
+        def measure(name: str, setup, op):
+            times, calls = [], []
+            for _ in range(repeat):
+                setup()
+                mock.reset_counters()
+                start = time.perf_counter()
+                op()
+                times.append(time.perf_counter() - start)
+                calls.append(mock.total_calls)
+            busy = mock.busy["load"] + mock.busy["unload"] + mock.busy["chat"]
+            results.append(summarize(name, times, calls, busy))
+
+        def ensure_empty():
+            runner._force_unload_all()
+
+        def ensure_loaded():
+            if not mock.is_loaded(model_a):
+                runner._load_model(model_a)
+
+        def load_then_poll():
+            runner.client.load(model_a)
+            runner._poll_loading(model_a)
+
+        measure("_load_model (empty server)", ensure_empty, lambda: runner._load_model(model_a))
+        measure("_load_model (clears resident)", lambda: runner._load_model(model_b),
+                lambda: runner._load_model(model_a))
+        measure("_poll_loading", ensure_empty, load_then_poll)
+        measure("_unload_model", ensure_loaded, lambda: runner._unload_model(model_a))
+        measure("_force_unload_all (1 resident)", ensure_loaded, runner._force_unload_all)
+        measure("_force_unload_all (none resident)", ensure_empty, runner._force_unload_all)
+        measure("_generate", ensure_loaded, lambda: runner._generate(model_a, payload, 60))
+        runner.config.stream = True
+        measure("_generate (stream)", ensure_loaded, lambda: runner._generate(model_a, payload, 60))
+        runner._force_unload_all()
+        runner.client.close()
+    return results
+
+
+def summarize(name: str, times: list[float], calls: list[int], busy: float) -> dict:
+    times = sorted(times)
+    n = len(times)
+    return {
+        "name": name,
+        "runs": n,
+        "mean_ms": 1000 * sum(times) / n,
+        "p50_ms": 1000 * times[n // 2],
+        "max_ms": 1000 * times[-1],
+        "overhead_ms": 1000 * max(0.0, sum(times) - busy) / n,
+        "http_calls": sum(calls) / n,
+    }
+
+
+# ──────────────────────────────────────────────
+#  Batch scaling benchmarks
+# ──────────────────────────────────────────────
+def bench_batch(settings: MockSettings, n_models: int, n_prompts: int, **overrides) -> dict:
+    settings.models = mock_models(n_models)
+    with MockLMStudio(settings) as mock, tempfile.TemporaryDirectory() as out:
+        runner = make_runner(mock, list(settings.models), make_prompts(n_prompts), out, **overrides)
+        start = time.perf_counter()
+        summary = runner.run()
+        wall = time.perf_counter() - start
+        runner.client.close()
+        served = mock.busy["chat"]
+        calls = dict(mock.calls)
+    overhead = max(0.0, wall - served)
+    return {
+        "models": n_models,
+        "prompts": n_prompts,
+        "done": summary["done"],
+        "wall_s": wall,
+        "generation_s": served,
+        "overhead_s": overhead,
+        "overhead_per_model_ms": 1000 * overhead / n_models,
+        "overhead_per_cell_ms": 1000 * overhead / (n_models * n_prompts),
+        "http_calls": sum(calls.values()),
+        "http_calls_per_model": sum(calls.values()) / n_models,
+        "calls_by_endpoint": calls,
+        "pipeline": summary.get("pipeline"),
+    }
+
+
+def print_table(rows: list[dict], columns: list[tuple[str, str, str]]):
+    """columns: (title, row key, format spec starting with < or > and the width)."""
+    widths = [int(fmt[1:].split(".")[0]) for _, _, fmt in columns]
+    header = "  ".join(f"{title:{fmt[0]}{width}}" for (title, _, fmt), width in zip(columns, widths))
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print("  ".join(format(row[key], fmt) for _, key, fmt in columns))
+
+
+def parse_counts(text: str) -> list[int]:
+    return [int(x) for x in text.split(",") if x.strip()]
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark lm_batch_runner orchestration overhead against a mock server.")
+    parser.add_argument("suite", nargs="?", choices=["all", "ops", "scaling"], default="all")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per operation benchmark")
+    parser.add_argument("--models", default="1,10,100", help="Model counts for the scaling run (e.g. 1,10,100,500)")
+    parser.add_argument("--prompts", default="1,10,100", help="Prompt counts for the scaling run, against one model")
+    parser.add_argument("--load-latency", type=float, default=0.0)
+    parser.add_argument("--state-lag", type=float, default=0.0, help="Delay before the mock reports a load/unload")
+    parser.add_argument("--token-rate", type=float, default=0.0, help="Mock decode speed; 0 = instant")
+    parser.add_argument("--completion-tokens", type=int, default=16)
+    parser.add_argument("--stream", action="store_true", help="Use streaming for the scaling runs")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--fixed-waits", action="store_true", help="Benchmark the fixed-sleep path instead")
+    parser.add_argument("--json", metavar="PATH", help="Also write all results to a JSON file")
+    args = parser.parse_args(argv)
+
+    def settings() -> MockSettings:
+        return MockSettings(load_latency=args.load_latency, state_lag=args.state_lag,
+                            token_rate=args.token_rate, completion_tokens=args.completion_tokens, seed=0)
+
+    report = {}
+    if args.suite in ("all", "ops"):
+        print(f"\nPer-operation cost ({args.repeat} runs each)\n")
+        report["ops"] = bench_ops(settings(), args.repeat)
+        print_table(report["ops"], [("operation", "name", "<34"), ("mean ms", "mean_ms", ">9.2f"),
+                                    ("p50 ms", "p50_ms", ">9.2f"), ("max ms", "max_ms", ">9.2f"),
+                                    ("overhead ms", "overhead_ms", ">11.2f"), ("HTTP", "http_calls", ">6.1f")])
+
+    if args.suite in ("all", "scaling"):
+        overrides = {"stream": args.stream, "concurrency": args.concurrency, "adaptive_waits": not args.fixed_waits}
+        runs = [(n, 1) for n in parse_counts(args.models)] + [(1, n) for n in parse_counts(args.prompts)]
+        report["scaling"] = []
+        print("\nBatch scaling (wall time minus mock generation time = orchestration overhead)\n")
+        for n_models, n_prompts in runs:
+            report["scaling"].append(bench_batch(settings(), n_models, n_prompts, **overrides))
+        print_table(report["scaling"], [("models", "models", "<6"), ("prompts", "prompts", ">7"),
+                                        ("wall s", "wall_s", ">9.2f"), ("gen s", "generation_s", ">8.2f"),
+                                        ("overhead/model ms", "overhead_per_model_ms", ">17.1f"),
+                                        ("overhead/cell ms", "overhead_per_cell_ms", ">16.1f"),
+                                        ("HTTP/model", "http_calls_per_model", ">10.1f")])
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,325 @@
+"""
+Mock LM Studio server for benchmarks and offline development.
+
+Speaks just enough of the LM Studio REST API for lm_batch_runner:
+/api/v0/models, /api/v1/models, /api/v1/models/load, /api/v1/models/unload
+and /v1/chat/completions (plain and SSE streaming). Load latency, state lag,
+token rate and failure rates are configurable, and every HTTP call is
+counted per endpoint so benchmarks can report request overhead.
+
+    python benchmarks/mock_lmstudio.py --port 1234 --models 5 --load-latency 2
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+@dataclass
+class MockSettings:
+    models: dict[str, int] = field(default_factory=lambda: {"mock-model-1": 1 << 30})  # id -> size_bytes
+    load_latency: float = 0.0           # seconds the load request blocks
+    unload_latency: float = 0.0         # seconds the unload request blocks
+    state_lag: float = 0.0              # delay before /api/v0/models reflects a load/unload
+    ttft: float = 0.0                   # prompt processing time before the first token
+    prompt_rate: float = 0.0            # prompt chars/s on top of ttft; the prefix shared with the
+                                        # model's previous request is cached and free. 0 = instant
+    token_rate: float = 0.0             # tokens/s while decoding; 0 = instant
+    completion_tokens: int = 16         # tokens per response
+    load_fail_rate: float = 0.0         # probability a load returns HTTP 500
+    chat_fail_rate: float = 0.0         # probability a chat completion returns HTTP 500
+    loop_rate: float = 0.0              # probability a generation loops: 100× completion_tokens
+    unload_ignore_rate: float = 0.0     # probability an unload is acknowledged but not applied
+    max_context_length: int | None = None  # loads asking for more context (or the default) fail with HTTP 500
+    default_context_length: int = 32768
+    seed: int | None = None
+
+
+def mock_models(count: int, size_bytes: int = 1 << 30) -> dict[str, int]:
+    return {f"mock-model-{i + 1:03d}": size_bytes for i in range(count)}
+
+
+class MockLMStudio:
+    """In-process LM Studio stand-in on a background thread.
+
+    Use as a context manager; `url` is the server URL to hand to
+    LMStudioClient/BatchConfig. `calls` counts requests per endpoint and
+    `busy` sums the time spent inside load, unload and chat handlers."""
+
+    def __init__(self, settings: MockSettings | None = None, port: int = 0):
+        self.settings = settings or MockSettings()
+        self._rng = random.Random(self.settings.seed)
+        self._lock = threading.Lock()
+        self._loaded: dict[str, float] = {}     # model -> time it becomes visible as loaded
+        self._unloading: dict[str, float] = {}  # model -> time it stops being visible
+        self._last_prompt: dict[str, str] = {}   # model -> prompt text of its previous request (prefix cache)
+        self.calls: dict[str, int] = {}
+        self.busy: dict[str, float] = {"load": 0.0, "unload": 0.0, "chat": 0.0}
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockLMStudio":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-lmstudio", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reset_counters(self):
+        with self._lock:
+            self.calls.clear()
+            self.busy = dict.fromkeys(self.busy, 0.0)
+
+    @property
+    def total_calls(self) -> int:
+        with self._lock:
+            return sum(self.calls.values())
+
+    # ── server state ─────────────────────────────
+    def _count(self, endpoint: str):
+        with self._lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+
+    def _add_busy(self, kind: str, seconds: float):
+        with self._lock:
+            self.busy[kind] += seconds
+
+    def _roll(self, rate: float) -> bool:
+        if rate <= 0:
+            return False
+        with self._lock:
+            return self._rng.random() < rate
+
+    def is_loaded(self, model_id: str) -> bool:
+        now = time.time()
+        with self._lock:
+            if model_id in self._unloading:
+                return now < self._unloading[model_id]
+            return model_id in self._loaded and now >= self._loaded[model_id]
+
+    def loaded_models(self) -> list[str]:
+        return [m for m in self.settings.models if self.is_loaded(m)]
+
+    def _load(self, model_id: str):
+        with self._lock:
+            self._unloading.pop(model_id, None)
+            self._loaded[model_id] = time.time() + self.settings.state_lag
+
+    def _prefix_cached(self, model_id: str, text: str) -> int:
+        """Characters of `text` shared with the model's previous prompt."""
+        with self._lock:
+            previous = self._last_prompt.get(model_id, "")
+            self._last_prompt[model_id] = text
+        return len(os.path.commonprefix([previous, text]))
+
+    def _unload(self, model_id: str):
+        with self._lock:
+            self._last_prompt.pop(model_id, None)
+            if model_id in self._loaded:
+                del self._loaded[model_id]
+                self._unloading[model_id] = time.time() + self.settings.state_lag
+
+    # ── HTTP ─────────────────────────────────────
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _json(self, obj, code: int = 200):
+                body = json.dumps(obj).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _body(self) -> dict:
+                n = int(self.headers.get("Content-Length", 0))
+                try:
+                    return json.loads(self.rfile.read(n) or b"{}")
+                except ValueError:
+                    return {}
+
+            def do_GET(self):
+                mock._count(f"GET {self.path}")
+                if self.path == "/api/v0/models":
+                    self._json({"data": [{"id": m, "type": "llm",
+                                          "state": "loaded" if mock.is_loaded(m) else "not-loaded"}
+                                         for m in mock.settings.models]})
+                elif self.path == "/api/v1/models":
+                    self._json({"models": [{"key": m, "size_bytes": size}
+                                           for m, size in mock.settings.models.items()]})
+                else:
+                    self._json({"error": "not found"}, 404)
+
+            def do_POST(self):
+                mock._count(f"POST {self.path}")
+                body = self._body()
+                if self.path == "/api/v1/models/load":
+                    self._load(body)
+                elif self.path == "/api/v1/models/unload":
+                    self._unload(body)
+                elif self.path == "/v1/chat/completions":
+                    try:
+                        self._chat(body)
+                    except (BrokenPipeError, ConnectionResetError):
+                        # The client aborted the request; LM Studio drops the generation too
+                        mock._count("cancelled chat")
+                        self.close_connection = True
+                else:
+                    self._json({"error": "not found"}, 404)
+
+            def _load(self, body: dict):
+                model_id = body.get("model")
+                if model_id not in mock.settings.models:
+                    return self._json({"error": f"unknown model {model_id}"}, 404)
+                start = time.time()
+                time.sleep(mock.settings.load_latency)
+                context = body.get("context_length", mock.settings.default_context_length)
+                if mock.settings.max_context_length and context > mock.settings.max_context_length:
+                    mock._add_busy("load", time.time() - start)
+                    return self._json({"error": f"failed to allocate context of {context} tokens"}, 500)
+                if mock._roll(mock.settings.load_fail_rate):
+                    mock._add_busy("load", time.time() - start)
+                    return self._json({"error": "injected load failure"}, 500)
+                mock._load(model_id)
+                mock._add_busy("load", time.time() - start)
+                self._json({"instance_id": model_id, "status": "loaded"})
+
+            def _unload(self, body: dict):
+                model_id = body.get("model") or body.get("identifier") or body.get("instance_id")
+                start = time.time()
+                time.sleep(mock.settings.unload_latency)
+                if not mock._roll(mock.settings.unload_ignore_rate):
+                    mock._unload(model_id)
+                mock._add_busy("unload", time.time() - start)
+                self._json({"instance_id": model_id})
+
+            def _chat(self, body: dict):
+                settings = mock.settings
+                model_id = body.get("model")
+                if not mock.is_loaded(model_id):
+                    return self._json({"error": f"model {model_id} is not loaded"}, 400)
+                start = time.time()
+                if mock._roll(settings.chat_fail_rate):
+                    mock._add_busy("chat", time.time() - start)
+                    return self._json({"error": "injected generation failure"}, 500)
+
+                n_tokens = settings.completion_tokens
+                if mock._roll(settings.loop_rate):
+                    n_tokens *= 100
+                if body.get("max_tokens", -1) > 0:
+                    n_tokens = min(n_tokens, body["max_tokens"])
+                per_token = 1.0 / settings.token_rate if settings.token_rate > 0 else 0.0
+                tokens = [f"tok{i} " for i in range(n_tokens)]
+                prompt = json.dumps(body.get("messages", []))
+                cached = mock._prefix_cached(model_id, prompt)
+                prompt_time = (len(prompt) - cached) / settings.prompt_rate if settings.prompt_rate > 0 else 0.0
+                # Roughly four characters per token
+                n_prompt = max(1, len(prompt) // 4)
+                usage = {"prompt_tokens": n_prompt, "completion_tokens": n_tokens, "total_tokens": n_prompt + n_tokens,
+                         "prompt_tokens_details": {"cached_tokens": cached // 4}}
+                timings = {"prompt_n": n_prompt - cached // 4, "cache_n": cached // 4,
+                           "prompt_ms": 1000 * (settings.ttft + prompt_time)}
+                time.sleep(settings.ttft + prompt_time)
+
+                if body.get("stream"):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+
+                    def send(data: str):
+                        chunk = f"data: {data}\n\n".encode()
+                        self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                        self.wfile.flush()
+
+                    for tok in tokens:
+                        send(json.dumps({"choices": [{"index": 0, "delta": {"content": tok}}]}))
+                        time.sleep(per_token)
+                    send(json.dumps({"choices": [], "usage": usage, "timings": timings}))
+                    send("[DONE]")
+                    self.wfile.write(b"0\r\n\r\n")
+                else:
+                    time.sleep(per_token * n_tokens)
+                    self._json({"choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}}],
+                                "usage": usage, "timings": timings})
+                mock._add_busy("chat", time.time() - start)
+
+        return Handler
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Run a mock LM Studio server.")
+    parser.add_argument("--port", type=int, default=1234)
+    parser.add_argument("--models", type=int, default=3, help="Number of mock models")
+    parser.add_argument("--model-size-gb", type=float, default=1.0)
+    parser.add_argument("--load-latency", type=float, default=0.0)
+    parser.add_argument("--unload-latency", type=float, default=0.0)
+    parser.add_argument("--state-lag", type=float, default=0.0)
+    parser.add_argument("--ttft", type=float, default=0.0)
+    parser.add_argument("--prompt-rate", type=float, default=0.0,
+                        help="Prompt chars/s; a prefix shared with the previous request is free")
+    parser.add_argument("--token-rate", type=float, default=50.0)
+    parser.add_argument("--completion-tokens", type=int, default=16)
+    parser.add_argument("--load-fail-rate", type=float, default=0.0)
+    parser.add_argument("--loop-rate", type=float, default=0.0, help="Share of generations that loop (100× tokens)")
+    parser.add_argument("--chat-fail-rate", type=float, default=0.0)
+    parser.add_argument("--unload-ignore-rate", type=float, default=0.0)
+    parser.add_argument("--max-context", type=int, help="Fail loads asking for more context than this")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    settings = MockSettings(
+        models=mock_models(args.models, int(args.model_size_gb * 1024**3)),
+        load_latency=args.load_latency,
+        unload_latency=args.unload_latency,
+        state_lag=args.state_lag,
+        ttft=args.ttft,
+        prompt_rate=args.prompt_rate,
+        token_rate=args.token_rate,
+        completion_tokens=args.completion_tokens,
+        load_fail_rate=args.load_fail_rate,
+        chat_fail_rate=args.chat_fail_rate,
+        loop_rate=args.loop_rate,
+        unload_ignore_rate=args.unload_ignore_rate,
+        max_context_length=args.max_context,
+        seed=args.seed,
+    )
+    with MockLMStudio(settings, port=args.port) as mock:
+        print(f"Mock LM Studio listening on {mock.url} with {len(settings.models)} model(s). Ctrl+C to stop.")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1110 @@
+import customtkinter as ctk
+import tkinter as tk
+from tkinter import filedialog, messagebox
+import threading
+import time
+import json
+import os
+import subprocess
+import sys
+import webbrowser
+
+from lm_batch_runner import (DEFAULT_PROFILES_PATH, DEFAULT_RESULTS_PATH, LOAD_PROFILE_KEYS, BatchConfig, BatchEvents,
+                             BatchRunner, LMStudioClient, LoadProfiles, ModelResidency, ResultsStore, UNLOAD_TIMEOUT,
+                             load_prompt_set, parse_load_profile, parse_server_urls, parse_sweep)
+
+ctk.set_appearance_mode("dark")
+ctk.set_default_color_theme("blue")
+
+
+class UIUpdateQueue:
+    """Thread-safe queue of pending widget updates, drained by the Tk loop at
+    a fixed frame rate. Updates are keyed (e.g. "status" or ("label", model));
+    posting under a key that is still pending replaces the older update, so
+    a burst of changes to one widget costs a single redraw."""
+
+    def __init__(self, root, fps: int = 30):
+        self.root = root
+        self.interval = max(1, 1000 // fps)
+        self._lock = threading.Lock()
+        self._pending: dict = {}
+        self._frame_hooks = []
+
+    def post(self, key, fn):
+        with self._lock:
+            self._pending.pop(key, None)   # re-insert: keep the latest update in posting order
+            self._pending[key] = fn
+
+    def on_frame(self, fn):
+        """Call fn on every frame (before the queued updates are applied)."""
+        self._frame_hooks.append(fn)
+
+    def start(self):
+        self.root.after(self.interval, self._drain)
+
+    def _drain(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for hook in self._frame_hooks:
+            hook()
+        for fn in pending.values():
+            try:
+                fn()
+            except Exception:
+                pass  # a widget destroyed mid-update must not stop the loop
+        self.root.after(self.interval, self._drain)
+
+
+class LivePreview:
+    """Buffers the text of the response currently being generated. feed()
+    is called on the worker thread for every token and only appends under a
+    lock; the UI takes what is new at its own (throttled) pace."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key = None
+        self._pending: list[str] = []
+        self._reset = False
+        self._tokens = 0
+        self._started = 0.0
+
+    def feed(self, model_id: str, cell: str, text: str):
+        with self._lock:
+            if (model_id, cell) != self._key:
+                self._key = (model_id, cell)
+                self._pending, self._reset = [], True
+                self._tokens, self._started = 0, time.time()
+            self._pending.append(text)
+            self._tokens += 1
+
+    def take(self) -> dict | None:
+        """New text since the last call plus header info, or None if nothing changed."""
+        with self._lock:
+            if not self._pending and not self._reset:
+                return None
+            text, reset = "".join(self._pending), self._reset
+            self._pending, self._reset = [], False
+            elapsed = time.time() - self._started
+            return {"model": self._key[0], "cell": self._key[1], "text": text, "reset": reset,
+                    "tokens": self._tokens, "tps": self._tokens / elapsed if elapsed > 0 else 0.0}
+
+
+class TkBatchEvents(BatchEvents):
+    """Forwards BatchRunner callbacks to the app's thread-safe UI helpers."""
+
+    STATE_COLORS = {
+        "waiting": "gray",
+        "loading": "#E67E22",  # Orange
+        "generating": "#3498DB",
+        "done": "#2ECC71",
+        "partial": "#E74C3C",
+        "stopped": "#F1C40F",  # Yellow
+        "load_fail": "#E74C3C",
+        "save_fail": "#E74C3C",
+    }
+
+    def __init__(self, app: "LMStudioBatchApp"):
+        self.app = app
+
+    def status(self, msg: str, error: bool = False):
+        self.app._set_status(msg, error)
+
+    def model_state(self, model_id: str, state: str, text: str):
+        self.app._set_label(model_id, text, self.STATE_COLORS.get(state, "gray"))
+        self.app._highlight_model(model_id, active=state in ("loading", "generating"))
+
+    def progress(self, done: int, total: int, processed: float):
+        self.app._update_counter(done, total, processed)
+
+    def token(self, model_id: str, cell: str, text: str):
+        self.app._preview.feed(model_id, cell, text)
+
+    def finished(self, summary: dict):
+        self.app._on_batch_finished(summary)
+
+
+class ModelListView(ctk.CTkFrame):
+    """Virtualized model list: only a pool of row widgets the size of the
+    visible area exists, and scrolling rebinds those rows to other models.
+    set_models() diffs a fresh catalog against the current one so selection
+    and status labels survive a refresh. Supports an incremental text filter
+    and sorting by name or size."""
+
+    ROW_HEIGHT = 30
+    SORTS = ("Library order", "Name", "Size ↑", "Size ↓")
+
+    def __init__(self, master, on_change=None, **kwargs):
+        super().__init__(master, **kwargs)
+        self._on_change = on_change
+        self._items: dict[str, dict] = {}          # catalog order
+        self._selected: dict[str, bool] = {}
+        self._states: dict[str, tuple[str, str, bool]] = {}   # id -> (label text, color, active)
+        self._sort = self.SORTS[0]
+        self._query = ""
+        self._sorted: list[str] = []               # every id, in sort order
+        self._view: list[str] = []                 # sorted ids matching the filter
+        self._offset = 0
+        self._rows: list[dict] = []
+        self._visible = 0
+
+        # Fixed size: the row pool adapts to the frame, not the other way round
+        self.pack_propagate(False)
+        self._body = ctk.CTkFrame(self, fg_color="transparent")
+        self._body.pack(side="left", fill="both", expand=True)
+        self._body.pack_propagate(False)
+        self._scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar)
+        self._scrollbar.pack(side="right", fill="y")
+        self._message = ctk.CTkLabel(self._body, text="", text_color="gray")
+
+        self._body.bind("<Configure>", self._on_resize)
+        self._bind_wheel(self._body)
+
+    # ── data ─────────────────────────────────────
+    def set_models(self, models: list[dict]) -> tuple[int, int]:
+        """Replace the catalog, keeping selection and status of models that
+        are still present. New models start selected. Returns (added, removed)."""
+        new = {m["id"]: m for m in models}
+        removed = [mid for mid in self._items if mid not in new]
+        added = [mid for mid in new if mid not in self._items]
+        for mid in removed:
+            self._selected.pop(mid, None)
+            self._states.pop(mid, None)
+        for mid in added:
+            self._selected[mid] = True
+        self._items = new
+        self._message.pack_forget()
+        self._resort()
+        return len(added), len(removed)
+
+    def show_message(self, text: str, color: str = "gray"):
+        """Clear the list and show a single message line instead (errors, empty catalog)."""
+        self._items, self._selected, self._states = {}, {}, {}
+        self._resort()
+        self._message.configure(text=text, text_color=color)
+        self._message.pack(anchor="w", padx=6, pady=4)
+
+    def set_filter(self, query: str):
+        query = query.strip().lower()
+        if query.startswith(self._query) and self._query:
+            # Narrowing the previous query: only re-check what still matched
+            self._view = [mid for mid in self._view if self._matches(mid, query)]
+        else:
+            self._view = [mid for mid in self._sorted if self._matches(mid, query)]
+        self._query = query
+        self._offset = 0
+        self._render()
+
+    def set_sort(self, sort: str):
+        self._sort = sort
+        self._resort()
+
+    def _matches(self, model_id: str, query: str) -> bool:
+        if not query:
+            return True
+        m = self._items[model_id]
+        haystack = f"{model_id} {m.get('display_name') or ''}".lower()
+        return all(term in haystack for term in query.split())
+
+    def _resort(self):
+        ids = list(self._items)
+        if self._sort == "Name":
+            ids.sort(key=lambda mid: (self._items[mid].get("display_name") or mid).lower())
+        elif self._sort.startswith("Size"):
+            ids.sort(key=lambda mid: self._items[mid].get("size_bytes") or 0, reverse=self._sort.endswith("↓"))
+        self._sorted = ids
+        query, self._query = self._query, ""
+        self.set_filter(query)
+
+    def selected(self) -> list[str]:
+        """Selected model ids in the current sort order (including ones hidden by the filter)."""
+        return [mid for mid in self._sorted if self._selected.get(mid)]
+
+    def set_all(self, value: bool):
+        """Select or deselect every model matching the current filter."""
+        for mid in self._view:
+            self._selected[mid] = value
+        self._render()
+        self._changed()
+
+    @property
+    def counts(self) -> tuple[int, int, int]:
+        """(shown, total, selected)"""
+        return len(self._view), len(self._items), sum(1 for v in self._selected.values() if v)
+
+    # ── per-model status ─────────────────────────
+    def set_state(self, model_id: str, text: str | None = None, color: str | None = None,
+                  active: bool | None = None):
+        if model_id not in self._items:
+            return
+        old = self._states.get(model_id, ("", "gray", False))
+        self._states[model_id] = (old[0] if text is None else text, old[1] if color is None else color,
+                                  old[2] if active is None else active)
+        idx = self._view.index(model_id) - self._offset if model_id in self._view else -1
+        if 0 <= idx < self._visible:
+            self._bind_row(self._rows[idx], model_id)
+
+    def clear_states(self):
+        self._states.clear()
+        self._render()
+
+    # ── rendering ────────────────────────────────
+    def _make_row(self) -> dict:
+        frame = ctk.CTkFrame(self._body, fg_color="transparent", corner_radius=0, height=self.ROW_HEIGHT)
+        var = ctk.BooleanVar(value=False)
+        row = {"frame": frame, "var": var, "id": None, "shown": None}
+        row["cb"] = ctk.CTkCheckBox(frame, text="", variable=var, command=lambda: self._toggle(row))
+        row["cb"].pack(side="left", padx=5)
+        row["label"] = ctk.CTkLabel(frame, text="", width=100, text_color="gray", anchor="e")
+        row["label"].pack(side="right", padx=5)
+        for widget in (frame, row["cb"], row["label"]):
+            self._bind_wheel(widget)
+        return row
+
+    def _bind_row(self, row: dict, model_id: str):
+        m = self._items[model_id]
+        text = f"{m['display_name']} ({m['size_str']})" if m.get("size_str") else m["display_name"]
+        label, color, active = self._states.get(model_id, ("", "gray", False))
+        shown = (model_id, text, self._selected.get(model_id, False), label, color, active)
+        if shown == row["shown"]:
+            return  # nothing changed: skip the (slow) widget reconfiguration
+        row["id"] = model_id
+        row["cb"].configure(text=text)
+        row["var"].set(shown[2])
+        row["label"].configure(text=label, text_color=color)
+        row["frame"].configure(fg_color=("#D6EAF8", "#2C3E50") if active else "transparent")
+        row["shown"] = shown
+
+    def _render(self):
+        self._offset = max(0, min(self._offset, len(self._view) - self._visible))
+        for i in range(self._visible):
+            row = self._rows[i]
+            idx = self._offset + i
+            if idx < len(self._view):
+                self._bind_row(row, self._view[idx])
+                if not row["frame"].winfo_ismapped():
+                    row["frame"].pack(fill="x", padx=4, pady=1)
+            else:
+                row["id"], row["shown"] = None, None
+                row["frame"].pack_forget()
+        total = len(self._view)
+        if total <= self._visible:
+            self._scrollbar.set(0.0, 1.0)
+        else:
+            self._scrollbar.set(self._offset / total, (self._offset + self._visible) / total)
+        self._changed()
+
+    def _on_resize(self, event):
+        visible = max(1, event.height // (self.ROW_HEIGHT + 2))
+        if visible == self._visible:
+            return
+        while len(self._rows) < visible:
+            self._rows.append(self._make_row())
+        for row in self._rows[visible:]:
+            row["id"], row["shown"] = None, None
+            row["frame"].pack_forget()
+        self._visible = visible
+        self._render()
+
+    # ── scrolling / input ────────────────────────
+    def _scroll_to(self, offset: int):
+        offset = max(0, min(offset, len(self._view) - self._visible))
+        if offset != self._offset:
+            self._offset = offset
+            self._render()
+
+    def _on_scrollbar(self, action, *args):
+        if action == "moveto":
+            self._scroll_to(round(float(args[0]) * len(self._view)))
+        elif action == "scroll":
+            step = int(args[0]) * (self._visible if args[1] == "pages" else 1)
+            self._scroll_to(self._offset + step)
+
+    def _on_wheel(self, event):
+        if getattr(event, "num", None) in (4, 5):
+            step = -1 if event.num == 4 else 1
+        else:
+            step = -1 if event.delta > 0 else 1
+        self._scroll_to(self._offset + step * 3)
+        return "break"  # don't let the surrounding scrollable frame scroll too
+
+    def _bind_wheel(self, widget):
+        for seq in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            widget.bind(seq, self._on_wheel)
+
+    def _toggle(self, row: dict):
+        if row["id"] is not None:
+            self._selected[row["id"]] = row["var"].get()
+            row["shown"] = None
+            self._changed()
+
+    def _changed(self):
+        if self._on_change:
+            self._on_change()
+
+
+class LMStudioBatchApp:
+    def __init__(self, root: ctk.CTk):
+        self.root = root
+        self.root.title("LM Studio Batch Prompt Automator")
+        self.root.geometry("860x900")
+        
+        self._runner: BatchRunner | None = None
+        self._client: LMStudioClient | None = None
+        self._refresh_seq = 0
+        self._last_output_folder = ""
+
+        self._build_ui()
+        self._ui = UIUpdateQueue(root)
+        self._preview = LivePreview()
+        self._preview_due = 0.0
+        self._ui.on_frame(self._refresh_preview)
+        self._ui.start()
+        self.root.after(100, self._refresh_models)
+
+    def _build_ui(self):
+        # We use a scrollable frame for main content
+        self.main_container = ctk.CTkScrollableFrame(self.root)
+        self.main_container.pack(fill="both", expand=True, padx=10, pady=10)
+
+        # ── System Prompt ───────────────────────────
+        ctk.CTkLabel(self.main_container, text="System Prompt (Optional):", font=ctk.CTkFont(weight="bold")).pack(anchor="w", padx=5)
+        self.sys_prompt_text = ctk.CTkTextbox(self.main_container, height=60)
+        self.sys_prompt_text.pack(fill="x", padx=5, pady=(0, 10))
+
+        # ── User Prompt ─────────────────────────────
+        ctk.CTkLabel(self.main_container, text="User Prompt:", font=ctk.CTkFont(weight="bold")).pack(anchor="w", padx=5)
+        self.prompt_text = ctk.CTkTextbox(self.main_container, height=120)
+        self.prompt_text.pack(fill="x", padx=5, pady=(0, 10))
+
+        # ── Prompt Set (matrix mode) ────────────────
+        pset_frame = ctk.CTkFrame(self.main_container, fg_color="transparent")
+        pset_frame.pack(fill="x", padx=5, pady=(0, 10))
+        ctk.CTkLabel(pset_frame, text="Prompt Set (.jsonl/.csv):").pack(side="left", padx=(0, 5))
+        self.prompt_set_var = ctk.StringVar()
+        ctk.CTkEntry(pset_frame, textvariable=self.prompt_set_var, placeholder_text="Optional – overrides User Prompt").pack(side="left", fill="x", expand=True, padx=(0, 5))
+        ctk.CTkButton(pset_frame, text="Browse…", command=self._browse_prompt_set, width=80).pack(side="left", padx=(0, 5))
+        ctk.CTkButton(pset_frame, text="Clear", command=lambda: self.prompt_set_var.set(""), width=60).pack(side="left")
+
+        # ── Output Options ──────────────────────────
+        opts_frame = ctk.CTkFrame(self.main_container, fg_color="transparent")
+        opts_frame.pack(fill="x", padx=5, pady=(0, 10))
+        
+        ctk.CTkLabel(opts_frame, text="Output Format:").pack(side="left", padx=(0, 5))
+        self.format_var = ctk.StringVar(value=".md")
+        self.format_menu = ctk.CTkOptionMenu(opts_frame, variable=self.format_var, values=[".md", ".txt"], width=80)
+        self.format_menu.pack(side="left", padx=(0, 20))
+
+        self.skip_thinking_var = ctk.BooleanVar(value=False)
+        self.skip_thinking_cb = ctk.CTkCheckBox(opts_frame, text="Skip Thinking Part (<think>...)", variable=self.skip_thinking_var)
+        self.skip_thinking_cb.pack(side="left", padx=(0, 20))
+
+        self.reasoning_file_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(opts_frame, text="Save thinking to side file", variable=self.reasoning_file_var).pack(side="left", padx=(0, 20))
+
+        ctk.CTkLabel(opts_frame, text="Filename format:").pack(side="left", padx=(0, 5))
+        self.filename_fmt_var = ctk.StringVar(value="{session}_{model}_response")
+        ctk.CTkEntry(opts_frame, textvariable=self.filename_fmt_var, width=180).pack(side="left", padx=(0, 5))
+        ctk.CTkLabel(opts_frame, text="({model}, {session}, {prompt}, {sample}, {params})", text_color="gray", font=("", 10)).pack(side="left")
+
+        # ── Output folder ───────────────────────────
+        folder_frame = ctk.CTkFrame(self.main_container, fg_color="transparent")
+        folder_frame.pack(fill="x", padx=5, pady=(0, 10))
+        ctk.CTkLabel(folder_frame, text="Output Folder:").pack(side="left", padx=(0, 5))
+        self.folder_var = ctk.StringVar()
+        ctk.CTkEntry(folder_frame, textvariable=self.folder_var).pack(side="left", fill="x", expand=True, padx=(0, 5))
+        ctk.CTkButton(folder_frame, text="Browse…", command=self._browse_folder, width=80).pack(side="left")
+
+        # ── Advanced Settings Toggle & Theme ─────────
+        opts_bar = ctk.CTkFrame(self.main_container, fg_color="transparent")
+        opts_bar.pack(fill="x", padx=5, pady=(0, 5))
+        
+        self.adv_toggle_btn = ctk.CTkButton(opts_bar, text="⚙ Advanced Settings ▼", command=self._toggle_advanced, fg_color="transparent", text_color=("black", "white"), border_width=1)
+        self.adv_toggle_btn.pack(side="left")
+        
+        self.theme_var = ctk.StringVar(value="dark")
+        self.theme_switch = ctk.CTkSwitch(opts_bar, text="Dark Mode", command=self._toggle_theme, variable=self.theme_var, onvalue="dark", offvalue="light")
+        self.theme_switch.pack(side="right")
+
+        self.adv_frame = ctk.CTkFrame(self.main_container, fg_color=("gray90", "gray13"))
+        
+        # Row 1 (Server & Wait)
+        adv_row1 = ctk.CTkFrame(self.adv_frame, fg_color="transparent")
+        adv_row1.pack(fill="x", pady=5)
+        
+        # Several comma-separated URLs spread the batch over those hosts; the first one lists the models
+        ctk.CTkLabel(adv_row1, text="Server URL(s):").pack(side="left", padx=(0,5))
+        self.server_url_var = ctk.StringVar(value="http://localhost:1234")
+        ctk.CTkEntry(adv_row1, textvariable=self.server_url_var, width=260).pack(side="left", padx=(0,20))
+        
+        ctk.CTkLabel(adv_row1, text="Wait after unload (sec):").pack(side="left", padx=(0,5))
+        self.delay_var = ctk.StringVar(value="5")
+        ctk.CTkEntry(adv_row1, textvariable=self.delay_var, width=50).pack(side="left", padx=(0,5))
+        self.adaptive_waits_var = ctk.BooleanVar(value=True)
+        ctk.CTkCheckBox(adv_row1, text="Adaptive waits", variable=self.adaptive_waits_var, width=20).pack(side="left", padx=(0,20))
+
+        ctk.CTkLabel(adv_row1, text="Max Wait Time (sec):").pack(side="left", padx=(0,5))
+        self.max_wait_var = ctk.StringVar(value="3600")
+        ctk.CTkEntry(adv_row1, textvariable=self.max_wait_var, width=50).pack(side="left", padx=(0,5))
+        ctk.CTkLabel(adv_row1, text="(Leave blank or 0 for infinite)", text_color="gray", font=("", 10)).pack(side="left")
+
+        # Row 2 (Temp & Tokens)
+        adv_row2 = ctk.CTkFrame(self.adv_frame, fg_color="transparent")
+        adv_row2.pack(fill="x", pady=5)
+
+        ctk.CTkLabel(adv_row2, text="Temperature:").pack(side="left", padx=(0,5))
+        self.temp_var = ctk.DoubleVar(value=0.7)
+        self.temp_slider = ctk.CTkSlider(adv_row2, from_=0.1, to=1.0, variable=self.temp_var, width=120)
+        self.temp_slider.pack(side="left", padx=(0,10))
+        self.temp_label = ctk.CTkLabel(adv_row2, text="0.70")
+        self.temp_label.pack(side="left", padx=(0,10))
+        self.temp_slider.configure(command=lambda v: self.temp_label.configure(text=f"{v:.2f}"))
+
+        self.use_default_temp_var = ctk.BooleanVar(value=True)
+        self.use_default_temp_cb = ctk.CTkCheckBox(adv_row2, text="Use Model Default", variable=self.use_default_temp_var, command=self._toggle_temp_slider)
+        self.use_default_temp_cb.pack(side="left", padx=(0,30))
+        self.temp_slider.configure(state="disabled")
+
+        ctk.CTkLabel(adv_row2, text="Max Tokens:").pack(side="left", padx=(0,5))
+        self.tokens_var = ctk.DoubleVar(value=-1)
+        self.tokens_slider = ctk.CTkSlider(adv_row2, from_=-1, to=16384, variable=self.tokens_var, width=150)
+        self.tokens_slider.pack(side="left", padx=(0,10))
+        self.tokens_label = ctk.CTkLabel(adv_row2, text="-1")
+        self.tokens_label.pack(side="left")
+        self.tokens_slider.configure(command=lambda v: self.tokens_label.configure(text=f"{int(v)}"))
+
+        # Row 3 (Generation mode)
+        adv_row3 = ctk.CTkFrame(self.adv_frame, fg_color="transparent")
+        adv_row3.pack(fill="x", pady=5)
+
+        self.stream_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(adv_row3, text="Stream responses (write tokens as they arrive, report TTFT)", variable=self.stream_var).pack(side="left", padx=(0,20))
+
+        ctk.CTkLabel(adv_row3, text="Parallel requests:").pack(side="left", padx=(0,5))
+        self.concurrency_var = ctk.StringVar(value="1")
+        ctk.CTkEntry(adv_row3, textvariable=self.concurrency_var, width=40).pack(side="left", padx=(0,20))
+
+        ctk.CTkLabel(adv_row3, text="Samples per prompt:").pack(side="left", padx=(0,5))
+        self.samples_var = ctk.StringVar(value="1")
+        ctk.CTkEntry(adv_row3, textvariable=self.samples_var, width=40).pack(side="left", padx=(0,20))
+
+        self.reuse_cached_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(adv_row3, text="Reuse cached responses", variable=self.reuse_cached_var).pack(side="left")
+
+        adv_row4 = ctk.CTkFrame(self.adv_frame, fg_color="transparent")
+        adv_row4.pack(fill="x", pady=5)
+
+        ctk.CTkLabel(adv_row4, text="Memory budget (GB):").pack(side="left", padx=(0,5))
+        self.memory_budget_var = ctk.StringVar(value="")
+        ctk.CTkEntry(adv_row4, textvariable=self.memory_budget_var, width=60).pack(side="left", padx=(0,20))
+
+        ctk.CTkLabel(adv_row4, text="Overhead per model (GB):").pack(side="left", padx=(0,5))
+        self.model_overhead_var = ctk.StringVar(value="0.5")
+        ctk.CTkEntry(adv_row4, textvariable=self.model_overhead_var, width=50).pack(side="left", padx=(0,10))
+        ctk.CTkLabel(adv_row4, text="(blank = one model at a time)", text_color="gray").pack(side="left", padx=(0,20))
+
+        self.write_files_var = ctk.BooleanVar(value=True)
+        ctk.CTkCheckBox(adv_row4, text="Write one file per response (all results also go to the results store)",
+                        variable=self.write_files_var).pack(side="left")
+
+        adv_row5 = ctk.CTkFrame(self.adv_frame, fg_color="transparent")
+        adv_row5.pack(fill="x", pady=5)
+
+        ctk.CTkLabel(adv_row5, text="Sampling sweep:").pack(side="left", padx=(0,5))
+        self.sweep_var = ctk.StringVar(value="")
+        ctk.CTkEntry(adv_row5, textvariable=self.sweep_var, width=320).pack(side="left", padx=(0,10))
+        ctk.CTkLabel(adv_row5, text="e.g. temperature=0.2,0.7 top_p=0.9,1 (every combination, one load per model; "
+                                    "also max_tokens, seed, repeat_penalty)",
+                     text_color="gray").pack(side="left", padx=(0,20))
+
+        self.prefix_order_var = ctk.BooleanVar(value=True)
+        ctk.CTkCheckBox(adv_row5, text="Group shared prompt prefixes (server prompt cache)",
+                        variable=self.prefix_order_var).pack(side="left")
+
+        adv_row6 = ctk.CTkFrame(self.adv_frame, fg_color="transparent")
+        adv_row6.pack(fill="x", pady=5)
+
+        self.benchmark_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(adv_row6, text="Benchmark mode (streamed, timed repeats; report in <session>_benchmark.json)",
+                        variable=self.benchmark_var).pack(side="left", padx=(0,20))
+
+        ctk.CTkLabel(adv_row6, text="Warmup:").pack(side="left", padx=(0,5))
+        self.warmup_var = ctk.StringVar(value="1")
+        ctk.CTkEntry(adv_row6, textvariable=self.warmup_var, width=40).pack(side="left", padx=(0,20))
+
+        ctk.CTkLabel(adv_row6, text="Repeats:").pack(side="left", padx=(0,5))
+        self.repeats_var = ctk.StringVar(value="5")
+        ctk.CTkEntry(adv_row6, textvariable=self.repeats_var, width=40).pack(side="left", padx=(0,20))
+
+        self.load_fallback_var = ctk.BooleanVar(value=True)
+        ctk.CTkCheckBox(adv_row6, text="Retry failed loads with smaller context / less offload",
+                        variable=self.load_fallback_var).pack(side="left")
+
+        adv_row7 = ctk.CTkFrame(self.adv_frame, fg_color="transparent")
+        adv_row7.pack(fill="x", pady=5)
+
+        self.keep_warm_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(adv_row7, text="Keep last model loaded for the next batch (off = unload every model)",
+                        variable=self.keep_warm_var).pack(side="left", padx=(0,20))
+
+        ctk.CTkLabel(adv_row7, text="Idle TTL (min):").pack(side="left", padx=(0,5))
+        self.idle_ttl_var = ctk.StringVar(value="10")
+        ctk.CTkEntry(adv_row7, textvariable=self.idle_ttl_var, width=40).pack(side="left")
+
+        adv_row8 = ctk.CTkFrame(self.adv_frame, fg_color="transparent")
+        adv_row8.pack(fill="x", pady=5)
+
+        self.adaptive_deadlines_var = ctk.BooleanVar(value=True)
+        ctk.CTkCheckBox(adv_row8, text="Per-model deadlines from observed TPS (capped at max wait)",
+                        variable=self.adaptive_deadlines_var).pack(side="left", padx=(0,20))
+
+        ctk.CTkLabel(adv_row8, text="Retries:").pack(side="left", padx=(0,5))
+        self.retries_var = ctk.StringVar(value="2")
+        ctk.CTkEntry(adv_row8, textvariable=self.retries_var, width=40).pack(side="left", padx=(0,20))
+
+        ctk.CTkLabel(adv_row8, text="Skip model after failures in a row (0 = never):").pack(side="left", padx=(0,5))
+        self.breaker_var = ctk.StringVar(value="3")
+        ctk.CTkEntry(adv_row8, textvariable=self.breaker_var, width=40).pack(side="left")
+
+        # ── Model list ──────────────────────────────
+        model_header = ctk.CTkFrame(self.main_container, fg_color="transparent")
+        model_header.pack(fill="x", padx=5, pady=(10, 5))
+        ctk.CTkLabel(model_header, text="Available Models:", font=ctk.CTkFont(weight="bold")).pack(side="left")
+        self.refresh_btn = ctk.CTkButton(model_header, text="↻ Refresh Models", command=self._refresh_models, width=110)
+        self.refresh_btn.pack(side="right")
+        ctk.CTkButton(model_header, text="Select All", command=self._select_all, width=80).pack(side="right", padx=5)
+        ctk.CTkButton(model_header, text="Deselect All", command=self._deselect_all, width=80).pack(side="right")
+        ctk.CTkButton(model_header, text="⚙ Load Profiles…", command=self._edit_load_profiles,
+                      width=110).pack(side="right", padx=5)
+
+        list_tools = ctk.CTkFrame(self.main_container, fg_color="transparent")
+        list_tools.pack(fill="x", padx=5)
+        self.filter_var = ctk.StringVar(value="")
+        ctk.CTkLabel(list_tools, text="Filter:").pack(side="left", padx=(0, 5))
+        ctk.CTkEntry(list_tools, textvariable=self.filter_var, width=240).pack(side="left")
+        self.filter_var.trace_add("write", lambda *_: self.model_list.set_filter(self.filter_var.get()))
+        ctk.CTkLabel(list_tools, text="Sort:").pack(side="left", padx=(15, 5))
+        self.sort_var = ctk.StringVar(value=ModelListView.SORTS[0])
+        ctk.CTkOptionMenu(list_tools, variable=self.sort_var, values=list(ModelListView.SORTS), width=130,
+                          command=lambda choice: self.model_list.set_sort(choice)).pack(side="left")
+        self.list_info_var = ctk.StringVar(value="")
+        ctk.CTkLabel(list_tools, textvariable=self.list_info_var, text_color="gray").pack(side="right")
+
+        self.model_list = ModelListView(self.main_container, on_change=self._update_list_info, height=240,
+                                        fg_color=("#F9F9F9", "#1E1E1E"), border_width=1, border_color=("#CCCCCC", "#333333"))
+        self.model_list.pack(fill="both", expand=True, padx=5, pady=5)
+
+        self._model_sizes: dict[str, int] = {}
+
+        # ── Progress / Status ───────────────────────
+        prog_frame = ctk.CTkFrame(self.main_container, fg_color="transparent")
+        prog_frame.pack(fill="x", padx=5, pady=(10, 5))
+
+        self.counter_var = ctk.StringVar(value="Models: –")
+        ctk.CTkLabel(prog_frame, textvariable=self.counter_var, font=ctk.CTkFont(weight="bold")).pack(side="right")
+
+        self.progress_bar = ctk.CTkProgressBar(self.main_container)
+        self.progress_bar.pack(fill="x", padx=5, pady=5)
+        self.progress_bar.set(0)
+
+        self.status_var = ctk.StringVar(value="Status: Ready")
+        self.status_label = ctk.CTkLabel(self.main_container, textvariable=self.status_var, text_color="#3498DB", font=ctk.CTkFont(slant="italic"))
+        self.status_label.pack(pady=5)
+
+        # ── Live preview ────────────────────────────
+        preview_header = ctk.CTkFrame(self.main_container, fg_color="transparent")
+        preview_header.pack(fill="x", padx=5, pady=(5, 0))
+        ctk.CTkLabel(preview_header, text="Live Preview:", font=ctk.CTkFont(weight="bold")).pack(side="left")
+        self.preview_info_var = ctk.StringVar(value="")
+        ctk.CTkLabel(preview_header, textvariable=self.preview_info_var, text_color="gray").pack(side="right")
+        self.preview_box = ctk.CTkTextbox(self.main_container, height=120, wrap="word", state="disabled")
+        self.preview_box.pack(fill="x", padx=5, pady=5)
+
+        # ── Action buttons ──────────────────────────
+        btn_frame = ctk.CTkFrame(self.main_container, fg_color="transparent")
+        btn_frame.pack(pady=10)
+
+        self.start_btn = ctk.CTkButton(btn_frame, text="▶ Start Batch", command=self._start_batch)
+        self.start_btn.pack(side="left", padx=5)
+
+        self.pause_btn = ctk.CTkButton(btn_frame, text="⏸ Pause", command=self._toggle_pause, state="disabled")
+        self.pause_btn.pack(side="left", padx=5)
+
+        self.cancel_btn = ctk.CTkButton(btn_frame, text="⏹ Cancel", command=lambda: self._stop_batch(unload=False),
+                                        state="disabled", fg_color="#E67E22", hover_color="#CA6F1E")
+        self.cancel_btn.pack(side="left", padx=5)
+
+        self.stop_btn = ctk.CTkButton(btn_frame, text="⏏ Cancel & Unload", command=self._stop_batch, state="disabled", fg_color="#E74C3C", hover_color="#C0392B")
+        self.stop_btn.pack(side="left", padx=5)
+
+        self.open_folder_btn = ctk.CTkButton(btn_frame, text="📂 Open Output Folder", command=self._open_output_folder, state="disabled")
+        self.open_folder_btn.pack(side="left", padx=5)
+
+        self.resume_btn = ctk.CTkButton(btn_frame, text="⟲ Resume Session…", command=self._resume_session)
+        self.resume_btn.pack(side="left", padx=5)
+
+        self.leaderboard_btn = ctk.CTkButton(btn_frame, text="📊 Leaderboard", command=self._show_leaderboard)
+        self.leaderboard_btn.pack(side="left", padx=5)
+
+        # ── Developer Footer ────────────────────────
+        dev_label = ctk.CTkLabel(
+            self.main_container, 
+            text="Developed by Kiranjot Singh Malhotra",
+            text_color=("gray60", "gray40"), 
+            font=ctk.CTkFont(size=11, slant="italic"),
+            cursor="hand2"
+        )
+        dev_label.pack(side="bottom", pady=(10, 0))
+        dev_label.bind("<Button-1>", lambda e: webbrowser.open("https://github.com/skiranjotsingh"))
+
+    def _toggle_advanced(self):
+        if self.adv_frame.winfo_ismapped():
+            self.adv_frame.pack_forget()
+            self.adv_toggle_btn.configure(text="⚙ Advanced Settings ▼")
+        else:
+            self.adv_frame.pack(fill="x", padx=5, pady=(0, 10), after=self.adv_toggle_btn.master)
+            self.adv_toggle_btn.configure(text="⚙ Advanced Settings ▲")
+
+    def _toggle_temp_slider(self):
+        if self.use_default_temp_var.get():
+            self.temp_slider.configure(state="disabled")
+        else:
+            self.temp_slider.configure(state="normal")
+
+    def _toggle_theme(self):
+        new_mode = self.theme_var.get()
+        ctk.set_appearance_mode(new_mode)
+        if new_mode == "dark":
+            self.theme_switch.configure(text="Dark Mode")
+        else:
+            self.theme_switch.configure(text="Light Mode")
+
+    # ──────────────────────────────────────────────
+    #  Model list helpers
+    # ──────────────────────────────────────────────
+    def _catalog_client(self) -> LMStudioClient:
+        """One client per server URL, so its short-TTL catalog cache serves repeated refreshes."""
+        url = (parse_server_urls(self.server_url_var.get()) or ["http://localhost:1234"])[0]
+        if self._client is None or self._client.base_url != url:
+            if self._client is not None:
+                self._client.close()
+            self._client = LMStudioClient(url)
+        return self._client
+
+    def _refresh_models(self):
+        """Fetch the catalog on a worker thread and rebuild the list in one UI update."""
+        self._refresh_seq += 1
+        seq = self._refresh_seq
+        client = self._catalog_client()
+        self._set_status("Fetching models…")
+        self.refresh_btn.configure(state="disabled")
+
+        def work():
+            try:
+                models, error = client.fetch_catalog(), None
+            except Exception as e:
+                models, error = [], e
+            self._ui.post("catalog", lambda: self._show_catalog(seq, models, error))
+
+        threading.Thread(target=work, name="catalog", daemon=True).start()
+
+    def _show_catalog(self, seq: int, models: list[dict], error: Exception | None):
+        if seq != self._refresh_seq:
+            return  # a newer refresh is on its way
+        self.refresh_btn.configure(state="normal")
+
+        if error is not None:
+            self.model_list.show_message(f"Error connecting to LM Studio: {error}", "#E74C3C")
+            self._set_status("Error fetching models.", error=True)
+            return
+
+        if not models:
+            self.model_list.show_message("No models found. Check Server URL and LM Studio.")
+            self.counter_var.set("Models: 0 total, 0 done")
+            self._set_status("No models found.")
+            return
+
+        added, removed = self.model_list.set_models(models)
+        self._model_sizes = {m["id"]: m["size_bytes"] for m in models if m["size_bytes"]}
+
+        changes = f" ({added} new, {removed} gone)" if (added or removed) and added != len(models) else ""
+        self.counter_var.set(f"Models: {len(models)} total, 0 done")
+        self._set_status(f"Found {len(models)} model(s){changes}. Ready.")
+
+    def _update_list_info(self):
+        shown, total, selected = self.model_list.counts
+        hidden = f", {shown} shown" if shown != total else ""
+        self.list_info_var.set(f"{selected} of {total} selected{hidden}" if total else "")
+
+    def _select_all(self):
+        self.model_list.set_all(True)
+
+    def _deselect_all(self):
+        self.model_list.set_all(False)
+
+    # ──────────────────────────────────────────────
+    #  UI thread-safe helpers
+    # ──────────────────────────────────────────────
+    def _set_status(self, msg: str, error: bool = False):
+        color = "#E74C3C" if error else "#3498DB"
+        self._ui.post("status", lambda: (self.status_var.set(f"Status: {msg}"),
+                                         self.status_label.configure(text_color=color)))
+
+    def _set_label(self, model_id: str, text: str, color: str):
+        self._ui.post(("label", model_id), lambda: self.model_list.set_state(model_id, text=text, color=color))
+
+    def _highlight_model(self, model_id: str, active: bool):
+        self._ui.post(("active", model_id), lambda: self.model_list.set_state(model_id, active=active))
+
+    def _update_counter(self, done: int, total: int, processed: float):
+        pct = processed / total
+        self._ui.post("progress", lambda: (self.progress_bar.set(pct),
+                                           self.counter_var.set(f"Models: {total} total, {done} done")))
+
+    def _restore_ui(self):
+        def restore():
+            self.start_btn.configure(state="normal")
+            self.resume_btn.configure(state="normal")
+            self.pause_btn.configure(state="disabled", text="⏸ Pause")
+            self.cancel_btn.configure(state="disabled")
+            self.stop_btn.configure(state="disabled")
+            self.open_folder_btn.configure(state="normal")
+        self._ui.post("restore", restore)
+
+    PREVIEW_INTERVAL = 0.2   # seconds between preview redraws
+    PREVIEW_MAX_CHARS = 4000
+
+    def _refresh_preview(self):
+        now = time.time()
+        if now < self._preview_due:
+            return
+        update = self._preview.take()
+        if update is None:
+            return
+        self._preview_due = now + self.PREVIEW_INTERVAL
+        box = self.preview_box
+        box.configure(state="normal")
+        if update["reset"]:
+            box.delete("1.0", "end")
+        box.insert("end", update["text"][-self.PREVIEW_MAX_CHARS:])
+        # Keep only the tail so long generations don't slow the text widget down
+        box.delete("1.0", f"end-{self.PREVIEW_MAX_CHARS}c")
+        box.see("end")
+        box.configure(state="disabled")
+        self.preview_info_var.set(f"{update['model']} · {update['cell']} · ~{update['tokens']} tok · "
+                                  f"{update['tps']:.1f} tok/s")
+
+    def _on_batch_finished(self, summary: dict):
+        done, total = summary["done"], summary["total"]
+        if total:
+            self._ui.post("progress", lambda: self.progress_bar.set(1.0 if not summary["stopped"] else done/total))
+        if not summary["stopped"] and total:
+            matrix = f" × {summary['cells']} prompts" if summary["cells"] > 1 else ""
+            self._ui.post("finished", lambda: messagebox.showinfo("Done", f"Batch complete!\n{done}/{total} models{matrix} processed.\n\nOutput: {summary['output_folder']}"))
+
+        self._last_output_folder = summary["output_folder"]
+        self._restore_ui()
+
+    # ──────────────────────────────────────────────
+    #  Button callbacks
+    # ──────────────────────────────────────────────
+    def _browse_folder(self):
+        folder = filedialog.askdirectory()
+        if folder:
+            self.folder_var.set(folder)
+
+    def _browse_prompt_set(self):
+        path = filedialog.askopenfilename(filetypes=[("Prompt sets", "*.jsonl *.json *.csv"), ("All files", "*.*")])
+        if path:
+            self.prompt_set_var.set(path)
+
+    def _on_close(self):
+        # Models kept warm were waiting for a next batch from this window. Unloading them can
+        # hang on a slow server, so it runs off the Tk thread and gets UNLOAD_TIMEOUT at most
+        self.root.withdraw()
+        evict = threading.Thread(target=ModelResidency().evict_all, name="evict", daemon=True)
+        evict.start()
+        deadline = time.time() + UNLOAD_TIMEOUT
+
+        def wait():
+            if evict.is_alive() and time.time() < deadline:
+                self.root.after(100, wait)
+            else:
+                self.root.destroy()
+        wait()
+
+    def _stop_batch(self, unload: bool = True):
+        # Break the batch instantly: in-flight requests are aborted, and with unload the model is cleared too
+        if self._runner:
+            self._runner.stop(unload)
+
+    def _start_batch(self):
+        sys_prompt    = self.sys_prompt_text.get("1.0", tk.END).strip()
+        prompt        = self.prompt_text.get("1.0", tk.END).strip()
+        output_folder = self.folder_var.get().strip()
+        filename_fmt  = self.filename_fmt_var.get().strip()
+        
+        raw_max_wait  = self.max_wait_var.get().strip()
+        max_wait = None
+        if raw_max_wait and raw_max_wait != "0":
+            try:
+                max_wait = float(raw_max_wait)
+            except ValueError:
+                messagebox.showerror("Error", "Invalid Max Wait Time.")
+                return
+
+        prompt_set_path = self.prompt_set_var.get().strip()
+        if prompt_set_path:
+            try:
+                prompts = load_prompt_set(prompt_set_path)
+            except Exception as e:
+                messagebox.showerror("Error", f"Could not read prompt set:\n{e}")
+                return
+            if not prompts:
+                messagebox.showerror("Error", "Prompt set is empty.")
+                return
+            # Rows without their own system prompt inherit the textbox one
+            for p in prompts:
+                if p["system"] is None:
+                    p["system"] = sys_prompt
+        else:
+            if not prompt:
+                messagebox.showerror("Error", "User Prompt cannot be empty.")
+                return
+            prompts = [{"id": "prompt", "system": sys_prompt, "prompt": prompt}]
+        if not output_folder:
+            messagebox.showerror("Error", "Output folder cannot be empty.")
+            return
+        if not os.path.isdir(output_folder):
+            messagebox.showerror("Error", "Output folder does not exist.")
+            return
+        if "{model}" not in filename_fmt:
+            if not messagebox.askyesno("Warning", "Filename format lacks {model} placeholder.\nOverwrites may occur.\nContinue?"):
+                return
+
+        selected_count = len(self.model_list.selected())
+        if selected_count == 0:
+            messagebox.showerror("Error", "No models selected.")
+            return
+
+        try:
+            concurrency = max(1, int(self.concurrency_var.get()))
+        except ValueError:
+            concurrency = 1
+        try:
+            samples = max(1, int(self.samples_var.get()))
+        except ValueError:
+            samples = 1
+        try:
+            delay = int(self.delay_var.get())
+        except ValueError:
+            delay = 0
+        try:
+            warmup = max(0, int(self.warmup_var.get()))
+        except ValueError:
+            warmup = 1
+        try:
+            repeats = max(1, int(self.repeats_var.get()))
+        except ValueError:
+            repeats = 5
+        try:
+            idle_ttl = max(0.0, float(self.idle_ttl_var.get())) * 60
+        except ValueError:
+            idle_ttl = 600.0
+        try:
+            retries = max(0, int(self.retries_var.get()))
+        except ValueError:
+            retries = 2
+        try:
+            breaker_threshold = max(0, int(self.breaker_var.get()))
+        except ValueError:
+            breaker_threshold = 3
+        try:
+            memory_budget = float(self.memory_budget_var.get()) if self.memory_budget_var.get().strip() else None
+        except ValueError:
+            memory_budget = None
+        try:
+            model_overhead = float(self.model_overhead_var.get())
+        except ValueError:
+            model_overhead = 0.5
+        tokens_val = int(self.tokens_var.get())
+        if tokens_val < 1: tokens_val = -1
+        servers = parse_server_urls(self.server_url_var.get()) or ["http://localhost:1234"]
+        try:
+            sweep = parse_sweep(self.sweep_var.get())
+        except ValueError as e:
+            messagebox.showerror("Error", f"Sampling sweep: {e}")
+            return
+
+        config = BatchConfig(
+            models=self.model_list.selected(),
+            prompts=prompts,
+            output_folder=output_folder,
+            server_url=servers[0],
+            servers=servers[1:],
+            filename_fmt=filename_fmt,
+            file_ext=self.format_var.get(),
+            skip_thinking=self.skip_thinking_var.get(),
+            reasoning_file=self.reasoning_file_var.get(),
+            max_tokens=tokens_val,
+            temperature=None if self.use_default_temp_var.get() else self.temp_var.get(),
+            max_wait=max_wait,
+            delay=delay,
+            adaptive_waits=self.adaptive_waits_var.get(),
+            reuse_cached=self.reuse_cached_var.get(),
+            stream=self.stream_var.get(),
+            concurrency=concurrency,
+            samples=samples,
+            sweep=sweep,
+            load_fallback=self.load_fallback_var.get(),
+            prefix_order=self.prefix_order_var.get(),
+            benchmark=self.benchmark_var.get(),
+            warmup=warmup,
+            repeats=repeats,
+            keep_warm=self.keep_warm_var.get(),
+            idle_ttl=idle_ttl,
+            adaptive_deadlines=self.adaptive_deadlines_var.get(),
+            retries=retries,
+            breaker_threshold=breaker_threshold,
+            memory_budget_gb=memory_budget,
+            model_overhead_gb=model_overhead,
+            model_sizes=dict(self._model_sizes),
+            write_files=self.write_files_var.get(),
+        )
+        self._launch(config)
+
+    def _resume_session(self):
+        path = filedialog.askopenfilename(title="Resume session – pick its journal",
+                                          filetypes=[("Batch journals", "*_journal.jsonl"), ("All files", "*.*")])
+        if not path:
+            return
+        try:
+            config = BatchConfig.from_journal(path)
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not read journal:\n{e}")
+            return
+        if not os.path.isdir(config.output_folder):
+            messagebox.showerror("Error", f"Output folder of that session no longer exists:\n{config.output_folder}")
+            return
+        self.server_url_var.set(", ".join([config.server_url, *config.servers]))
+        self.folder_var.set(config.output_folder)
+        self._launch(config)
+
+    def _launch(self, config: BatchConfig):
+        self._runner = BatchRunner(config, events=TkBatchEvents(self))
+
+        self.progress_bar.set(0)
+        self.open_folder_btn.configure(state="disabled")
+        self.start_btn.configure(state="disabled")
+        self.resume_btn.configure(state="disabled")
+        self.pause_btn.configure(state="normal", text="⏸ Pause")
+        self.cancel_btn.configure(state="normal")
+        self.stop_btn.configure(state="normal")
+        self.counter_var.set(f"Models: {len(config.models)} total, 0 done")
+
+        self.model_list.clear_states()
+        for mid in config.models:
+            self.model_list.set_state(mid, text="⬤ queued", color="gray")
+
+        threading.Thread(target=self._runner.run, daemon=True).start()
+
+    def _toggle_pause(self):
+        if not self._runner:
+            return
+        if not self._runner.paused:
+            self._runner.pause()
+            self.pause_btn.configure(text="▶ Resume")
+        else:
+            self._runner.resume()
+            self.pause_btn.configure(text="⏸ Pause")
+
+    def _show_leaderboard(self):
+        if not os.path.exists(DEFAULT_RESULTS_PATH):
+            messagebox.showinfo("Leaderboard", "No results recorded yet.")
+            return
+        store = ResultsStore(DEFAULT_RESULTS_PATH)
+        try:
+            sessions = store.sessions()
+            latest = store.leaderboard(sessions[-1]) if sessions else []
+            overall = store.leaderboard()
+        finally:
+            store.close()
+        if not overall:
+            messagebox.showinfo("Leaderboard", "No successful generations recorded yet.")
+            return
+
+        win = ctk.CTkToplevel(self.root)
+        win.title("Leaderboard")
+        win.geometry("900x500")
+        box = ctk.CTkTextbox(win, font=ctk.CTkFont(family="Courier", size=12), wrap="none")
+        box.pack(fill="both", expand=True, padx=10, pady=10)
+        box.insert("end", f"Latest session ({sessions[-1]})\n\n{ResultsStore.format_leaderboard(latest)}\n\n")
+        box.insert("end", f"All sessions ({len(sessions)})\n\n{ResultsStore.format_leaderboard(overall)}\n")
+        box.configure(state="disabled")
+
+    def _edit_load_profiles(self):
+        """Edit the load profiles of the selected models as JSON; empty objects use LM Studio defaults."""
+        models = self.model_list.selected()
+        if not models:
+            messagebox.showinfo("Load Profiles", "Select the models whose load profiles you want to edit.")
+            return
+        try:
+            store = LoadProfiles(DEFAULT_PROFILES_PATH)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Load Profiles", f"Could not read {DEFAULT_PROFILES_PATH}:\n{e}")
+            return
+        entries = store.entries()
+
+        win = ctk.CTkToplevel(self.root)
+        win.title("Load Profiles")
+        win.geometry("760x480")
+        ctk.CTkLabel(win, text=f"Options: {', '.join(LOAD_PROFILE_KEYS)}. "
+                               "A failed load falls back to smaller context / less offload, "
+                               "and the profile that worked is used next time.",
+                     text_color="gray", wraplength=720, justify="left").pack(fill="x", padx=10, pady=(10, 0))
+        box = ctk.CTkTextbox(win, font=ctk.CTkFont(family="Courier", size=12), wrap="none")
+        box.pack(fill="both", expand=True, padx=10, pady=10)
+        box.insert("end", json.dumps({m: entries.get(m, {}).get("profile", {}) for m in models}, indent=2))
+        for m in models:
+            succeeded = entries.get(m, {}).get("succeeded")
+            if succeeded is not None and succeeded != entries[m].get("profile"):
+                box.insert("end", f"\n// {m} last loaded with {json.dumps(succeeded)}")
+
+        def save():
+            text = "\n".join(line for line in box.get("1.0", "end").splitlines() if not line.startswith("//"))
+            try:
+                edited = json.loads(text)
+                profiles = {m: parse_load_profile([f"{k}={v}" for k, v in (p or {}).items()])
+                            for m, p in edited.items()}
+            except (ValueError, AttributeError) as e:
+                messagebox.showerror("Load Profiles", f"Invalid profiles: {e}", parent=win)
+                return
+            for m, profile in profiles.items():
+                if profile != entries.get(m, {}).get("profile", {}):
+                    store.set(m, profile or None)
+            win.destroy()
+            self._set_status(f"Saved load profiles for {len(profiles)} model(s).")
+
+        ctk.CTkButton(win, text="Save", command=save, width=100).pack(pady=(0, 10))
+
+    def _open_output_folder(self):
+        folder = self._last_output_folder or self.folder_var.get().strip()
+        if not folder or not os.path.isdir(folder):
+            messagebox.showerror("Error", "Output folder not found.")
+            return
+        if sys.platform == "win32":
+            os.startfile(folder)
+        elif sys.platform == "darwin":
+            subprocess.Popen(["open", folder])
+        else:
+            subprocess.Popen(["xdg-open", folder])
+
+
+def main():
+    root = ctk.CTk()
+    app  = LMStudioBatchApp(root)
+    root.protocol("WM_DELETE_WINDOW", app._on_close)
+    root.mainloop()
+
+
+if __name__ == "__main__":
+    main()
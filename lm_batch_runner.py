@@ -1,326 +1,574 @@
-import customtkinter as ctk
-import tkinter as tk
-from tkinter import filedialog, messagebox
+"""LM Studio Batch Prompt Automator – batch engine and command-line entry point.
+
+Everything needed to run a batch lives here without any GUI dependency, so
+the module can be imported as a library or run headless:
+
+    python lm_batch_runner.py                          # launch the GUI
+    python -m lm_batch_runner run --models qwen3-4b gemma-3-4b --prompt-file prompts.jsonl -o out/
+    python -m lm_batch_runner models                   # list the catalog
+
+The CustomTkinter GUI lives in lm_batch_gui and is only imported when it is
+launched.
+"""
+import argparse
+import math
 import requests
 import threading
 import os
 import time
-import subprocess
 import sys
-import re
-import webbrowser
-
-ctk.set_appearance_mode("dark")
-ctk.set_default_color_theme("blue")
+import json
+import csv
+import hashlib
+import itertools
+import statistics
+import sqlite3
+import queue
+import socket
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from collections import deque
+from dataclasses import dataclass, asdict, field, fields, replace
+from urllib.parse import urlsplit
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
 
 LOAD_TIMEOUT = 600
 UNLOAD_TIMEOUT = 30
 
-class LMStudioBatchApp:
-    def __init__(self, root: ctk.CTk):
-        self.root = root
-        self.root.title("LM Studio Batch Prompt Automator")
-        self.root.geometry("860x900")
-        
-        self._pause_event = threading.Event()
-        self._pause_event.set()
-        self._stop_flag = False
-        
-        self._last_output_folder = ""
-        self._currently_loaded_model = None
+# Per-user state (response cache, …) lives outside the output folders
+APP_DIR = os.path.join(os.path.expanduser("~"), ".lm_batch_runner")
+DEFAULT_CACHE_PATH = os.path.join(APP_DIR, "response_cache.sqlite")
+DEFAULT_RESULTS_PATH = os.path.join(APP_DIR, "results.sqlite")
+DEFAULT_PROFILES_PATH = os.path.join(APP_DIR, "load_profiles.json")
+DEFAULT_RESIDENCY_PATH = os.path.join(APP_DIR, "warm_models.json")
+
+
+def format_size(size_bytes: int | None) -> str:
+    if not size_bytes:
+        return ""
+    size_gb = size_bytes / (1024**3)
+    if size_gb >= 1:
+        return f"{size_gb:.2f} GB"
+    size_mb = size_bytes / (1024**2)
+    return f"{size_mb:.2f} MB"
+
+
+def format_duration(seconds: float) -> str:
+    if seconds < 120:
+        return f"{seconds:.0f}s"
+    return f"{seconds / 60:.0f} min"
+
+
+def load_prompt_set(path: str) -> list[dict]:
+    """Read a prompt set from a .jsonl or .csv file.
+
+    Each row needs a 'prompt' field and may carry an optional 'system'
+    prompt and 'id'. Rows without an id are numbered p001, p002, …"""
+    ext = os.path.splitext(path)[1].lower()
+    rows = []
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if ext == ".csv":
+            rows = list(csv.DictReader(f))
+        elif ext in (".jsonl", ".json"):
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    raise ValueError(f"Line {line_no}: invalid JSON ({e})")
+                if isinstance(row, str):
+                    row = {"prompt": row}
+                if not isinstance(row, dict):
+                    raise ValueError(f"Line {line_no}: expected an object with a 'prompt' field")
+                rows.append(row)
+        else:
+            raise ValueError(f"Unsupported prompt set format '{ext}' (use .jsonl or .csv)")
+
+    prompts = []
+    seen_ids = set()
+    for n, row in enumerate(rows, 1):
+        text = (row.get("prompt") or row.get("user_prompt") or "").strip()
+        if not text:
+            raise ValueError(f"Row {n}: missing 'prompt'")
+        system = row.get("system") or row.get("system_prompt")
+        pid = str(row.get("id") or "").strip() or f"p{n:03d}"
+        if pid in seen_ids:
+            raise ValueError(f"Row {n}: duplicate id '{pid}'")
+        seen_ids.add(pid)
+        prompts.append({"id": pid, "system": system.strip() if system else None, "prompt": text})
+    return prompts
+
+
+# Sampling parameters a sweep may vary, their types and the short names used in filenames
+SWEEP_PARAMS = {"temperature": (float, "temp"), "top_p": (float, "topp"), "max_tokens": (int, "max"),
+                "seed": (int, "seed"), "repeat_penalty": (float, "rep")}
+
+
+def parse_sweep(spec: str) -> list[dict]:
+    """Sampling parameter sets from a grid ("temperature=0.2,0.7 top_p=0.9,1"
+    expands to every combination) or a JSON list of objects. An empty spec
+    means no sweep."""
+    spec = spec.strip()
+    if not spec:
+        return []
+    if spec.startswith("["):
+        try:
+            sets = json.loads(spec)
+        except ValueError as e:
+            raise ValueError(f"Invalid sweep JSON ({e})")
+        if not isinstance(sets, list) or not all(isinstance(s, dict) for s in sets):
+            raise ValueError("Sweep JSON must be a list of objects")
+        grid = None
+    else:
+        grid = {}
+        for term in spec.replace(";", " ").split():
+            key, sep, values = term.partition("=")
+            if not sep or not values:
+                raise ValueError(f"Sweep term '{term}' is not key=value[,value…]")
+            grid[key.strip()] = values.split(",")
+        sets = [dict(zip(grid, combo)) for combo in itertools.product(*grid.values())]
+
+    parsed = []
+    for params in sets:
+        unknown = set(params) - set(SWEEP_PARAMS)
+        if unknown:
+            raise ValueError(f"Unknown sweep parameter(s): {', '.join(sorted(unknown))} "
+                             f"(use {', '.join(SWEEP_PARAMS)})")
+        try:
+            params = {k: SWEEP_PARAMS[k][0](v) for k, v in params.items()}
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid value in sweep parameter set {params}")
+        if params not in parsed:
+            parsed.append(params)
+    return parsed
+
+
+def prompt_text(prompt: dict) -> str:
+    """The part of a request the server can cache as a prefix: system prompt, then user message."""
+    return f"{prompt['system'] or ''}\x00{prompt['prompt']}"
+
+
+def order_by_prefix(cells: list[tuple]) -> list[tuple]:
+    """Sort (prompt, sample, params) cells by prompt text. In sorted order
+    every shared prefix (a common system prompt or preamble) forms one
+    contiguous run, so consecutive requests to a model reuse the longest
+    possible cached prefix. Stable: samples and parameter sets of one
+    prompt stay together in their original order."""
+    return sorted(cells, key=lambda cell: prompt_text(cell[0]))
+
+
+def prefix_reuse(prompts: list[dict]) -> float:
+    """Share of prompt text (characters) each request has in common with the one before it."""
+    texts = [prompt_text(p) for p in prompts]
+    total = sum(len(t) for t in texts[1:])
+    if not total:
+        return 0.0
+    return sum(len(os.path.commonprefix([a, b])) for a, b in zip(texts, texts[1:])) / total
+
+
+def params_label(params: dict | None) -> str:
+    """Short, filename-safe tag of a parameter set, e.g. temp0.7_topp0.9."""
+    if not params:
+        return "default"
+    return "_".join(f"{SWEEP_PARAMS[k][1]}{params[k]:g}" if isinstance(params[k], float)
+                    else f"{SWEEP_PARAMS[k][1]}{params[k]}" for k in SWEEP_PARAMS if k in params)
+
+
+# ──────────────────────────────────────────────
+#  Reasoning parser
+# ──────────────────────────────────────────────
+# (open, close) pairs used by common reasoning models; matched case-insensitively
+REASONING_DELIMITERS = (
+    ("<think>", "</think>"),
+    ("<thinking>", "</thinking>"),
+    ("<reasoning>", "</reasoning>"),
+    ("<|begin_of_thought|>", "<|end_of_thought|>"),
+    ("[THINK]", "[/THINK]"),
+)
+
+
+class ReasoningParser:
+    """Incremental state machine that splits model output into reasoning and
+    answer segments while text streams in.
+
+    feed() returns [(kind, text)] with kind "reasoning" or "answer" and the
+    delimiters removed; only a possible partial tag is held back between
+    chunks. Nested blocks are tracked with a stack, a block left open at
+    the end (cut off by max_tokens) is flagged as truncated, and a closing
+    tag with no opening one (chat templates that pre-open <think>) turns
+    the text before it into reasoning. That last case holds the leading
+    text back, but only for implicit_open_limit characters: past that it is
+    released as answer so streamed files keep growing. split_reasoning()
+    sees the whole response and lifts the limit."""
+
+    def __init__(self, delimiters=REASONING_DELIMITERS, implicit_open_limit: int = 512):
+        self._closing = {o.lower(): c.lower() for o, c in delimiters}
+        self._close_tags = set(self._closing.values())
+        self._tags = sorted(set(self._closing) | self._close_tags, key=len, reverse=True)
+        self._starts = {t[0] for t in self._tags}
+        self._implicit_limit = implicit_open_limit
+        self._buf = ""
+        self._stack: list[str] = []
+        self._pending: list[str] = []   # leading text that may turn out to be reasoning
+        self._pending_len = 0
+        self._tag_seen = False
+        self.reasoning_chars = 0
+        self.answer_chars = 0
+        self.blocks = 0
+        self.truncated = False
+
+    def feed(self, text: str) -> list[tuple[str, str]]:
+        out: list[tuple[str, str]] = []
+        self._buf += text
+        buf, pos = self._buf, 0
+        while True:
+            idx = next((i for i in range(pos, len(buf)) if buf[i] in self._starts), -1)
+            if idx < 0:
+                self._emit(buf[pos:], out)
+                self._buf = ""
+                return out
+            self._emit(buf[pos:idx], out)
+            rest = buf[idx:idx + len(self._tags[0])].lower()
+            tag = next((t for t in self._tags if rest.startswith(t)), None)
+            if tag:
+                self._tag(tag, out)
+                pos = idx + len(tag)
+            elif any(t.startswith(rest) for t in self._tags) and idx + len(rest) == len(buf):
+                # Possibly a tag split across chunks: wait for more text
+                self._buf = buf[idx:]
+                return out
+            else:
+                self._emit(buf[idx], out)
+                pos = idx + 1
+
+    def finish(self) -> list[tuple[str, str]]:
+        """Flush whatever is held back at the end of the stream."""
+        out: list[tuple[str, str]] = []
+        self._emit(self._buf, out)
+        self._buf = ""
+        self._flush_pending("answer", out)
+        self.truncated = bool(self._stack)
+        return out
+
+    def _emit(self, text: str, out: list):
+        if not text:
+            return
+        if self._stack:
+            self.reasoning_chars += len(text)
+            self._append(out, "reasoning", text)
+        elif not self._tag_seen:
+            self._pending.append(text)
+            self._pending_len += len(text)
+            if self._pending_len > self._implicit_limit:
+                self._tag_seen = True
+                self._flush_pending("answer", out)
+        else:
+            self.answer_chars += len(text)
+            self._append(out, "answer", text)
+
+    def _tag(self, tag: str, out: list):
+        if tag in self._closing:
+            self._flush_pending("answer", out)
+            if not self._stack:
+                self.blocks += 1
+            self._stack.append(self._closing[tag])
+        elif tag in self._stack:
+            # Close the matching block (and anything left open inside it)
+            while self._stack.pop() != tag:
+                pass
+        elif not self._stack and not self._tag_seen and self._pending:
+            # Closing tag without an opening one: everything so far was reasoning
+            self.blocks += 1
+            self._flush_pending("reasoning", out)
+        # A stray closing tag is dropped
+        self._tag_seen = True
+
+    def _flush_pending(self, kind: str, out: list):
+        if not self._pending:
+            return
+        text = "".join(self._pending)
+        self._pending, self._pending_len = [], 0
+        if kind == "reasoning":
+            self.reasoning_chars += len(text)
+        else:
+            self.answer_chars += len(text)
+        self._append(out, kind, text)
 
-        self._build_ui()
-        self.root.after(100, self._refresh_models)
+    @staticmethod
+    def _append(out: list, kind: str, text: str):
+        if out and out[-1][0] == kind:
+            out[-1] = (kind, out[-1][1] + text)
+        else:
+            out.append((kind, text))
+
+    def token_split(self, completion_tokens: int) -> tuple[int, int]:
+        """Apportion completion tokens to (reasoning, answer) by character share."""
+        total = self.reasoning_chars + self.answer_chars
+        if not total or not completion_tokens:
+            return 0, completion_tokens or 0
+        reasoning = round(completion_tokens * self.reasoning_chars / total)
+        return reasoning, completion_tokens - reasoning
+
+
+def split_reasoning(text: str) -> tuple[str, str, ReasoningParser]:
+    """Split a complete response into (reasoning, answer, parser)."""
+    parser = ReasoningParser(implicit_open_limit=len(text))
+    parts = {"reasoning": [], "answer": []}
+    for kind, seg in parser.feed(text) + parser.finish():
+        parts[kind].append(seg)
+    return "".join(parts["reasoning"]), "".join(parts["answer"]), parser
+
+
+# ──────────────────────────────────────────────
+#  Cancellation
+# ──────────────────────────────────────────────
+class CancelToken:
+    """Cooperative cancellation shared by a batch's threads. Waits made
+    through wait() return as soon as it is cancelled, and HTTP requests
+    sent inside scope() are aborted by shutting their socket down, which
+    unblocks a pending read at once and makes LM Studio drop the request."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: dict[int, object] = {}
+        self._next_id = 0
+        self.cancelled_at: float | None = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.cancelled_at = time.time()
+            self._event.set()
+            callbacks = list(self._callbacks.values())
+        for callback in callbacks:
+            callback()
+
+    def wait(self, timeout: float | None) -> bool:
+        """Sleep up to timeout seconds; True if cancelled meanwhile."""
+        return self._event.wait(timeout)
+
+    @contextmanager
+    def on_cancel(self, callback):
+        """Call callback() on cancel while inside the block (at once if already cancelled)."""
+        with self._lock:
+            key = self._next_id
+            self._next_id += 1
+            self._callbacks[key] = callback
+            cancelled = self._event.is_set()
+        try:
+            if cancelled:
+                callback()
+            yield
+        finally:
+            with self._lock:
+                self._callbacks.pop(key, None)
+
+    @contextmanager
+    def scope(self):
+        """Abort the requests this thread makes inside the block on cancel."""
+        sockets: list[socket.socket] = []
+        lock = threading.Lock()
+
+        def abort():
+            with lock:
+                for sock in sockets:
+                    _shutdown(sock)
+
+        previous = getattr(_request_scope, "active", None)
+        _request_scope.active = (self, sockets, lock)
+        try:
+            with self.on_cancel(abort):
+                yield
+        finally:
+            _request_scope.active = previous
 
-    def _build_ui(self):
-        # We use a scrollable frame for main content
-        self.main_container = ctk.CTkScrollableFrame(self.root)
-        self.main_container.pack(fill="both", expand=True, padx=10, pady=10)
 
-        # ── System Prompt ───────────────────────────
-        ctk.CTkLabel(self.main_container, text="System Prompt (Optional):", font=ctk.CTkFont(weight="bold")).pack(anchor="w", padx=5)
-        self.sys_prompt_text = ctk.CTkTextbox(self.main_container, height=60)
-        self.sys_prompt_text.pack(fill="x", padx=5, pady=(0, 10))
+# The scope (token, sockets, lock) of the requests made on this thread, if any
+_request_scope = threading.local()
 
-        # ── User Prompt ─────────────────────────────
-        ctk.CTkLabel(self.main_container, text="User Prompt:", font=ctk.CTkFont(weight="bold")).pack(anchor="w", padx=5)
-        self.prompt_text = ctk.CTkTextbox(self.main_container, height=120)
-        self.prompt_text.pack(fill="x", padx=5, pady=(0, 10))
 
-        # ── Output Options ──────────────────────────
-        opts_frame = ctk.CTkFrame(self.main_container, fg_color="transparent")
-        opts_frame.pack(fill="x", padx=5, pady=(0, 10))
-        
-        ctk.CTkLabel(opts_frame, text="Output Format:").pack(side="left", padx=(0, 5))
-        self.format_var = ctk.StringVar(value=".md")
-        self.format_menu = ctk.CTkOptionMenu(opts_frame, variable=self.format_var, values=[".md", ".txt"], width=80)
-        self.format_menu.pack(side="left", padx=(0, 20))
-
-        self.skip_thinking_var = ctk.BooleanVar(value=False)
-        self.skip_thinking_cb = ctk.CTkCheckBox(opts_frame, text="Skip Thinking Part (<think>...)", variable=self.skip_thinking_var)
-        self.skip_thinking_cb.pack(side="left", padx=(0, 20))
-
-        ctk.CTkLabel(opts_frame, text="Filename format:").pack(side="left", padx=(0, 5))
-        self.filename_fmt_var = ctk.StringVar(value="{session}_{model}_response")
-        ctk.CTkEntry(opts_frame, textvariable=self.filename_fmt_var, width=180).pack(side="left", padx=(0, 5))
-        ctk.CTkLabel(opts_frame, text="({model}, {session})", text_color="gray", font=("", 10)).pack(side="left")
-
-        # ── Output folder ───────────────────────────
-        folder_frame = ctk.CTkFrame(self.main_container, fg_color="transparent")
-        folder_frame.pack(fill="x", padx=5, pady=(0, 10))
-        ctk.CTkLabel(folder_frame, text="Output Folder:").pack(side="left", padx=(0, 5))
-        self.folder_var = ctk.StringVar()
-        ctk.CTkEntry(folder_frame, textvariable=self.folder_var).pack(side="left", fill="x", expand=True, padx=(0, 5))
-        ctk.CTkButton(folder_frame, text="Browse…", command=self._browse_folder, width=80).pack(side="left")
-
-        # ── Advanced Settings Toggle & Theme ─────────
-        opts_bar = ctk.CTkFrame(self.main_container, fg_color="transparent")
-        opts_bar.pack(fill="x", padx=5, pady=(0, 5))
-        
-        self.adv_toggle_btn = ctk.CTkButton(opts_bar, text="⚙ Advanced Settings ▼", command=self._toggle_advanced, fg_color="transparent", text_color=("black", "white"), border_width=1)
-        self.adv_toggle_btn.pack(side="left")
-        
-        self.theme_var = ctk.StringVar(value="dark")
-        self.theme_switch = ctk.CTkSwitch(opts_bar, text="Dark Mode", command=self._toggle_theme, variable=self.theme_var, onvalue="dark", offvalue="light")
-        self.theme_switch.pack(side="right")
+def _shutdown(sock: socket.socket):
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass  # already closed
 
-        self.adv_frame = ctk.CTkFrame(self.main_container, fg_color=("gray90", "gray13"))
-        
-        # Row 1 (Server & Wait)
-        adv_row1 = ctk.CTkFrame(self.adv_frame, fg_color="transparent")
-        adv_row1.pack(fill="x", pady=5)
-        
-        ctk.CTkLabel(adv_row1, text="Server URL:").pack(side="left", padx=(0,5))
-        self.server_url_var = ctk.StringVar(value="http://localhost:1234")
-        ctk.CTkEntry(adv_row1, textvariable=self.server_url_var, width=160).pack(side="left", padx=(0,20))
-        
-        ctk.CTkLabel(adv_row1, text="Wait after unload (sec):").pack(side="left", padx=(0,5))
-        self.delay_var = ctk.StringVar(value="5")
-        ctk.CTkEntry(adv_row1, textvariable=self.delay_var, width=50).pack(side="left", padx=(0,20))
-
-        ctk.CTkLabel(adv_row1, text="Max Wait Time (sec):").pack(side="left", padx=(0,5))
-        self.max_wait_var = ctk.StringVar(value="3600")
-        ctk.CTkEntry(adv_row1, textvariable=self.max_wait_var, width=50).pack(side="left", padx=(0,5))
-        ctk.CTkLabel(adv_row1, text="(Leave blank or 0 for infinite)", text_color="gray", font=("", 10)).pack(side="left")
-
-        # Row 2 (Temp & Tokens)
-        adv_row2 = ctk.CTkFrame(self.adv_frame, fg_color="transparent")
-        adv_row2.pack(fill="x", pady=5)
-
-        ctk.CTkLabel(adv_row2, text="Temperature:").pack(side="left", padx=(0,5))
-        self.temp_var = ctk.DoubleVar(value=0.7)
-        self.temp_slider = ctk.CTkSlider(adv_row2, from_=0.1, to=1.0, variable=self.temp_var, width=120)
-        self.temp_slider.pack(side="left", padx=(0,10))
-        self.temp_label = ctk.CTkLabel(adv_row2, text="0.70")
-        self.temp_label.pack(side="left", padx=(0,10))
-        self.temp_slider.configure(command=lambda v: self.temp_label.configure(text=f"{v:.2f}"))
-
-        self.use_default_temp_var = ctk.BooleanVar(value=True)
-        self.use_default_temp_cb = ctk.CTkCheckBox(adv_row2, text="Use Model Default", variable=self.use_default_temp_var, command=self._toggle_temp_slider)
-        self.use_default_temp_cb.pack(side="left", padx=(0,30))
-        self.temp_slider.configure(state="disabled")
-
-        ctk.CTkLabel(adv_row2, text="Max Tokens:").pack(side="left", padx=(0,5))
-        self.tokens_var = ctk.DoubleVar(value=-1)
-        self.tokens_slider = ctk.CTkSlider(adv_row2, from_=-1, to=16384, variable=self.tokens_var, width=150)
-        self.tokens_slider.pack(side="left", padx=(0,10))
-        self.tokens_label = ctk.CTkLabel(adv_row2, text="-1")
-        self.tokens_label.pack(side="left")
-        self.tokens_slider.configure(command=lambda v: self.tokens_label.configure(text=f"{int(v)}"))
-
-        # ── Model list ──────────────────────────────
-        model_header = ctk.CTkFrame(self.main_container, fg_color="transparent")
-        model_header.pack(fill="x", padx=5, pady=(10, 5))
-        ctk.CTkLabel(model_header, text="Available Models:", font=ctk.CTkFont(weight="bold")).pack(side="left")
-        ctk.CTkButton(model_header, text="↻ Refresh Models", command=self._refresh_models, width=110).pack(side="right")
-        ctk.CTkButton(model_header, text="Select All", command=self._select_all, width=80).pack(side="right", padx=5)
-        ctk.CTkButton(model_header, text="Deselect All", command=self._deselect_all, width=80).pack(side="right")
-
-        self.list_frame = ctk.CTkScrollableFrame(self.main_container, height=200, fg_color=("#F9F9F9", "#1E1E1E"), border_width=1, border_color=("#CCCCCC", "#333333"))
-        self.list_frame.pack(fill="both", expand=True, padx=5, pady=5)
-
-        self._model_vars: dict[str, ctk.BooleanVar] = {}
-        self._model_labels: dict[str, ctk.CTkLabel] = {}
-        self._model_rows: dict[str, ctk.CTkFrame] = {}
-
-        # ── Progress / Status ───────────────────────
-        prog_frame = ctk.CTkFrame(self.main_container, fg_color="transparent")
-        prog_frame.pack(fill="x", padx=5, pady=(10, 5))
-
-        self.counter_var = ctk.StringVar(value="Models: –")
-        ctk.CTkLabel(prog_frame, textvariable=self.counter_var, font=ctk.CTkFont(weight="bold")).pack(side="right")
-
-        self.progress_bar = ctk.CTkProgressBar(self.main_container)
-        self.progress_bar.pack(fill="x", padx=5, pady=5)
-        self.progress_bar.set(0)
-
-        self.status_var = ctk.StringVar(value="Status: Ready")
-        self.status_label = ctk.CTkLabel(self.main_container, textvariable=self.status_var, text_color="#3498DB", font=ctk.CTkFont(slant="italic"))
-        self.status_label.pack(pady=5)
-
-        # ── Action buttons ──────────────────────────
-        btn_frame = ctk.CTkFrame(self.main_container, fg_color="transparent")
-        btn_frame.pack(pady=10)
-
-        self.start_btn = ctk.CTkButton(btn_frame, text="▶ Start Batch", command=self._start_batch)
-        self.start_btn.pack(side="left", padx=5)
-
-        self.pause_btn = ctk.CTkButton(btn_frame, text="⏸ Pause", command=self._toggle_pause, state="disabled")
-        self.pause_btn.pack(side="left", padx=5)
-
-        self.stop_btn = ctk.CTkButton(btn_frame, text="⏹ Stop", command=self._stop_batch, state="disabled", fg_color="#E74C3C", hover_color="#C0392B")
-        self.stop_btn.pack(side="left", padx=5)
-
-        self.open_folder_btn = ctk.CTkButton(btn_frame, text="📂 Open Output Folder", command=self._open_output_folder, state="disabled")
-        self.open_folder_btn.pack(side="left", padx=5)
-
-        # ── Developer Footer ────────────────────────
-        dev_label = ctk.CTkLabel(
-            self.main_container, 
-            text="Developed by Kiranjot Singh Malhotra",
-            text_color=("gray60", "gray40"), 
-            font=ctk.CTkFont(size=11, slant="italic"),
-            cursor="hand2"
-        )
-        dev_label.pack(side="bottom", pady=(10, 0))
-        dev_label.bind("<Button-1>", lambda e: webbrowser.open("https://github.com/skiranjotsingh"))
-
-    def _toggle_advanced(self):
-        if self.adv_frame.winfo_ismapped():
-            self.adv_frame.pack_forget()
-            self.adv_toggle_btn.configure(text="⚙ Advanced Settings ▼")
-        else:
-            self.adv_frame.pack(fill="x", padx=5, pady=(0, 10), after=self.adv_toggle_btn.master)
-            self.adv_toggle_btn.configure(text="⚙ Advanced Settings ▲")
 
-    def _toggle_temp_slider(self):
-        if self.use_default_temp_var.get():
-            self.temp_slider.configure(state="disabled")
-        else:
-            self.temp_slider.configure(state="normal")
+class _CancellableConnection:
+    """Registers the socket of every request made inside a CancelToken scope
+    just before blocking on the response, so cancel() can shut it down."""
 
-    def _toggle_theme(self):
-        new_mode = self.theme_var.get()
-        ctk.set_appearance_mode(new_mode)
-        if new_mode == "dark":
-            self.theme_switch.configure(text="Dark Mode")
-        else:
-            self.theme_switch.configure(text="Light Mode")
+    def getresponse(self, *args, **kwargs):
+        active = getattr(_request_scope, "active", None)
+        if active and self.sock is not None:
+            token, sockets, lock = active
+            with lock:
+                sockets.append(self.sock)
+            if token.cancelled:
+                _shutdown(self.sock)
+        return super().getresponse(*args, **kwargs)
 
-    def _get_lm_urls(self):
-        base = self.server_url_var.get().strip().rstrip("/")
-        return f"{base}/v1", f"{base}/api/v1"
 
-    # ──────────────────────────────────────────────
-    #  Model list helpers
-    # ──────────────────────────────────────────────
-    def _refresh_models(self):
-        for widget in self.list_frame.winfo_children():
-            widget.destroy()
-        self._model_vars.clear()
-        self._model_labels.clear()
-        self._model_rows.clear()
-
-        self._set_status("Fetching models…")
-        base = self.server_url_var.get().strip().rstrip("/")
-        
-        try:
-            # Secondary fetch to get size_bytes (api/v0 doesn't include sizes, but api/v1 does)
-            sizes_map = {}
-            try:
-                r1 = requests.get(f"{base}/api/v1/models", timeout=5)
-                if r1.ok:
-                    for m1 in r1.json().get("models", []):
-                        key = m1.get("key", "")
-                        sb = m1.get("size_bytes")
-                        if key and sb:
-                            sizes_map[key] = sb
-                            # v0 ids may have @quantization suffix (e.g. "model@iq3_m")
-                            qname = ""
-                            q = m1.get("quantization")
-                            if isinstance(q, dict):
-                                qname = q.get("name", "")
-                            elif isinstance(q, str):
-                                qname = q
-                            if qname:
-                                sizes_map[f"{key}@{qname.lower()}"] = sb
-            except Exception:
-                pass
+class _CancellableHTTPConnection(_CancellableConnection, HTTPConnection):
+    pass
 
-            r = requests.get(f"{base}/api/v0/models", timeout=10)
-            r.raise_for_status()
-            data = r.json()
-            models = []
-            if isinstance(data, dict) and "data" in data:
-                for m in data["data"]:
-                    mid = m.get("id") or m.get("name")
-                    display_name = m.get("name") or mid
-                    if mid:
-                        size_bytes = sizes_map.get(mid)
-                        size_str = ""
-                        if size_bytes:
-                            size_gb = size_bytes / (1024**3)
-                            if size_gb >= 1:
-                                size_str = f"{size_gb:.2f} GB"
-                            else:
-                                size_mb = size_bytes / (1024**2)
-                                size_str = f"{size_mb:.2f} MB"
-                        models.append({"id": mid, "display_name": display_name, "size_str": size_str})
-            
-            if not models:
-                ctk.CTkLabel(self.list_frame, text="No models found. Check Server URL and LM Studio.", text_color="gray").pack(anchor="w", padx=6, pady=4)
-                self.counter_var.set("Models: 0 total, 0 done")
-                self._set_status("No models found.")
-                return
 
-            for m in models:
-                model_id = m["id"]
-                display_name = m["display_name"]
-                size_str = m["size_str"]
-                display_text = f"{display_name} ({size_str})" if size_str else display_name
-                
-                var = ctk.BooleanVar(value=True)
-                row = ctk.CTkFrame(self.list_frame, fg_color="transparent", corner_radius=0)
-                row.pack(fill="x", padx=4, pady=2)
-                
-                cb = ctk.CTkCheckBox(row, text=display_text, variable=var)
-                cb.pack(side="left", padx=5)
-                
-                lbl = ctk.CTkLabel(row, text="", width=100, text_color="gray", anchor="e")
-                lbl.pack(side="right", padx=5)
-                
-                self._model_vars[model_id] = var
-                self._model_labels[model_id] = lbl
-                self._model_rows[model_id] = row
+class _CancellableHTTPSConnection(_CancellableConnection, HTTPSConnection):
+    pass
 
-            self.counter_var.set(f"Models: {len(models)} total, 0 done")
-            self._set_status(f"Found {len(models)} model(s). Ready.")
 
-        except Exception as e:
-            ctk.CTkLabel(self.list_frame, text=f"Error connecting to LM Studio: {e}", text_color="#E74C3C").pack(anchor="w", padx=6, pady=4)
-            self._set_status("Error fetching models.", error=True)
+class _CancellableHTTPPool(HTTPConnectionPool):
+    ConnectionCls = _CancellableHTTPConnection
 
-    def _select_all(self):
-        for var in self._model_vars.values():
-            var.set(True)
 
-    def _deselect_all(self):
-        for var in self._model_vars.values():
-            var.set(False)
+class _CancellableHTTPSPool(HTTPSConnectionPool):
+    ConnectionCls = _CancellableHTTPSConnection
 
-    # ──────────────────────────────────────────────
-    #  LM Studio API
-    # ──────────────────────────────────────────────
-    def _get_loaded_models(self) -> list[dict]:
+
+class _CancellableAdapter(requests.adapters.HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _CancellableHTTPPool, "https": _CancellableHTTPSPool}
+
+
+# ──────────────────────────────────────────────
+#  LM Studio HTTP client
+# ──────────────────────────────────────────────
+class LMStudioClient:
+    """HTTP client for one LM Studio server, independent of any UI.
+
+    Owns a keep-alive requests.Session so polling, load/unload and chat
+    calls reuse pooled connections instead of opening a new TCP connection
+    per request. Timeouts are set per endpoint, and the unload payload
+    shape the server accepted is remembered for later calls. Calls made
+    inside a CancelToken.scope() are aborted when the token is cancelled."""
+
+    DEFAULT_TIMEOUTS = {
+        "models": 5,               # /api/v0/models state checks
+        "catalog": 10,             # full model catalog fetches
+        "load": LOAD_TIMEOUT,
+        "unload": UNLOAD_TIMEOUT,
+    }
+
+    # Payload shapes accepted by different LM Studio versions for /models/unload
+    UNLOAD_SHAPES = ("model", "identifier", "instance_id", "model+instance_id")
+
+    # Seconds a fetched model listing is reused by fetch_catalog(); load/unload
+    # calls invalidate it
+    CATALOG_TTL = 5.0
+    # Seconds a loaded-model listing is reused by one-off state checks; readiness
+    # polls always fetch it live
+    STATE_TTL = 2.0
+
+    def __init__(self, base_url: str, pool_size: int = 10, timeouts: dict | None = None,
+                 catalog_ttl: float = CATALOG_TTL):
+        self.base_url = base_url.strip().rstrip("/")
+        self.lm_base = f"{self.base_url}/v1"
+        self.lm_admin = f"{self.base_url}/api/v1"
+        self.timeouts = dict(self.DEFAULT_TIMEOUTS, **(timeouts or {}))
+        self.catalog_ttl = catalog_ttl
+        self._unload_shape: str | None = None
+        self._cache_lock = threading.Lock()
+        self._listing_cache: dict[str, tuple[float, list[dict]]] = {}   # endpoint -> (fetched at, entries)
+
+        self.session = requests.Session()
+        adapter = _CancellableAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self):
+        self.session.close()
+
+    def list_models_v0(self, timeout: float | None = None, max_age: float = 0.0) -> list[dict]:
+        """Raw /api/v0/models entries (ids, names and load 'state'). A listing
+        fetched less than max_age seconds ago is reused."""
+        def fetch():
+            r = self.session.get(f"{self.base_url}/api/v0/models", timeout=timeout or self.timeouts["catalog"])
+            r.raise_for_status()
+            data = r.json()
+            return data.get("data", []) if isinstance(data, dict) else []
+        return self._cached("v0", max_age, fetch)
+
+    def list_models_v1(self, timeout: float | None = None, max_age: float = 0.0) -> list[dict]:
+        """Raw /api/v1/models entries (keys, size_bytes and quantization)."""
+        def fetch():
+            r = self.session.get(f"{self.lm_admin}/models", timeout=timeout or self.timeouts["models"])
+            r.raise_for_status()
+            return r.json().get("models", [])
+        return self._cached("v1", max_age, fetch)
+
+    def _cached(self, key: str, max_age: float, fetch) -> list[dict]:
+        if max_age > 0:
+            with self._cache_lock:
+                hit = self._listing_cache.get(key)
+            if hit and time.time() - hit[0] < max_age:
+                return hit[1]
+        entries = fetch()
+        with self._cache_lock:
+            self._listing_cache[key] = (time.time(), entries)
+        return entries
+
+    def invalidate_cache(self):
+        with self._cache_lock:
+            self._listing_cache.clear()
+
+    def fetch_catalog(self, max_age: float | None = None) -> list[dict]:
+        """Every downloaded model as {'id', 'display_name', 'size_bytes',
+        'size_str'}. api/v0 (ids, state) and api/v1 (sizes, quantization)
+        are fetched concurrently; listings younger than max_age (default
+        catalog_ttl) are reused. A failing v0 fetch raises."""
+        max_age = self.catalog_ttl if max_age is None else max_age
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="catalog") as pool:
+            v1 = pool.submit(self.list_models_v1, max_age=max_age)
+            v0 = pool.submit(self.list_models_v0, max_age=max_age)
+            # api/v0 doesn't include sizes, but api/v1 does
+            sizes_map = {}
+            try:
+                for m1 in v1.result():
+                    key = m1.get("key", "")
+                    sb = m1.get("size_bytes")
+                    if key and sb:
+                        sizes_map[key] = sb
+                        # v0 ids may have @quantization suffix (e.g. "model@iq3_m")
+                        qname = ""
+                        q = m1.get("quantization")
+                        if isinstance(q, dict):
+                            qname = q.get("name", "")
+                        elif isinstance(q, str):
+                            qname = q
+                        if qname:
+                            sizes_map[f"{key}@{qname.lower()}"] = sb
+            except Exception:
+                pass
+            v0_models = v0.result()
+
+        models = []
+        for m in v0_models:
+            mid = m.get("id") or m.get("name")
+            display_name = m.get("name") or mid
+            if mid:
+                size_bytes = sizes_map.get(mid)
+                models.append({"id": mid, "display_name": display_name,
+                               "size_bytes": size_bytes, "size_str": format_size(size_bytes)})
+        return models
+
+    def get_loaded_models(self, max_age: float = 0.0) -> list[dict]:
         """Return a list of dicts with 'id' and 'instance_id' for models
-        currently loaded in memory. Uses /api/v0/models which includes
-        a 'state' field to distinguish loaded vs not-loaded models."""
-        base = self.server_url_var.get().strip().rstrip("/")
+        currently loaded in memory, or [] when the server can't be reached.
+        Readiness polls need the live state (max_age=0, the default); one-off
+        state checks pass STATE_TTL and may get a listing that old."""
         try:
-            r = requests.get(f"{base}/api/v0/models", timeout=5)
-            r.raise_for_status()
             loaded = []
-            for m in r.json().get("data", []):
+            for m in self.list_models_v0(timeout=self.timeouts["models"], max_age=max_age):
                 if m.get("state") == "loaded":
                     loaded.append({
                         "id": m["id"],
@@ -330,78 +578,1512 @@ class LMStudioBatchApp:
         except Exception:
             return []
 
-    def _do_unload_request(self, model_id: str, instance_id: str) -> bool:
-        _, lm_admin = self._get_lm_urls()
-        for payload in [
-            {"model": model_id},
-            {"identifier": model_id},
-            {"instance_id": instance_id},
-            {"model": model_id, "instance_id": instance_id}
-        ]:
+    def load(self, model_id: str, **options) -> requests.Response:
+        self.invalidate_cache()
+        r = self.session.post(f"{self.lm_admin}/models/load",
+                              json=dict(options, model=model_id),
+                              timeout=self.timeouts["load"])
+        r.raise_for_status()
+        return r
+
+    def unload(self, model_id: str, instance_id: str) -> bool:
+        """Send an unload request, trying the last accepted payload shape first."""
+        self.invalidate_cache()
+        payloads = {
+            "model": {"model": model_id},
+            "identifier": {"identifier": model_id},
+            "instance_id": {"instance_id": instance_id},
+            "model+instance_id": {"model": model_id, "instance_id": instance_id},
+        }
+        shapes = list(self.UNLOAD_SHAPES)
+        if self._unload_shape:
+            shapes.remove(self._unload_shape)
+            shapes.insert(0, self._unload_shape)
+
+        for shape in shapes:
             try:
-                r = requests.post(f"{lm_admin}/models/unload", 
-                                  json=payload, timeout=UNLOAD_TIMEOUT)
+                r = self.session.post(f"{self.lm_admin}/models/unload",
+                                      json=payloads[shape], timeout=self.timeouts["unload"])
                 if r.ok:
+                    self._unload_shape = shape
                     return True
             except Exception:
                 pass
         return False
 
+    def chat_completion(self, payload: dict, timeout: float | None, stream: bool = False) -> requests.Response:
+        """POST /v1/chat/completions. The caller checks r.ok; with stream=True
+        the response must be closed (use it as a context manager)."""
+        return self.session.post(f"{self.lm_base}/chat/completions",
+                                 json=payload, stream=stream, timeout=timeout)
+
+
+# ──────────────────────────────────────────────
+#  Readiness polling
+# ──────────────────────────────────────────────
+def wait_until(predicate, timeout: float, should_stop=None, initial: float = 0.05,
+               max_interval: float = 1.0, factor: float = 2.0, cancel: CancelToken | None = None) -> bool:
+    """Poll predicate() until it returns True, starting fast and backing off
+    exponentially up to max_interval. Returns False on timeout, when
+    should_stop() becomes true or as soon as `cancel` is cancelled."""
+    deadline = time.time() + timeout
+    interval = initial
+    while True:
+        if (should_stop and should_stop()) or (cancel is not None and cancel.cancelled):
+            return False
+        if predicate():
+            return True
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return False
+        if cancel is not None:
+            if cancel.wait(min(interval, remaining)):
+                return False
+        else:
+            time.sleep(min(interval, remaining))
+        interval = min(interval * factor, max_interval)
+
+
+class ReadinessStats:
+    """Tracks time spent in load/unload waits next to what the fixed-sleep
+    path would have spent, so each run can report the time saved."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.actual = 0.0
+        self.fixed = 0.0
+
+    def record(self, actual: float, fixed: float):
+        with self._lock:
+            self.actual += actual
+            self.fixed += fixed
+
+    @property
+    def saved(self) -> float:
+        return max(0.0, self.fixed - self.actual)
+
+    @staticmethod
+    def fixed_poll_time(elapsed: float, interval: float) -> float:
+        """Estimated wait of a check-then-sleep(interval) loop that saw the
+        same state change after `elapsed` seconds (first check is free)."""
+        return interval * math.ceil(max(elapsed - 0.25, 0.0) / interval)
+
+
+
+# ──────────────────────────────────────────────
+#  Response cache
+# ──────────────────────────────────────────────
+class ResponseCache:
+    """On-disk (SQLite) cache of finished generations, keyed on a fingerprint
+    of the full request payload: model id, messages and every sampling
+    parameter. Entries older than max_age_days are dropped and the least
+    recently used ones are evicted once the cache exceeds max_bytes.
+    Safe to share between generation threads."""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = 512 * 1024**2,
+                 max_age_days: float = 30):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""CREATE TABLE IF NOT EXISTS responses (
+                                key TEXT PRIMARY KEY,
+                                model_id TEXT NOT NULL,
+                                content TEXT NOT NULL,
+                                stats TEXT NOT NULL,
+                                size INTEGER NOT NULL,
+                                created REAL NOT NULL,
+                                last_access REAL NOT NULL)""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_responses_access ON responses(last_access)")
+        self._db.commit()
+
+    @staticmethod
+    def fingerprint(payload: dict, sample: int | None = None) -> str:
+        """Stable hash of a chat payload. Transport-only keys (stream options)
+        are ignored; repeated samples of one prompt get distinct keys."""
+        request = {k: v for k, v in payload.items() if k not in ("stream", "stream_options")}
+        if sample:
+            request["_sample"] = sample
+        blob = json.dumps(request, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def contains(self, key: str) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM responses WHERE key = ?", (key,)).fetchone() is not None
+
+    def get(self, key: str) -> dict | None:
+        """Return {'content', 'stats', 'created'} for a hit and mark it as used."""
+        with self._lock:
+            row = self._db.execute("SELECT content, stats, created FROM responses WHERE key = ?",
+                                   (key,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+        return {"content": row[0], "stats": json.loads(row[1]), "created": row[2]}
+
+    def put(self, key: str, model_id: str, content: str, stats: dict):
+        stats_json = json.dumps(stats)
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (key, model_id, content, stats_json,
+                              len(content.encode("utf-8")) + len(stats_json), now, now))
+            self._db.commit()
+
+    def evict(self) -> int:
+        """Apply the age and size limits. Returns the number of entries removed."""
+        with self._lock:
+            removed = self._db.execute("DELETE FROM responses WHERE created < ?",
+                                       (time.time() - self.max_age_days * 86400,)).rowcount
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                for key, size in self._db.execute(
+                        "SELECT key, size FROM responses ORDER BY last_access").fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    total -= size
+                    removed += 1
+            self._db.commit()
+        return removed
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+
+# ──────────────────────────────────────────────
+#  Results store
+# ──────────────────────────────────────────────
+class ResultsStore:
+    """One queryable SQLite table holding every generation across sessions:
+    model, size, session, prompt, content, token counts, TPS and timings.
+    Per-model output files are just a view of it (see export_files), and
+    leaderboard() ranks models straight from the stored rows."""
+
+    COLUMNS = ("session", "model_id", "size_bytes", "prompt_id", "sample", "status", "cached", "content",
+               "prompt_tokens", "completion_tokens", "time_taken", "tps", "ttft", "prompt_eval",
+               "decode_tps", "reasoning_tokens", "reasoning_time", "params", "file", "created")
+
+    def __init__(self, path: str = DEFAULT_RESULTS_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""CREATE TABLE IF NOT EXISTS results (
+                                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                session TEXT NOT NULL,
+                                model_id TEXT NOT NULL,
+                                size_bytes INTEGER,
+                                prompt_id TEXT NOT NULL,
+                                sample INTEGER,
+                                status TEXT NOT NULL,
+                                cached INTEGER NOT NULL DEFAULT 0,
+                                content TEXT NOT NULL,
+                                prompt_tokens INTEGER,
+                                completion_tokens INTEGER,
+                                time_taken REAL,
+                                tps REAL,
+                                ttft REAL,
+                                prompt_eval REAL,
+                                decode_tps REAL,
+                                reasoning_tokens INTEGER,
+                                reasoning_time REAL,
+                                params TEXT,
+                                file TEXT,
+                                created REAL NOT NULL)""")
+        # Stores created before reasoning and sweeps were tracked
+        existing = {r[1] for r in self._db.execute("PRAGMA table_info(results)")}
+        for column, kind in (("reasoning_tokens", "INTEGER"), ("reasoning_time", "REAL"), ("params", "TEXT")):
+            if column not in existing:
+                self._db.execute(f"ALTER TABLE results ADD COLUMN {column} {kind}")
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_results_session ON results(session)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_results_model ON results(model_id)")
+        self._db.commit()
+
+    def add(self, session: str, model_id: str, prompt_id: str, sample: int | None, content: str,
+            stats: dict, size_bytes: int | None = None, file: str | None = None, params: dict | None = None):
+        row = (session, model_id, size_bytes, prompt_id, sample, stats.get("status", "ok"),
+               int(bool(stats.get("cached"))), content, stats.get("prompt_tokens"),
+               stats.get("completion_tokens"), stats.get("time_taken"), stats.get("tps"), stats.get("ttft"),
+               stats.get("prompt_eval"), stats.get("decode_tps"), stats.get("reasoning_tokens"),
+               stats.get("reasoning_time"), json.dumps(params) if params else None, file, time.time())
+        with self._lock:
+            self._db.execute(f"INSERT INTO results ({', '.join(self.COLUMNS)}) "
+                             f"VALUES ({', '.join('?' * len(self.COLUMNS))})", row)
+            self._db.commit()
+
+    def rows(self, session: str | None = None, model_id: str | None = None) -> list[dict]:
+        query, args = f"SELECT {', '.join(self.COLUMNS)} FROM results WHERE 1=1", []
+        if session:
+            query += " AND session = ?"
+            args.append(session)
+        if model_id:
+            query += " AND model_id = ?"
+            args.append(model_id)
+        with self._lock:
+            cur = self._db.execute(query + " ORDER BY id", args)
+            rows = [dict(zip(self.COLUMNS, r)) for r in cur.fetchall()]
+        for r in rows:
+            r["params"] = json.loads(r["params"]) if r["params"] else None
+        return rows
+
+    def throughput_history(self, model_id: str, limit: int = 50) -> list[tuple[float, int]]:
+        """(tps, completion_tokens) of the model's latest fresh, successful generations, oldest first."""
+        with self._lock:
+            cur = self._db.execute("SELECT tps, completion_tokens FROM results WHERE model_id = ? AND status = 'ok' "
+                                   "AND cached = 0 AND tps > 0 ORDER BY id DESC LIMIT ?", (model_id, limit))
+            return cur.fetchall()[::-1]
+
+    def sessions(self) -> list[str]:
+        with self._lock:
+            return [r[0] for r in self._db.execute("SELECT DISTINCT session FROM results ORDER BY session")]
+
+    def leaderboard(self, session: str | None = None) -> list[dict]:
+        """Per-model ranking by median TPS (fresh, successful generations
+        only; cache replays would repeat old timings). Each parameter set
+        of a sweep ranks as an entry of its own."""
+        by_model: dict[tuple[str, str | None], list[dict]] = {}
+        for r in self.rows(session):
+            if r["status"] == "ok" and not r["cached"]:
+                label = params_label(r["params"]) if r["params"] else None
+                by_model.setdefault((r["model_id"], label), []).append(r)
+
+        board = []
+        for (model_id, label), rows in by_model.items():
+            tps = [r["tps"] or 0.0 for r in rows]
+            latency = [r["time_taken"] or 0.0 for r in rows]
+            ttft = [r["ttft"] for r in rows if r["ttft"] is not None]
+            board.append({
+                "model_id": model_id,
+                "params": label,
+                "size_bytes": next((r["size_bytes"] for r in rows if r["size_bytes"]), None),
+                "responses": len(rows),
+                "sessions": len({r["session"] for r in rows}),
+                "tps_p50": percentile(tps, 50),
+                "tps_mean": sum(tps) / len(tps),
+                "latency_p50": percentile(latency, 50),
+                "latency_p95": percentile(latency, 95),
+                "ttft_p50": percentile(ttft, 50) if ttft else None,
+                "completion_tokens": sum(r["completion_tokens"] or 0 for r in rows),
+                "reasoning_tokens": sum(r["reasoning_tokens"] or 0 for r in rows),
+            })
+        board.sort(key=lambda b: (-b["tps_p50"], b["latency_p50"]))
+        return board
+
+    @staticmethod
+    def format_leaderboard(board: list[dict], markdown: bool = False) -> str:
+        headers = ["#", "Model", "Size", "Responses", "TPS p50", "TPS mean", "Latency p50", "Latency p95", "TTFT p50",
+                   "Thinking"]
+        rows = [[str(i), f"{b['model_id']} [{b['params']}]" if b.get("params") else b["model_id"],
+                 format_size(b["size_bytes"]) or "-", str(b["responses"]),
+                 f"{b['tps_p50']:.2f}", f"{b['tps_mean']:.2f}", f"{b['latency_p50']:.2f}s",
+                 f"{b['latency_p95']:.2f}s", f"{b['ttft_p50']:.2f}s" if b["ttft_p50"] is not None else "-",
+                 f"{100 * b['reasoning_tokens'] / b['completion_tokens']:.0f}%" if b["completion_tokens"] else "-"]
+                for i, b in enumerate(board, 1)]
+        if markdown:
+            lines = ["| " + " | ".join(headers) + " |", "|" + "---|" * len(headers)]
+            lines += ["| " + " | ".join(r) + " |" for r in rows]
+            return "\n".join(lines)
+        widths = [max(len(h), *(len(r[i]) for r in rows)) if rows else len(h) for i, h in enumerate(headers)]
+        fmt = lambda cells: "  ".join(c.ljust(w) if i == 1 else c.rjust(w)
+                                      for i, (c, w) in enumerate(zip(cells, widths)))
+        return "\n".join([fmt(headers), "-" * (sum(widths) + 2 * (len(widths) - 1))] + [fmt(r) for r in rows])
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+# ──────────────────────────────────────────────
+#  Load profiles
+# ──────────────────────────────────────────────
+# Load options a profile may set, and their types. They go into the
+# /api/v1/models/load body as-is, next to "model".
+LOAD_PROFILE_KEYS = {"context_length": int, "gpu_offload": float, "offload_kv_cache_to_gpu": bool,
+                     "flash_attention": bool, "kv_cache_type": str, "parallel": int}
+MIN_FALLBACK_CONTEXT = 2048
+
+
+def parse_load_profile(terms: list[str]) -> dict:
+    """Profile from key=value terms, e.g. ["context_length=8192", "gpu_offload=0.5"]."""
+    profile = {}
+    for term in terms:
+        key, sep, value = term.partition("=")
+        if not sep or key not in LOAD_PROFILE_KEYS:
+            raise ValueError(f"'{term}' is not key=value with key one of {', '.join(LOAD_PROFILE_KEYS)}")
+        kind = LOAD_PROFILE_KEYS[key]
+        if kind is bool:
+            if value.lower() not in ("true", "false", "1", "0", "on", "off"):
+                raise ValueError(f"{key} must be true or false")
+            profile[key] = value.lower() in ("true", "1", "on")
+        else:
+            try:
+                profile[key] = kind(value)
+            except ValueError:
+                raise ValueError(f"{key} must be {kind.__name__}")
+    return profile
+
+
+def describe_profile(profile: dict) -> str:
+    return ", ".join(f"{k}={v}" for k, v in profile.items()) or "LM Studio defaults"
+
+
+def fallback_ladder(profile: dict) -> list[dict]:
+    """Load profiles to try in order: the profile itself, then a halved
+    context (down to MIN_FALLBACK_CONTEXT; 8192 and 4096 when the profile
+    leaves the model's default), then the smallest context with the KV
+    cache kept in system RAM, then half and no GPU offload."""
+    ladder = [dict(profile)]
+    context = profile.get("context_length")
+    contexts = []
+    while context and context // 2 >= MIN_FALLBACK_CONTEXT and len(contexts) < 3:
+        context //= 2
+        contexts.append(context)
+    if not profile.get("context_length"):
+        contexts = [8192, 4096]
+    for context in contexts:
+        ladder.append(dict(ladder[-1], context_length=context))
+    if ladder[-1].get("offload_kv_cache_to_gpu", True):
+        ladder.append(dict(ladder[-1], offload_kv_cache_to_gpu=False))
+    for ratio in (0.5, 0.0):
+        if ladder[-1].get("gpu_offload", 1.0) > ratio:
+            ladder.append(dict(ladder[-1], gpu_offload=ratio))
+    return ladder
+
+
+class LoadProfiles:
+    """Per-model load profiles in a JSON file next to the app's other state.
+    Each entry keeps the profile the user configured and the profile that
+    last loaded successfully (after any fallback), so the next run starts
+    from what worked."""
+
+    def __init__(self, path: str = DEFAULT_PROFILES_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f)
+
+    def entries(self) -> dict[str, dict]:
+        with self._lock:
+            return {m: dict(e) for m, e in self._entries.items()}
+
+    def configured(self, model_id: str) -> dict:
+        with self._lock:
+            return dict(self._entries.get(model_id, {}).get("profile", {}))
+
+    def starting_profile(self, model_id: str, configured: dict | None = None) -> dict:
+        """Where to start loading: the last profile that worked, unless the
+        configured profile has changed since."""
+        with self._lock:
+            entry = self._entries.get(model_id, {})
+        if configured is None:
+            configured = entry.get("profile", {})
+        if "succeeded" in entry and entry.get("profile", {}) == configured:
+            return dict(entry["succeeded"])
+        return dict(configured)
+
+    def set(self, model_id: str, profile: dict | None):
+        """Configure a model's profile (None removes the entry); forgets what succeeded before."""
+        with self._lock:
+            if profile is None:
+                self._entries.pop(model_id, None)
+            else:
+                self._entries[model_id] = {"profile": dict(profile)}
+            self._save()
+
+    def record_success(self, model_id: str, configured: dict, succeeded: dict):
+        with self._lock:
+            entry = self._entries.get(model_id)
+            if entry and entry.get("profile") == configured and entry.get("succeeded") == succeeded:
+                return
+            self._entries[model_id] = {"profile": dict(configured), "succeeded": dict(succeeded),
+                                       "updated": time.time()}
+            self._save()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+# ──────────────────────────────────────────────
+#  Warm models
+# ──────────────────────────────────────────────
+class ModelResidency:
+    """The model a finished batch left loaded on each server, so the next
+    batch that needs it skips the reload. Kept in a JSON file so separate
+    processes (headless runs) see it too.
+
+    A parked model is unloaded once it has been idle for its TTL: by a timer
+    while this process lives, otherwise by whichever run claims the server
+    next. Claiming hands the model to a running batch, which stops the
+    timer until the model is parked again."""
+
+    _timers: dict[str, threading.Timer] = {}
+    _timers_lock = threading.Lock()
+
+    def __init__(self, path: str = DEFAULT_RESIDENCY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _read(self) -> dict[str, dict]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, entries: dict[str, dict]):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entries, f, indent=2)
+        os.replace(tmp, self.path)
+
+    def entries(self) -> dict[str, dict]:
+        with self._lock:
+            return self._read()
+
+    def park(self, server_url: str, model_id: str, ttl: float):
+        """Record that model_id stays loaded on server_url and start its idle timer."""
+        server_url = server_url.strip().rstrip("/")
+        entry = {"model": model_id, "parked": time.time(), "ttl": ttl}
+        with self._lock:
+            entries = self._read()
+            entries[server_url] = entry
+            self._write(entries)
+        self._cancel_timer(server_url)
+        timer = threading.Timer(ttl, self._expire, args=(server_url, entry))
+        timer.daemon = True
+        with self._timers_lock:
+            self._timers[server_url] = timer
+        timer.start()
+
+    def claim(self, server_url: str) -> tuple[str | None, dict | None]:
+        """Take the server's parked model for a new batch. Returns (model
+        still fresh enough to reuse, expired entry to evict); either may be None."""
+        server_url = server_url.strip().rstrip("/")
+        self._cancel_timer(server_url)
+        with self._lock:
+            entries = self._read()
+            entry = entries.pop(server_url, None)
+            if entry is not None:
+                self._write(entries)
+        if entry is None:
+            return None, None
+        if time.time() - entry["parked"] > entry["ttl"]:
+            return None, entry
+        return entry["model"], None
+
+    def evict(self, server_url: str, client: "LMStudioClient | None" = None) -> str | None:
+        """Unload the server's parked model now. Returns its id, or None when nothing was parked."""
+        model_id, expired = self.claim(server_url)
+        model_id = model_id or (expired or {}).get("model")
+        if model_id:
+            self._unload(server_url, model_id, client)
+        return model_id
+
+    def evict_all(self):
+        """Unload every model this process parked and is still timing (e.g. when the GUI closes)."""
+        with self._timers_lock:
+            servers = list(self._timers)
+        for server_url in servers:
+            self.evict(server_url)
+
+    def _expire(self, server_url: str, entry: dict):
+        with self._lock:
+            entries = self._read()
+            if entries.get(server_url) != entry:
+                return  # claimed or re-parked since
+            del entries[server_url]
+            self._write(entries)
+        with self._timers_lock:
+            self._timers.pop(server_url, None)
+        self._unload(server_url, entry["model"])
+
+    @staticmethod
+    def _unload(server_url: str, model_id: str, client: "LMStudioClient | None" = None):
+        own = client is None
+        client = client or LMStudioClient(server_url, pool_size=2)
+        try:
+            for m in client.get_loaded_models():
+                if m["id"] == model_id:
+                    client.unload(m["id"], m["instance_id"])
+        except Exception:
+            pass  # the server went away; nothing left to free
+        finally:
+            if own:
+                client.close()
+
+    @classmethod
+    def _cancel_timer(cls, server_url: str):
+        with cls._timers_lock:
+            timer = cls._timers.pop(server_url, None)
+        if timer:
+            timer.cancel()
+
+
+# ──────────────────────────────────────────────
+#  Deadlines and retries
+# ──────────────────────────────────────────────
+# HTTP statuses worth retrying: rate limiting, or the server (or a proxy) briefly unavailable
+TRANSIENT_HTTP = {429, 500, 502, 503, 504}
+
+
+def is_transient(error: Exception) -> bool:
+    """Connection drops and transient HTTP statuses. Timeouts are final: the
+    deadline was already spent once."""
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code in TRANSIENT_HTTP
+    return isinstance(error, requests.ConnectionError) and not isinstance(error, requests.Timeout)
+
+
+def backoff_delay(attempt: int, base: float, cap: float = 60.0) -> float:
+    """Seconds to wait before retry number `attempt` (1-based): base, 2×base, 4×base, … up to cap."""
+    return min(cap, base * 2 ** (attempt - 1))
+
+
+class ThroughputDeadlines:
+    """Per-model generation deadlines: expected completion tokens ÷ observed
+    TPS × a safety factor, so a hung or looping generation on a slow model
+    is cut off after minutes instead of the global max_wait. Seeded from
+    the results store and updated with every successful generation; a
+    model with too little history keeps max_wait."""
+
+    MIN_SAMPLES = 3
+    WINDOW = 50         # most recent generations per model that count
+
+    def __init__(self, factor: float = 3.0, floor: float = 60.0):
+        self.factor = factor
+        self.floor = floor
+        self._lock = threading.Lock()
+        self._tps: dict[str, deque] = {}
+        self._tokens: dict[str, deque] = {}
+
+    def observe(self, model_id: str, tps: float | None, tokens: int | None):
+        if not tps or tps <= 0 or not tokens:
+            return
+        with self._lock:
+            self._tps.setdefault(model_id, deque(maxlen=self.WINDOW)).append(tps)
+            self._tokens.setdefault(model_id, deque(maxlen=self.WINDOW)).append(tokens)
+
+    def deadline(self, model_id: str, max_wait: float | None, max_tokens: int | None = None) -> float | None:
+        """Seconds one generation of model_id may take, never more than max_wait.
+        A positive max_tokens bounds the expected length; otherwise it is the
+        p95 of the model's observed completions."""
+        with self._lock:
+            tps = list(self._tps.get(model_id, ()))
+            tokens = list(self._tokens.get(model_id, ()))
+        if len(tps) < self.MIN_SAMPLES:
+            return max_wait
+        expected = max_tokens if max_tokens and max_tokens > 0 else percentile(tokens, 95)
+        seconds = math.ceil(max(self.floor, expected / percentile(tps, 50) * self.factor))
+        return min(seconds, max_wait) if max_wait else seconds
+
+
+class CircuitBreaker:
+    """Counts consecutive failed generations per model. A model that reaches
+    the threshold is tripped and its remaining cells are skipped, so one
+    broken model can't hold up a long unattended batch."""
+
+    def __init__(self, threshold: int):
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._failures: dict[str, int] = {}
+        self._tripped: set[str] = set()
+
+    def record(self, model_id: str, ok: bool) -> bool:
+        """Count one generation. Returns True when this failure trips the breaker."""
+        with self._lock:
+            if model_id in self._tripped:
+                return False
+            self._failures[model_id] = 0 if ok else self._failures.get(model_id, 0) + 1
+            if self._failures[model_id] < self.threshold:
+                return False
+            self._tripped.add(model_id)
+            return True
+
+    def tripped(self, model_id: str) -> bool:
+        with self._lock:
+            return model_id in self._tripped
+
+    def report(self) -> dict[str, int]:
+        """Failures in a row of every tripped model."""
+        with self._lock:
+            return {m: self._failures[m] for m in self._tripped}
+
+
+# ──────────────────────────────────────────────
+#  Run journal
+# ──────────────────────────────────────────────
+class RunJournal:
+    """Append-only JSONL log of a batch session, fsync'ed after every record
+    so it survives crashes, sleep and LM Studio dying mid-run.
+
+    The first record holds the session id and full BatchConfig; later records
+    are state transitions: queued, loaded, generated, saved, unloaded and
+    model_done (per model or per (model, cell)). model_stopped and
+    model_failed record how an incomplete model ended; replay ignores them,
+    so its missing cells are run again."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        torn = False
+        if os.path.exists(path) and os.path.getsize(path):
+            with open(path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b"\n"
+        self._f = open(path, "a", encoding="utf-8")
+        if torn:
+            # Don't glue new records onto a line cut short by a crash
+            self._f.write("\n")
+
+    @staticmethod
+    def path_for(output_folder: str, session_id: str) -> str:
+        return os.path.join(output_folder, f"{session_id}_journal.jsonl")
+
+    def record(self, event: str, **fields):
+        line = json.dumps(dict(ts=time.time(), event=event, **fields), ensure_ascii=False)
+        with self._lock:
+            if self._f.closed:
+                return
+            self._f.write(line + "\n")
+            self._f.flush()
+            os.fsync(self._f.fileno())
+
+    def close(self):
+        with self._lock:
+            self._f.close()
+
+    @staticmethod
+    def replay(path: str) -> dict:
+        """Rebuild session state from a journal: the session header, the cells
+        already saved per model, the models that finished, and the model
+        that was left loaded (loaded without a later unload), if any."""
+        state = {"session": None, "saved": {}, "finished": set(), "resident": None}
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    # A crash can leave a torn last line; everything before it is intact
+                    continue
+                event = rec.get("event")
+                model = rec.get("model")
+                if event == "session":
+                    state["session"] = rec
+                elif event == "saved":
+                    state["saved"].setdefault(model, set()).add(rec["cell"])
+                elif event == "model_done":
+                    state["finished"].add(model)
+                elif rec.get("host"):
+                    continue
+                elif event == "loaded":
+                    state["resident"] = model
+                elif event == "unloaded" and (model is None or model == state["resident"]):
+                    state["resident"] = None
+        if state["session"] is None:
+            raise ValueError(f"{path} is not a batch journal (no session record)")
+        return state
+
+
+def cell_key(prompt: dict, sample: int | None, params: dict | None = None) -> str:
+    key = f"{prompt['id']}#{sample or 1}"
+    return f"{key}@{params_label(params)}" if params else key
+
+
+
+# ──────────────────────────────────────────────
+#  Output pipeline
+# ──────────────────────────────────────────────
+class StageMetrics:
+    """Counters for one pipeline stage: items handled, time spent working,
+    time producers were blocked on a full queue and the deepest backlog."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.count = 0
+        self.busy = 0.0
+        self.blocked = 0.0
+        self.max_depth = 0
+
+    def record(self, busy: float):
+        with self._lock:
+            self.count += 1
+            self.busy += busy
+
+    def observe(self, depth: int, blocked: float = 0.0):
+        with self._lock:
+            self.max_depth = max(self.max_depth, depth)
+            self.blocked += blocked
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"count": self.count, "busy": round(self.busy, 3), "blocked": round(self.blocked, 3),
+                    "max_depth": self.max_depth}
+
+
+class OutputWriter:
+    """Writer stage of the batch pipeline. Finished generations are queued on
+    a bounded queue and one background thread does the think-tag filtering,
+    serialization and disk I/O, so the batch thread can go straight on to
+    unloading and loading the next model. A full queue blocks the producer."""
+
+    def __init__(self, metrics: StageMetrics, maxsize: int = 32):
+        self.metrics = metrics
+        self._queue: queue.Queue = queue.Queue(maxsize)
+        self._thread = threading.Thread(target=self._drain, name="writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args) -> Future:
+        fut = Future()
+        start = time.time()
+        self._queue.put((fn, args, fut))
+        self.metrics.observe(self._queue.qsize(), time.time() - start)
+        return fut
+
+    def _drain(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            fn, args, fut = item
+            start = time.time()
+            try:
+                fut.set_result(fn(*args))
+            except Exception as e:
+                fut.set_exception(e)
+            self.metrics.record(time.time() - start)
+
+    def close(self):
+        """Finish every queued write, then stop the thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+
+def resolved(value) -> Future:
+    fut = Future()
+    fut.set_result(value)
+    return fut
+
+
+# ──────────────────────────────────────────────
+#  Timing spans
+# ──────────────────────────────────────────────
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0..100) of an unsorted list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def describe(values: list[float]) -> dict:
+    """n, mean, median, p95, sample stddev and coefficient of variation."""
+    n = len(values)
+    if not n:
+        return {"n": 0, "mean": None, "median": None, "p95": None, "stddev": None, "cv": None}
+    mean = statistics.fmean(values)
+    stddev = statistics.stdev(values) if n > 1 else 0.0
+    return {"n": n, "mean": mean, "median": statistics.median(values), "p95": percentile(values, 95),
+            "stddev": stddev, "cv": stddev / mean if mean else 0.0}
+
+
+class SpanRecorder:
+    """Collects timing spans for each phase of a batch (pre_clear,
+    load_request, load_confirm, generate, save, unload_request,
+    unload_verify, delay, …) and optionally appends every span as one JSON
+    line to an event log. Token usage is summed per model."""
+
+    def __init__(self, log_path: str | None = None, session_id: str = ""):
+        self.session_id = session_id
+        self._lock = threading.Lock()
+        self._durations: dict[str, list[float]] = {}
+        self.tokens: dict[str, dict[str, int]] = {}
+        self._log = open(log_path, "a", encoding="utf-8") if log_path else None
+        self.log_path = log_path
+
+    @contextmanager
+    def span(self, phase: str, **attrs):
+        """Time the enclosed block. Yields the attrs dict so the block can add
+        fields (status, token counts) that only become known inside it."""
+        start = time.time()
+        try:
+            yield attrs
+        except BaseException:
+            attrs["error"] = True
+            raise
+        finally:
+            self.add(phase, time.time() - start, start=start, **attrs)
+
+    def add(self, phase: str, duration: float, start: float | None = None, **attrs):
+        record = {"ts": round(start or time.time() - duration, 3), "session": self.session_id,
+                  "phase": phase, "duration": round(duration, 4)}
+        record.update((k, v) for k, v in attrs.items() if v is not None)
+        with self._lock:
+            self._durations.setdefault(phase, []).append(duration)
+            model_id = attrs.get("model")
+            if model_id and ("prompt_tokens" in attrs or "completion_tokens" in attrs):
+                usage = self.tokens.setdefault(model_id, {"prompt": 0, "completion": 0, "cached_prompt": 0})
+                usage["prompt"] += attrs.get("prompt_tokens") or 0
+                usage["completion"] += attrs.get("completion_tokens") or 0
+                usage["cached_prompt"] += attrs.get("cached_prompt_tokens") or 0
+            if self._log:
+                self._log.write(json.dumps(record, ensure_ascii=False) + "\n")
+                self._log.flush()
+
+    def summary(self) -> dict[str, dict]:
+        """{phase: {count, total, p50, p95, max}} in first-seen phase order."""
+        with self._lock:
+            items = [(phase, list(values)) for phase, values in self._durations.items()]
+        return {phase: {"count": len(values), "total": round(sum(values), 3),
+                        "p50": round(percentile(values, 50), 3), "p95": round(percentile(values, 95), 3),
+                        "max": round(max(values), 3)}
+                for phase, values in items}
+
+    def write_textfile(self, path: str):
+        """Write a Prometheus text-format snapshot (for node_exporter's
+        textfile collector). Written to a temp file and renamed into place."""
+        lines = [
+            "# HELP lm_batch_phase_seconds Time spent in each batch phase.",
+            "# TYPE lm_batch_phase_seconds summary",
+        ]
+        for phase, stats in self.summary().items():
+            label = f'phase="{phase}"'
+            lines += [
+                f'lm_batch_phase_seconds{{{label},quantile="0.5"}} {stats["p50"]}',
+                f'lm_batch_phase_seconds{{{label},quantile="0.95"}} {stats["p95"]}',
+                f"lm_batch_phase_seconds_sum{{{label}}} {stats['total']}",
+                f"lm_batch_phase_seconds_count{{{label}}} {stats['count']}",
+            ]
+        lines += [
+            "# HELP lm_batch_tokens_total Tokens processed per model.",
+            "# TYPE lm_batch_tokens_total counter",
+        ]
+        with self._lock:
+            tokens = {m: dict(usage) for m, usage in self.tokens.items()}
+        for model_id, usage in tokens.items():
+            model = model_id.replace("\\", "\\\\").replace('"', '\\"')
+            for kind, count in usage.items():
+                lines.append(f'lm_batch_tokens_total{{model="{model}",kind="{kind}"}} {count}')
+
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp, path)
+
+    @staticmethod
+    def format_table(summary: dict[str, dict]) -> str:
+        rows = [f"{'phase':<16}{'count':>7}{'total s':>10}{'p50 s':>9}{'p95 s':>9}{'max s':>9}"]
+        for phase, s in summary.items():
+            rows.append(f"{phase:<16}{s['count']:>7}{s['total']:>10.2f}{s['p50']:>9.3f}{s['p95']:>9.3f}{s['max']:>9.3f}")
+        return "\n".join(rows)
+
+    def close(self):
+        with self._lock:
+            if self._log:
+                self._log.close()
+                self._log = None
+
+
+class BenchmarkStats:
+    """Timed repeats of a benchmark run. Samples are grouped per model and
+    per identical request (prompt and parameter set), since only repeats of
+    the same request say anything about noise. A group whose coefficient of
+    variation exceeds max_cv on any metric is flagged as noisy."""
+
+    METRICS = ("ttft", "decode_tps", "latency")
+
+    def __init__(self, max_cv: float = 0.15):
+        self.max_cv = max_cv
+        self._lock = threading.Lock()
+        self._samples: dict[str, dict[str, list[dict]]] = {}
+
+    def add(self, model_id: str, group: str, stats: dict):
+        if stats.get("status") != "ok":
+            return
+        sample = {"ttft": stats.get("ttft"), "decode_tps": stats.get("decode_tps"), "latency": stats["time_taken"]}
+        with self._lock:
+            self._samples.setdefault(model_id, {}).setdefault(group, []).append(sample)
+
+    def _summarize(self, samples: list[dict]) -> dict:
+        entry = {metric: describe([s[metric] for s in samples if s[metric] is not None]) for metric in self.METRICS}
+        entry["noisy"] = [metric for metric in self.METRICS
+                          if entry[metric]["n"] > 1 and entry[metric]["cv"] > self.max_cv]
+        return entry
+
+    def report(self) -> dict[str, dict]:
+        """Per model: stats over every timed repeat ("overall"), per request
+        ("requests"), and the metrics that were noisy in any request."""
+        with self._lock:
+            samples = {m: {g: list(v) for g, v in groups.items()} for m, groups in self._samples.items()}
+        report = {}
+        for model_id, groups in samples.items():
+            per_request = {group: self._summarize(s) for group, s in groups.items()}
+            overall = self._summarize([s for g in groups.values() for s in g])
+            report[model_id] = {
+                "overall": {metric: overall[metric] for metric in self.METRICS},
+                "requests": per_request,
+                "noisy": sorted({metric for r in per_request.values() for metric in r["noisy"]}),
+            }
+        return report
+
+    @staticmethod
+    def format_table(report: dict[str, dict]) -> str:
+        def cell(d: dict, fmt: str) -> str:
+            return f"{d['median']:{fmt}} ±{100 * d['cv']:.0f}%" if d["n"] else "-"
+
+        rows = [f"{'model':<36}{'n':>4}{'decode tok/s':>18}{'TTFT s':>16}{'latency s':>16}{'p95 s':>9}  flags"]
+        for model_id, r in report.items():
+            o = r["overall"]
+            p95 = f"{o['latency']['p95']:.2f}" if o["latency"]["n"] else "-"
+            flags = f"noisy: {', '.join(r['noisy'])}" if r["noisy"] else ""
+            rows.append(f"{model_id:<36}{o['latency']['n']:>4}{cell(o['decode_tps'], '.1f'):>18}"
+                        f"{cell(o['ttft'], '.3f'):>16}{cell(o['latency'], '.2f'):>16}{p95:>9}  {flags}")
+        return "\n".join(rows)
+
+
+# ──────────────────────────────────────────────
+#  Memory-budget scheduling
+# ──────────────────────────────────────────────
+def plan_memory_groups(models: list[str], sizes: dict[str, int], budget_bytes: int,
+                       overhead_bytes: int = 0) -> list[list[str]]:
+    """Pack models into groups whose combined footprint (size_bytes plus a
+    per-model overhead for context/KV cache) fits the budget, using
+    first-fit decreasing. Models of unknown size, or too big to share,
+    get a group of their own. Group order follows the largest member."""
+    groups: list[list[str]] = []
+    free: list[int] = []
+    known = [m for m in models if sizes.get(m)]
+    for model_id in sorted(known, key=lambda m: sizes[m], reverse=True):
+        need = sizes[model_id] + overhead_bytes
+        for g, room in enumerate(free):
+            if need <= room:
+                groups[g].append(model_id)
+                free[g] -= need
+                break
+        else:
+            groups.append([model_id])
+            free.append(budget_bytes - need)
+    # Keep the user's order inside each group
+    for g in groups:
+        g.sort(key=models.index)
+    groups += [[m] for m in models if not sizes.get(m)]
+    return groups
+
+
+# ──────────────────────────────────────────────
+#  Multi-host scheduling
+# ──────────────────────────────────────────────
+def host_label(url: str) -> str:
+    """Short name of a server for status lines: host:port of its URL."""
+    return urlsplit(url).netloc or url
+
+
+def parse_server_urls(text: str) -> list[str]:
+    """Server URLs from a comma- or whitespace-separated list, duplicates dropped."""
+    urls = []
+    for url in text.replace(",", " ").split():
+        url = url.rstrip("/")
+        if url not in urls:
+            urls.append(url)
+    return urls
+
+
+class WorkQueue:
+    """Model jobs shared by the hosts of a distributed run.
+
+    A host takes a whole job and pulls its cells a few at a time. Hosts
+    prefer jobs for models they already have loaded, then models in their
+    own catalog. Once nothing is left to take, an idle host steals into a
+    running job with enough cells left to be worth a second load, and the
+    two hosts then drain its cells together. Cells a dead host failed are
+    put back, and a job a host could not load is left to the others."""
+
+    STEAL_MIN_CELLS = 4
+
+    def __init__(self, jobs: list[dict]):
+        self._cond = threading.Condition()
+        self._items = {job["model"]: {"job": job, "cells": deque(job["cells"]), "total": len(job["cells"]),
+                                      "completed": 0, "hosts": set(), "excluded": set(), "saved": [],
+                                      "rates": {}, "finished": False}
+                       for job in jobs}
+
+    def take(self, host: str, loaded: list[str], available: set[str] | None,
+             should_stop=lambda: False) -> dict | None:
+        """Next job for `host`, or None once there is nothing left it could
+        run. Blocks while other hosts still hold jobs that might be handed
+        back. `available` is the host's catalog (None = unknown, allow all)."""
+        def runnable(model_id, item):
+            return (item["cells"] and host not in item["excluded"] and host not in item["hosts"]
+                    and (available is None or model_id in available))
+
+        with self._cond:
+            while not should_stop():
+                fresh = [m for m, item in self._items.items() if not item["hosts"] and runnable(m, item)]
+                steal = [m for m, item in self._items.items() if item["hosts"] and runnable(m, item)
+                         and len(item["cells"]) >= self.STEAL_MIN_CELLS]
+                steal.sort(key=lambda m: len(self._items[m]["cells"]), reverse=True)
+                for candidates in (fresh, steal):
+                    if candidates:
+                        model_id = next((m for m in candidates if m in loaded), candidates[0])
+                        self._items[model_id]["hosts"].add(host)
+                        return self._items[model_id]["job"]
+                if not any(item["hosts"] for item in self._items.values()):
+                    return None
+                self._cond.wait(1.0)
+            return None
+
+    def next_cells(self, model_id: str, n: int) -> list:
+        with self._cond:
+            cells = self._items[model_id]["cells"]
+            return [cells.popleft() for _ in range(min(n, len(cells)))]
+
+    def completed(self, model_id: str, cells: list, saved: list[Future], requeue: list = ()):
+        """Record a finished chunk; `requeue` cells go back to the front of the job."""
+        with self._cond:
+            item = self._items[model_id]
+            item["completed"] += len(cells) - len(requeue)
+            item["saved"].extend(saved)
+            item["cells"].extendleft(reversed(requeue))
+            self._cond.notify_all()
+
+    def add_rate(self, model_id: str, host: str, tokens: float, wall: float):
+        with self._cond:
+            done_tokens, done_wall = self._items[model_id]["rates"].get(host, (0.0, 0.0))
+            self._items[model_id]["rates"][host] = (done_tokens + tokens, done_wall + wall)
+
+    def fraction(self, model_id: str, chunk_fraction: float = 0.0, chunk_size: int = 0) -> float:
+        with self._cond:
+            item = self._items[model_id]
+            return min(1.0, (item["completed"] + chunk_fraction * chunk_size) / max(1, item["total"]))
+
+    def release(self, model_id: str, host: str, failed: bool = False) -> dict | None:
+        """`host` stops working on a job (failed=True: it can't load the
+        model). Returns the job's entry if it is now complete and nobody
+        else is on it, so the caller finishes it exactly once."""
+        with self._cond:
+            item = self._items[model_id]
+            item["hosts"].discard(host)
+            if failed:
+                item["excluded"].add(host)
+            self._cond.notify_all()
+            if item["hosts"] or item["cells"] or item["finished"]:
+                return None
+            item["finished"] = True
+            return item
+
+    @staticmethod
+    def aggregate_tps(item: dict) -> float:
+        """Hosts on the same job run side by side, so their rates add up."""
+        return sum(tokens / wall for tokens, wall in item["rates"].values() if wall > 0)
+
+    def leftovers(self) -> list[dict]:
+        """Jobs no host finished (stopped, unloadable everywhere, or every host gone)."""
+        with self._cond:
+            return [item for item in self._items.values() if not item["finished"]]
+
+
+
+# ──────────────────────────────────────────────
+#  Batch engine
+# ──────────────────────────────────────────────
+@dataclass
+class BatchConfig:
+    """Plain-Python settings for one batch run – everything the GUI collects
+    from its fields, so the engine never reads Tk variables."""
+    models: list[str]
+    prompts: list[dict]                 # see load_prompt_set()
+    output_folder: str
+    server_url: str = "http://localhost:1234"
+    filename_fmt: str = "{session}_{model}_response"
+    file_ext: str = ".md"
+    skip_thinking: bool = False
+    reasoning_file: bool = False        # save reasoning to <file>_reasoning<ext> next to each response
+    max_tokens: int = -1
+    temperature: float | None = None    # None = model default
+    max_wait: float | None = 3600       # None = no limit
+    delay: int = 5                      # seconds to wait after each unload
+    adaptive_waits: bool = True         # poll with backoff instead of fixed sleeps
+    cache_path: str | None = DEFAULT_CACHE_PATH  # None disables the response cache
+    reuse_cached: bool = False          # serve identical requests from the cache
+    cache_max_mb: int = 512
+    cache_max_age_days: float = 30
+    journal: bool = True                # write <session>_journal.jsonl to the output folder
+    results_db: str | None = DEFAULT_RESULTS_PATH  # every generation is appended here; None = off
+    write_files: bool = True            # also write one output file per response
+    metrics_log: bool = True            # write <session>_metrics.jsonl timing spans to the output folder
+    metrics_textfile: str | None = None  # Prometheus textfile snapshot path, rewritten as the batch runs
+    resume_journal: str | None = None   # continue the session recorded in this journal
+    stream: bool = False
+    concurrency: int = 1                # parallel requests per loaded model
+    memory_budget_gb: float | None = None  # co-load models that fit together; None = one at a time
+    model_overhead_gb: float = 0.5      # added to each model's size when packing
+    model_sizes: dict[str, int] = field(default_factory=dict)  # size_bytes per model id (fetched if missing)
+    samples: int = 1                    # generations per prompt
+    servers: list[str] = field(default_factory=list)  # more LM Studio hosts to spread the models over
+    sweep: list[dict] = field(default_factory=list)   # sampling parameter sets run under one load (see parse_sweep)
+    benchmark: bool = False             # warmup + timed repeats per model, stats in <session>_benchmark.json
+    warmup: int = 1                     # benchmark: discarded requests after each load
+    repeats: int = 5                    # benchmark: timed repeats of every prompt
+    max_cv: float = 0.15                # benchmark: flag metrics whose stddev/mean exceeds this
+    load_profiles: dict[str, dict] = field(default_factory=dict)  # per-model load options (overrides the store)
+    load_profiles_path: str | None = DEFAULT_PROFILES_PATH  # stored profiles and what last loaded; None = off
+    load_fallback: bool = True          # retry failed loads with smaller context / less offload
+    prefix_order: bool = True           # order each model's requests by shared prompt prefix
+    keep_warm: bool = False             # leave the last model loaded for the next batch (False = aggressive unload)
+    idle_ttl: float = 600.0             # seconds a model kept warm may sit idle before it is unloaded
+    residency_path: str | None = DEFAULT_RESIDENCY_PATH  # models kept warm between batches; None = off
+    adaptive_deadlines: bool = True     # per-model deadline from observed throughput, capped at max_wait
+    deadline_factor: float = 3.0        # safety factor on expected tokens ÷ observed TPS
+    min_deadline: float = 60.0          # shortest deadline a generation is given, in seconds
+    retries: int = 2                    # extra attempts for transient load / generation failures
+    retry_backoff: float = 2.0          # seconds before the first retry, doubled for each further one
+    breaker_threshold: int = 3          # failed generations in a row before a model's other cells are skipped; 0 = off
+
+    @classmethod
+    def from_journal(cls, path: str) -> "BatchConfig":
+        """Config of the session recorded in a journal, set up to resume it."""
+        header = RunJournal.replay(path)["session"]
+        known = {f.name for f in fields(cls)}
+        config = cls(**{k: v for k, v in header["config"].items() if k in known})
+        config.resume_journal = path
+        return config
+
+
+class BatchEvents:
+    """Callbacks BatchRunner uses to report progress. They are invoked from
+    the worker thread(s); the defaults do nothing."""
+
+    def status(self, msg: str, error: bool = False):
+        pass
+
+    def model_state(self, model_id: str, state: str, text: str):
+        """state is one of: waiting, loading, generating, done, partial,
+        stopped, load_fail, save_fail. text is a short human-readable label."""
+        pass
+
+    def progress(self, done: int, total: int, processed: float):
+        """done models out of total; processed counts partially finished models fractionally."""
+        pass
+
+    def token(self, model_id: str, cell: str, text: str):
+        """Output as it is generated: every streamed delta, or the whole
+        response at once when not streaming. Called on the generation thread
+        for every token, so implementations must return quickly."""
+        pass
+
+    def finished(self, summary: dict):
+        pass
+
+
+class ConsoleEvents(BatchEvents):
+    """Prints status lines and finished models to a stream (stderr by default)."""
+
+    FINAL_STATES = ("done", "partial", "stopped", "load_fail", "save_fail")
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stderr
+
+    def _print(self, msg: str):
+        print(f"[{time.strftime('%H:%M:%S')}] {msg}", file=self.stream, flush=True)
+
+    def status(self, msg: str, error: bool = False):
+        self._print(f"ERROR: {msg}" if error else msg)
+
+    def model_state(self, model_id: str, state: str, text: str):
+        if state in self.FINAL_STATES:
+            self._print(f"{model_id}: {text}")
+
+
+class HostEvents(BatchEvents):
+    """Forwards to another BatchEvents with the host's name on every status
+    line and model label, so several hosts can report through one sink."""
+
+    def __init__(self, inner: BatchEvents, server_url: str):
+        self.inner = inner
+        self.host = host_label(server_url)
+
+    def status(self, msg: str, error: bool = False):
+        self.inner.status(f"[{self.host}] {msg}", error)
+
+    def model_state(self, model_id: str, state: str, text: str):
+        if text and state != "waiting":
+            text = f"{text} @{self.host}"
+        self.inner.model_state(model_id, state, text)
+
+    def progress(self, done: int, total: int, processed: float):
+        self.inner.progress(done, total, processed)
+
+    def token(self, model_id: str, cell: str, text: str):
+        self.inner.token(model_id, cell, text)
+
+    def finished(self, summary: dict):
+        self.inner.finished(summary)
+
+
+class BatchRunner:
+    """Runs a BatchConfig against LM Studio. Each model is loaded once,
+    receives every (prompt, sample) cell, then gets unloaded, so a
+    (models × prompts) matrix costs one load cycle per model. With
+    config.servers the models are spread over several hosts, each driven
+    by a runner of its own (see _run_distributed).
+
+    run() blocks; pause(), resume() and stop() may be called from any thread."""
+
+    def __init__(self, config: BatchConfig, client: LMStudioClient | None = None,
+                 events: BatchEvents | None = None):
+        self.config = config
+        self.client = client or LMStudioClient(config.server_url, pool_size=max(10, config.concurrency + 4))
+        self.events = events or BatchEvents()
+
+        self._pause_event = threading.Event()
+        self._pause_event.set()
+        self._stop_flag = False
+        # Cancelled by stop(): aborts in-flight requests and interrupts waits
+        self._cancel = CancelToken()
+        self._stop_unload = True
+        self._unload_threads: list[threading.Thread] = []
+        self._currently_loaded_model = None
+        self.stages = {name: StageMetrics(name) for name in ("load", "generate", "write", "unload")}
+        self.writer: OutputWriter | None = None
+        self.spans = SpanRecorder()
+        self.results: ResultsStore | None = None
+        # Models this runner knows to be loaded, oldest first
+        self._resident: list[str] = []
+        # True once the server was last seen with nothing resident
+        self._known_empty = False
+        self.readiness = ReadinessStats()
+        self.cache: ResponseCache | None = None
+        self.journal: RunJournal | None = None
+        self.bench: BenchmarkStats | None = None
+        self.profiles: LoadProfiles | None = None
+        self.residency: ModelResidency | None = None
+        self.deadlines: ThroughputDeadlines | None = None
+        self.breaker: CircuitBreaker | None = None
+        # Distributed runs: the runner of every host, and the runner that spawned this one
+        self._hosts: list[BatchRunner] = []
+        self._parent: BatchRunner | None = None
+        self.host_stats = {"models": 0, "cells": 0, "tokens": 0.0, "busy": 0.0, "tps": 0.0, "dropped": None}
+
+    def pause(self):
+        self._pause_event.clear()
+        self._set_status("Paused (will wait after current operation).")
+
+    def resume(self):
+        self._pause_event.set()
+        self._set_status("Resumed.")
+
+    @property
+    def paused(self) -> bool:
+        return not self._pause_event.is_set()
+
+    def stop(self, unload: bool = True):
+        """Break the batch instantly: in-flight requests are aborted and
+        waits interrupted. With unload=False the model stays loaded (and is
+        kept warm for the next batch); calling again with unload=True
+        escalates."""
+        first = not self._stop_flag
+        if not first and (not unload or self._stop_unload):
+            return
+        if unload:
+            self._set_status("Abort requested! Cancelling generation and clearing memory...")
+        else:
+            self._set_status("Cancel requested! Aborting in-flight requests, keeping the model loaded...")
+        self._stop_unload = unload
+        self._stop_flag = True
+        self._pause_event.set()
+        self._cancel.cancel()
+        if unload:
+            thread = threading.Thread(target=self._force_unload_all, daemon=True)
+            self._unload_threads.append(thread)
+            thread.start()
+        for host in self._hosts:
+            if host is not self:
+                host.stop(unload)
+
+    def _set_status(self, msg: str, error: bool = False):
+        self.events.status(msg, error)
+
+    def _set_label(self, model_id: str, state: str, text: str):
+        self.events.model_state(model_id, state, text)
+
+    def _journal(self, event: str, **fields):
+        if self.journal:
+            if self._parent and event in ("loaded", "unloaded"):
+                # Only the main host's residency is adopted on resume
+                fields["host"] = self.config.server_url
+            self.journal.record(event, **fields)
+
+    # ──────────────────────────────────────────────
+    #  LM Studio API
+    # ──────────────────────────────────────────────
+    def _wait_for(self, predicate, window: float) -> bool:
+        """Wait up to `window` seconds for predicate(). With adaptive waits this
+        returns as soon as the state changes; otherwise it sleeps the whole
+        window and checks once, like the original fixed-sleep path."""
+        start = time.time()
+        # Only unloads are verified here; they run to completion even after a stop
+        if self.config.adaptive_waits:
+            ok = wait_until(predicate, window)
+        else:
+            time.sleep(window)
+            ok = predicate()
+        self.readiness.record(time.time() - start, window)
+        return ok
+
     def _force_unload_all(self) -> bool:
-        for attempt in range(1, 4):
-            loaded = self._get_loaded_models()
-            if not loaded:
-                return True
+        with self.spans.span("force_unload"):
+            for attempt in range(1, 4):
+                loaded = self.client.get_loaded_models()
+                if not loaded:
+                    self._known_empty = True
+                    self._resident.clear()
+                    return True
 
-            self._set_status(f"Unloading {len(loaded)} resident model(s) (attempt {attempt}/3)…")
-            for m in loaded:
-                self._do_unload_request(m["id"], m["instance_id"])
+                self._set_status(f"Unloading {len(loaded)} resident model(s) (attempt {attempt}/3)…")
+                for m in loaded:
+                    self.client.unload(m["id"], m["instance_id"])
 
-            time.sleep(3)
-            if not self._get_loaded_models():
-                return True
+                if self._wait_for(lambda: not self.client.get_loaded_models(), 3):
+                    self._known_empty = True
+                    self._currently_loaded_model = None
+                    self._resident.clear()
+                    self._journal("unloaded", model=None)
+                    return True
 
-        self._set_status("Failed to unload all models.", error=True)
-        return False
+            self._set_status("Failed to unload all models.", error=True)
+            return False
 
     def _poll_loading(self, target_model_id: str, timeout=120) -> bool:
         """Poll the /v1/models endpoint to confirm the model is perfectly active before we generate."""
+        def is_loaded():
+            return target_model_id in [m["id"] for m in self.client.get_loaded_models()]
+
         start_time = time.time()
+        if self.config.adaptive_waits:
+            ok = wait_until(is_loaded, timeout, should_stop=lambda: self._stop_flag, cancel=self._cancel)
+            elapsed = time.time() - start_time
+            self.readiness.record(elapsed, ReadinessStats.fixed_poll_time(elapsed, 2) if ok else elapsed)
+            return ok
+
         while time.time() - start_time < timeout:
             if self._stop_flag:
                 return False
-            loaded_ids = [m["id"] for m in self._get_loaded_models()]
-            if target_model_id in loaded_ids:
+            if is_loaded():
                 return True
-            time.sleep(2)
+            if self._cancel.wait(2):
+                return False
         return False
 
-    def _load_model(self, model_id: str) -> bool:
-        _, lm_admin = self._get_lm_urls()
-        self._set_status(f"Clearing memory before loading {model_id}…")
-        self._force_unload_all()
-        time.sleep(2)
+    def _load_model(self, model_id: str, exclusive: bool = True) -> bool:
+        """Load a model and confirm it is active. With exclusive=False (memory
+        budget groups) models already resident are left in place."""
+        if exclusive and self.config.adaptive_waits and self._known_empty:
+            # The previous unload was verified, nothing to clear
+            self.readiness.record(0.0, 2)
+        elif exclusive:
+            self._set_status(f"Clearing memory before loading {model_id}…")
+            with self.spans.span("pre_clear", model=model_id):
+                self._force_unload_all()
+                if self.config.adaptive_waits:
+                    # _force_unload_all already confirmed the server state
+                    self.readiness.record(0.0, 2)
+                else:
+                    self._cancel.wait(2)
 
         if self._stop_flag: return False
 
-        self._set_status(f"Loading: {model_id}…")
+        configured = self.config.load_profiles.get(model_id)
+        if configured is None:
+            configured = self.profiles.configured(model_id) if self.profiles else {}
+        first = self.profiles.starting_profile(model_id, configured) if self.profiles else dict(configured)
+        ladder = fallback_ladder(first) if self.config.load_fallback else [first]
+        start = time.time()
+        for rung, profile in enumerate(ladder):
+            if self._stop_flag:
+                break
+            if rung:
+                self._set_status(f"Retrying {model_id} with {describe_profile(profile)} "
+                                 f"(fallback {rung}/{len(ladder) - 1})…")
+                # A load that failed or timed out may have left an instance behind
+                self._unload_model(model_id)
+            ok, retry = self._try_load(model_id, profile)
+            if ok:
+                self.stages["load"].record(time.time() - start)
+                self._resident.append(model_id)
+                self._journal("loaded", model=model_id, profile=profile)
+                if rung:
+                    self._set_status(f"{model_id} loaded with fallback profile: {describe_profile(profile)}")
+                if self.profiles and (configured or profile):
+                    self.profiles.record_success(model_id, configured, profile)
+                return True
+            if not retry:
+                break
+        self.stages["load"].record(time.time() - start)
+        return False
+
+    def _try_load(self, model_id: str, profile: dict) -> tuple[bool, bool]:
+        """One load attempt with the given profile. Returns (loaded, worth
+        retrying with a smaller profile): not when the server is unreachable,
+        doesn't know the model, or we are stopping."""
+        self._set_status(f"Loading: {model_id}…" if not profile else
+                         f"Loading: {model_id} ({describe_profile(profile)})…")
         try:
-            r = requests.post(f"{lm_admin}/models/load",
-                              json={"model": model_id},
-                              timeout=LOAD_TIMEOUT)
-            r.raise_for_status()
+            self._known_empty = False
+            with self.spans.span("load_request", model=model_id), self._cancel.scope():
+                # A 500 usually means the profile doesn't fit: that is for the fallback ladder
+                self._with_retries(f"Load of {model_id}", lambda: self.client.load(model_id, **profile),
+                                   lambda e: is_transient(e) and not (isinstance(e, requests.HTTPError)
+                                                                      and e.response.status_code == 500))
             self._currently_loaded_model = model_id
             
             self._set_status(f"Confirming {model_id} is active...")
-            return self._poll_loading(model_id)
+            with self.spans.span("load_confirm", model=model_id) as span:
+                ok = self._poll_loading(model_id)
+                span["ok"] = ok
+            if not ok:
+                self._set_status(f"{model_id} did not become active.", error=True)
+            return ok, not ok and not self._stop_flag
 
         except Exception as e:
+            if self._stop_flag:
+                return False, False
             self._set_status(f"Load failed for {model_id}: {e}", error=True)
-            return False
+            unknown = isinstance(e, requests.HTTPError) and e.response is not None and e.response.status_code == 404
+            return False, not (isinstance(e, requests.ConnectionError) or unknown or self._stop_flag)
+
+    def _with_retries(self, what: str, call, retryable=is_transient):
+        """call(), retried up to config.retries times with exponential backoff
+        while it fails with an error retryable() accepts. Re-raises the last error."""
+        attempt = 1
+        while True:
+            try:
+                return call()
+            except Exception as e:
+                if attempt > self.config.retries or not retryable(e) or self._stop_flag:
+                    raise
+                delay = backoff_delay(attempt, self.config.retry_backoff)
+                self._set_status(f"{what} failed ({e}); retrying in {delay:g}s "
+                                 f"(retry {attempt}/{self.config.retries})…", error=True)
+                if self._cancel.wait(delay):
+                    raise
+                attempt += 1
 
     def _unload_model(self, model_id: str) -> bool:
         self._set_status(f"Unloading: {model_id}…")
-        loaded = self._get_loaded_models()
+        loaded = self.client.get_loaded_models(max_age=LMStudioClient.STATE_TTL)
         target_instance = None
         for m in loaded:
             if m["id"] == model_id:
@@ -409,22 +2091,37 @@ class LMStudioBatchApp:
                 break
                 
         if not target_instance:
+            self._known_empty = not loaded
+            if model_id in self._resident:
+                self._resident.remove(model_id)
             return True
-            
+
+        def is_unloaded():
+            nonlocal loaded
+            loaded = self.client.get_loaded_models()
+            return model_id not in [m["id"] for m in loaded]
+
+        start = time.time()
         for attempt in range(1, 4):
-            success = self._do_unload_request(model_id, target_instance)
-            time.sleep(2)
-            loaded_ids = [m["id"] for m in self._get_loaded_models()]
-            if model_id not in loaded_ids:
-                self._currently_loaded_model = None
+            with self.spans.span("unload_request", model=model_id, attempt=attempt):
+                self.client.unload(model_id, target_instance)
+            with self.spans.span("unload_verify", model=model_id, attempt=attempt) as span:
+                span["ok"] = self._wait_for(is_unloaded, 2)
+            if span["ok"]:
+                self.stages["unload"].record(time.time() - start)
+                if self._currently_loaded_model == model_id:
+                    self._currently_loaded_model = None
+                if model_id in self._resident:
+                    self._resident.remove(model_id)
+                self._known_empty = not loaded
+                self._journal("unloaded", model=model_id)
                 return True
 
+        self.stages["unload"].record(time.time() - start)
         self._set_status(f"Could not verify unload of {model_id}!", error=True)
         return False
 
-    def _generate(self, model_id: str, sys_prompt: str, user_prompt: str, max_wait: float | None) -> tuple[str, str, str]:
-        lm_base, _ = self._get_lm_urls()
-        
+    def _build_payload(self, model_id: str, sys_prompt: str, user_prompt: str, params: dict | None = None) -> dict:
         messages = []
         if sys_prompt:
             messages.append({"role": "system", "content": sys_prompt})
@@ -435,7 +2132,7 @@ class LMStudioBatchApp:
             "content": [{"type": "text", "text": user_prompt}]
         })
 
-        tokens_val = int(self.tokens_var.get())
+        tokens_val = int(self.config.max_tokens)
         if tokens_val < 1: tokens_val = -1
         
         payload = {
@@ -443,21 +2140,63 @@ class LMStudioBatchApp:
             "messages": messages,
             "max_tokens": tokens_val,
         }
-        if not self.use_default_temp_var.get():
-            payload["temperature"] = self.temp_var.get()
-
+        if self.config.temperature is not None:
+            payload["temperature"] = self.config.temperature
+        # A sweep's parameter set overrides the batch-wide settings
+        for key, value in (params or {}).items():
+            payload[key] = value if key != "max_tokens" or value >= 1 else -1
+        return payload
+
+    def _generate(self, model_id: str, payload: dict, max_wait: float | None,
+                  on_token=None, observe: bool = True) -> tuple[str, dict]:
+        """Run one chat completion within the model's deadline (see
+        ThroughputDeadlines). Transient failures that produced no text yet
+        are retried with exponential backoff. observe=False keeps the
+        throughput out of the deadline history (benchmark warmups)."""
+        cfg = self.config
+        if self.deadlines:
+            max_wait = self.deadlines.deadline(model_id, max_wait, payload.get("max_tokens"))
+        attempt = 1
+        while True:
+            content, stats = self._generate_once(model_id, payload, max_wait, on_token)
+            if not stats.pop("retryable", False) or attempt > cfg.retries or self._stop_flag:
+                break
+            delay = backoff_delay(attempt, cfg.retry_backoff)
+            self._set_status(f"{model_id}: {content.strip('[]').splitlines()[0]} — retrying in {delay:g}s "
+                             f"(retry {attempt}/{cfg.retries})…", error=True)
+            if self._cancel.wait(delay):
+                break
+            attempt += 1
+        if attempt > 1:
+            stats["attempts"] = attempt
+        if self.deadlines and observe and stats["status"] == "ok":
+            self.deadlines.observe(model_id, stats.get("tps"), stats.get("completion_tokens"))
+        return content, stats
+
+    def _generate_once(self, model_id: str, payload: dict, max_wait: float | None,
+                       on_token=None) -> tuple[str, dict]:
+        """Run one chat completion. Returns the response text and a stats dict
+        (time_taken, tps, completion/prompt tokens, and for streamed runs
+        ttft, prompt_eval and decode_tps; retryable when a transient failure
+        produced nothing). When streaming, on_token is called with every
+        text delta as it arrives."""
+        if self.config.stream:
+            return self._generate_stream(model_id, payload, max_wait, on_token)
+
+        stats = {"status": "error", "time_taken": 0.0, "tps": 0.0}
         try:
             self._set_status(f"Generating → {model_id}…")
             start_time = time.time()
-            r = requests.post(f"{lm_base}/chat/completions",
-                              json=payload, timeout=max_wait)
+            with self._cancel.scope():
+                r = self.client.chat_completion(payload, timeout=max_wait)
             
             if not r.ok:
                 try:
                     err_details = r.json()
                 except Exception:
                     err_details = r.text
-                return f"[Generation error: HTTP {r.status_code} {r.reason}\nDetails: {err_details}]", "0.00", "0.0s"
+                return (f"[Generation error: HTTP {r.status_code} {r.reason}\nDetails: {err_details}]",
+                        dict(stats, retryable=r.status_code in TRANSIENT_HTTP))
                 
             end_time = time.time()
             
@@ -468,252 +2207,1167 @@ class LMStudioBatchApp:
             usage = data.get("usage", {})
             tokens = usage.get("completion_tokens", 0)
             time_taken = end_time - start_time
-            tps = (tokens / time_taken) if time_taken > 0 else 0
-            
-            return content, f"{tps:.2f}", f"{time_taken:.2f}s"
+            prompt_eval, cached = self._server_prompt_eval(data)
+            stats.update({
+                "status": "ok",
+                "time_taken": time_taken,
+                "tps": (tokens / time_taken) if time_taken > 0 else 0,
+                "prompt_tokens": usage.get("prompt_tokens", 0),
+                "completion_tokens": tokens,
+                "prompt_eval": prompt_eval,
+                "cached_prompt_tokens": cached,
+            })
+            return content, stats
 
         except requests.exceptions.Timeout:
-            return f"[Generation error: Request timed out after {max_wait}s]", "0.00", "0.0s"
+            return (f"[Generation error: Request timed out after {max_wait}s]",
+                    dict(stats, status="timeout", time_taken=time.time() - start_time))
         except Exception as e:
-            return f"[Generation error: {e}]", "0.00", "0.0s"
+            if self._cancel.cancelled:
+                return "[Generation cancelled: stopped by user]", dict(stats, status="aborted", detail="stopped by user")
+            return f"[Generation error: {e}]", dict(stats, retryable=is_transient(e))
+
+    def _generate_stream(self, model_id: str, payload: dict, max_wait: float | None,
+                         on_token=None) -> tuple[str, dict]:
+        """Streamed (SSE) variant of _generate. Measures time-to-first-token
+        separately from decoding, and keeps whatever text already arrived
+        when the request times out, fails or is aborted."""
+        payload = dict(payload, stream=True, stream_options={"include_usage": True})
+        parts: list[str] = []
+        reported: dict = {}     # the latest usage / stats / timings the server sent
+        n_deltas = 0
+        first_token_at = None
+        status, detail = "ok", ""
+        transient = False
+
+        self._set_status(f"Generating (streaming) → {model_id}…")
+        start_time = time.time()
+        try:
+            with self._cancel.scope(), self.client.chat_completion(payload, timeout=max_wait, stream=True) as r:
+                if not r.ok:
+                    try:
+                        err_details = r.json()
+                    except Exception:
+                        err_details = r.text
+                    return (f"[Generation error: HTTP {r.status_code} {r.reason}\nDetails: {err_details}]",
+                            {"status": "error", "time_taken": 0.0, "tps": 0.0,
+                             "retryable": r.status_code in TRANSIENT_HTTP})
+
+                r.encoding = "utf-8"
+                for line in r.iter_lines(chunk_size=None, decode_unicode=True):
+                    if self._stop_flag:
+                        status, detail = "aborted", "stopped by user"
+                        break
+                    if max_wait and time.time() - start_time > max_wait:
+                        status, detail = "timeout", f"exceeded {max_wait}s"
+                        break
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        chunk = json.loads(data)
+                    except ValueError:
+                        continue
+
+                    for key in ("usage", "stats", "timings"):
+                        if chunk.get(key):
+                            reported[key] = chunk[key]
+                    for choice in chunk.get("choices") or []:
+                        text = (choice.get("delta") or {}).get("content")
+                        if not text:
+                            continue
+                        if first_token_at is None:
+                            first_token_at = time.time()
+                        n_deltas += 1
+                        parts.append(text)
+                        if on_token:
+                            on_token(text)
+
+        except requests.exceptions.Timeout:
+            status, detail = "timeout", f"no data for {max_wait}s"
+        except Exception as e:
+            status, detail = ("aborted", "stopped by user") if self._cancel.cancelled else ("error", str(e))
+            transient = status == "error" and is_transient(e)
+
+        end_time = time.time()
+        time_taken = end_time - start_time
+        if not parts and status != "ok":
+            return f"[Generation error: {detail}]", {"status": status, "detail": detail, "time_taken": time_taken,
+                                                     "tps": 0.0, "retryable": transient}
+        usage = reported.get("usage", {})
+        # Servers that omit usage in the stream send roughly one token per delta
+        tokens = usage.get("completion_tokens") or n_deltas
+        ttft = (first_token_at - start_time) if first_token_at else time_taken
+        decode_time = (end_time - first_token_at) if first_token_at else 0.0
+        prompt_eval, cached = self._server_prompt_eval(reported)
+
+        stats = {
+            "status": status,
+            "detail": detail,
+            "time_taken": time_taken,
+            "tps": (tokens / time_taken) if time_taken > 0 else 0,
+            "prompt_tokens": usage.get("prompt_tokens", 0),
+            "completion_tokens": tokens,
+            "ttft": ttft,
+            # Prefer the server's own prompt processing time when it reports one
+            "prompt_eval": ttft if prompt_eval is None else prompt_eval,
+            "cached_prompt_tokens": cached,
+            "decode_tps": (tokens / decode_time) if decode_time > 0 else 0,
+        }
+        return "".join(parts), stats
+
+    @staticmethod
+    def _server_prompt_eval(data: dict) -> tuple[float | None, int | None]:
+        """Prompt processing time (s) and prompt tokens served from the prefix
+        cache, as far as the server reports them: LM Studio's stats,
+        llama.cpp-style timings or OpenAI usage details."""
+        stats, timings, usage = data.get("stats") or {}, data.get("timings") or {}, data.get("usage") or {}
+        seconds = stats.get("time_to_first_token")
+        if seconds is None and timings.get("prompt_ms") is not None:
+            seconds = timings["prompt_ms"] / 1000
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+        if cached is None:
+            cached = timings.get("cache_n")
+        return seconds, cached
 
     # ──────────────────────────────────────────────
-    #  Batch worker thread
+    #  Batch loop
     # ──────────────────────────────────────────────
-    def _run_batch(self, sys_prompt: str, prompt: str, output_folder: str, filename_fmt: str, max_wait: float | None):
-        selected = [mid for mid, var in self._model_vars.items() if var.get()]
+    def run(self) -> dict:
+        """Run the whole batch and return a summary dict (done, total, cells,
+        failed_models, failed_cells, stopped, session_id, output_folder)."""
+        cfg = self.config
+        if cfg.benchmark:
+            # Timed repeats need streamed timings (TTFT, decode TPS) and fresh generations, one
+            # at a time so overlapping requests don't skew them. The caller's config stays as it is
+            if cfg.concurrency > 1:
+                self._set_status("Benchmark mode runs one generation at a time.")
+            self.config = cfg = replace(cfg, stream=True, reuse_cached=False, samples=max(1, cfg.repeats),
+                                        concurrency=1)
+            self.bench = BenchmarkStats(cfg.max_cv)
+        selected = list(cfg.models)
         total    = len(selected)
-        done     = 0
-
+        n_prompts = len(cfg.prompts)
+        samples = max(1, cfg.samples)
+        session_id = time.strftime("%Y%m%d_%H%M%S")
+        resumed = None
+        if cfg.resume_journal:
+            resumed = RunJournal.replay(cfg.resume_journal)
+            session_id = resumed["session"]["session_id"]
+
+        # With more than one prompt/sample every cell needs its own file
+        filename_fmt = cfg.filename_fmt
+        if n_prompts > 1 and "{prompt}" not in filename_fmt:
+            filename_fmt += "_{prompt}"
+        if samples > 1 and "{sample}" not in filename_fmt:
+            filename_fmt += "_s{sample}"
+        if len(cfg.sweep) > 1 and "{params}" not in filename_fmt:
+            filename_fmt += "_{params}"
+        # Every parameter set runs while the model is resident, like extra samples
+        cells = [(p, k + 1 if samples > 1 else None, params or None)
+                 for p in cfg.prompts for params in (cfg.sweep or [None]) for k in range(samples)]
+        n_cells = len(cells)
+        if cfg.prefix_order and n_prompts > 1:
+            before = prefix_reuse([c[0] for c in cells])
+            cells = order_by_prefix(cells)
+            after = prefix_reuse([c[0] for c in cells])
+            if after > before:
+                self._set_status(f"Prefix ordering: consecutive requests share {after:.0%} of their prompt text "
+                                 f"(prompt set order: {before:.0%}).")
+
+        # Per-run state shared by the _plan/_load/_generate/_finish helpers
+        self._session_id = session_id
+        self._filename_fmt = filename_fmt
+        self._cells = cells
+        self._resumed = resumed
+        self._progress_lock = threading.Lock()
+        self._fractions: dict[str, float] = {}
+        self._done = 0
+        self._failed_models: set[str] = set()
+        self._failed_cells = 0
+
+        summary = {"done": 0, "total": total, "cells": n_cells, "failed_models": 0, "failed_cells": 0,
+                   "stopped": False, "session_id": session_id, "output_folder": cfg.output_folder}
         if total == 0:
             self._set_status("No models selected.", error=True)
-            self._restore_ui()
-            return
+            self.events.finished(summary)
+            return summary
 
-        self.counter_var.set(f"Models: {total} total, 0 done")
-        session_id = time.strftime("%Y%m%d_%H%M%S")
-        file_ext = self.format_var.get()
+        self.events.progress(0, total, 0)
 
-        for i, model_id in enumerate(selected):
-            self._set_label(model_id, "⏳ waiting…", "gray")
-            self._pause_event.wait()
-            
-            if self._stop_flag:
-                self._set_status("Batch aborted by user.")
-                break
-
-            self._highlight_model(model_id, active=True)
-            self._set_label(model_id, "⟳ loading…", "#E67E22")  # Orange
-            
-            ok = self._load_model(model_id)
-            if not ok or self._stop_flag:
-                if not self._stop_flag:
-                    self._set_label(model_id, "✗ load fail", "#E74C3C")
-                self._highlight_model(model_id, active=False)
-                done += 1
-                self._update_counter(done, total, i + 1)
-                continue
+        if cfg.journal or resumed:
+            try:
+                self.journal = RunJournal(cfg.resume_journal or RunJournal.path_for(cfg.output_folder, session_id))
+                if resumed:
+                    self._journal("resumed")
+                else:
+                    self._journal("session", session_id=session_id, config=asdict(cfg))
+                    for model_id in selected:
+                        self._journal("queued", model=model_id)
+            except Exception as e:
+                self.journal = None
+                self._set_status(f"Run journal unavailable: {e}", error=True)
 
-            self._set_label(model_id, "⟳ generating…", "#3498DB")
+        if resumed:
+            self._adopt_resident(resumed["resident"])
 
-            content, tps, time_taken = self._generate(model_id, sys_prompt, prompt, max_wait)
+        if cfg.load_profiles_path:
+            try:
+                self.profiles = LoadProfiles(cfg.load_profiles_path)
+            except Exception as e:
+                self.profiles = None
+                self._set_status(f"Load profiles unavailable: {e}", error=True)
 
-            if self._stop_flag:
-                self._set_status("Batch aborted by user.")
-                break
+        if cfg.cache_path:
+            try:
+                self.cache = ResponseCache(cfg.cache_path, cfg.cache_max_mb * 1024**2, cfg.cache_max_age_days)
+                self.cache.evict()
+            except Exception as e:
+                self.cache = None
+                self._set_status(f"Response cache unavailable: {e}", error=True)
 
-            # Filter thinking tags if requested
-            if self.skip_thinking_var.get():
-                content = re.sub(r"<think>.*?</think>", "", content, flags=re.DOTALL).strip()
+        try:
+            log_path = os.path.join(cfg.output_folder, f"{session_id}_metrics.jsonl") if cfg.metrics_log else None
+            self.spans = SpanRecorder(log_path, session_id)
+        except OSError as e:
+            self.spans = SpanRecorder(session_id=session_id)
+            self._set_status(f"Metrics log unavailable: {e}", error=True)
 
-            safe_name = self._sanitize(model_id)
-            # Ensure extension isn't duplicated
-            base_filename = filename_fmt.replace("{model}", safe_name).replace("{session}", session_id)
-            if not base_filename.endswith(file_ext):
-                base_filename += file_ext
-            
-            filepath = os.path.join(output_folder, base_filename)
+        if cfg.results_db:
             try:
-                with open(filepath, "w", encoding="utf-8") as f:
-                    # Write markdown headers if format is markdown
-                    if file_ext == ".md":
-                        f.write(f"# Model: {model_id}\n")
-                        f.write(f"**Session:** {session_id}\n\n")
-                        f.write("---\n\n")
-                        f.write(content)
-                        f.write("\n\n---\n\n")
-                        f.write(f"*Generation Time:* {time_taken}\n\n")
-                        f.write(f"*Tokens Per Second (TPS):* {tps}\n")
-                    else:
-                        f.write(f"Model: {model_id}\n")
-                        f.write(f"Session: {session_id}\n")
-                        f.write("=" * 60 + "\n")
-                        f.write(content)
-                        f.write("\n\n" + "-" * 60 + "\n")
-                        f.write(f"Generation Time: {time_taken}\n")
-                        f.write(f"Tokens Per Second (TPS): {tps}\n")
-                        
-                self._set_label(model_id, "✓ done", "#2ECC71")
+                self.results = ResultsStore(cfg.results_db)
+                self._fetch_model_sizes(selected)
             except Exception as e:
-                self._set_label(model_id, "✗ save fail", "#E74C3C")
-                self._set_status(f"Save failed for {model_id}: {e}", error=True)
+                self.results = None
+                self._set_status(f"Results store unavailable: {e}", error=True)
 
-            self._highlight_model(model_id, active=False)
-
-            unload_ok = self._unload_model(model_id)
-            if not unload_ok:
-                self._force_unload_all()
+        if cfg.adaptive_deadlines:
+            self.deadlines = ThroughputDeadlines(cfg.deadline_factor, cfg.min_deadline)
+            try:
+                for model_id in selected if self.results else []:
+                    for tps, tokens in self.results.throughput_history(model_id, ThroughputDeadlines.WINDOW):
+                        self.deadlines.observe(model_id, tps, tokens)
+            except sqlite3.Error as e:
+                self._set_status(f"Throughput history unavailable: {e}", error=True)
+        self.breaker = CircuitBreaker(cfg.breaker_threshold) if cfg.breaker_threshold > 0 else None
+
+        self.writer = OutputWriter(self.stages["write"])
+
+        if cfg.residency_path:
+            self.residency = ModelResidency(cfg.residency_path)
+            warm = self._claim_warm() if not cfg.servers else None
+            if warm in selected:
+                # Run it first, while it is still loaded
+                selected.remove(warm)
+                selected.insert(0, warm)
+
+        hosts = self._run_distributed(selected) if cfg.servers else None
+        groups = [] if cfg.servers else self._plan_groups(selected)
+        grouped = any(len(g) > 1 for g in groups)
+
+        for g_idx, group in enumerate(groups):
+            for model_id in group:
+                self._set_label(model_id, "waiting", "⏳ waiting…")
+            self._pause_event.wait()
+            
+            if self._stop_flag:
+                self._set_status("Batch aborted by user.")
+                break
 
-            done += 1
-            self._update_counter(done, total, i + 1)
+            jobs = [job for job in map(self._plan_model, group) if job]
+            if grouped:
+                self._make_room([job["model"] for job in jobs if job["needs_load"]])
+            ready = [job for job in jobs if self._load_job(job, exclusive=not grouped)]
+
+            if len(ready) > 1:
+                self._set_status(f"Generating on {len(ready)} co-loaded models: "
+                                 f"{', '.join(job['model'] for job in ready)}")
+                with ThreadPoolExecutor(max_workers=len(ready), thread_name_prefix="model") as pool:
+                    list(pool.map(self._generate_model, ready))
+            elif ready:
+                self._generate_model(ready[0])
+
+            if not grouped:
+                for job in ready:
+                    if self._stop_flag or (cfg.keep_warm and g_idx == len(groups) - 1):
+                        # Kept warm for the next batch, or left to stop() (see _release_resident)
+                        self._mark_done(job["model"])
+                        break
+                    unload_ok = job["cached"] or self._unload_model(job["model"])
+                    if not unload_ok:
+                        self._force_unload_all()
+                    self._mark_done(job["model"])
+                    if self._stop_flag:
+                        break
+                    if g_idx < len(groups) - 1 and not job["cached"]:
+                        self._post_unload_delay(unload_ok)
+            else:
+                for job in ready:
+                    self._mark_done(job["model"])
 
+            self._export_metrics()
             if self._stop_flag:
                 break
 
-            try:
-                delay = int(self.delay_var.get())
-            except ValueError:
-                delay = 0
-
-            if delay > 0 and i < total - 1:
-                self._set_status(f"Waiting {delay}s…")
-                for _ in range(delay):
-                    if self._stop_flag: break
-                    time.sleep(1)
-
-        self.progress_bar.set(1.0 if not self._stop_flag else done/total)
-        if not self._stop_flag:
-            self._set_status(f"Batch complete! {done}/{total} models processed.")
-            self.root.after(0, lambda: messagebox.showinfo("Done", f"Batch complete!\n{done}/{total} models processed.\n\nOutput: {output_folder}"))
-            
-        self._last_output_folder = output_folder
-        self._restore_ui()
+        if not cfg.servers:
+            # Groups stay resident until the next one needs the room; clear the last one
+            self._release_resident()
+
+        # Let the writer stage finish every queued file before closing the cache and journal
+        self.writer.close()
+        self.writer = None
+
+        if self.cache:
+            self.cache.evict()
+            self.cache.close()
+            self.cache = None
+        if self.results:
+            self.results.close()
+            self.results = None
+        if self.journal:
+            self._journal("stopped" if self._stop_flag else "finished")
+            self.journal.close()
+
+        stop_to_idle = self._wait_idle() if self._stop_flag else None
+        done = self._done
+        pipeline = {name: stage.snapshot() for name, stage in self.stages.items()}
+        phases = self.spans.summary()
+        self._export_metrics()
+        self.spans.close()
+        summary.update(done=done, failed_models=len(self._failed_models), failed_cells=self._failed_cells,
+                       stopped=self._stop_flag, wait_saved=self.readiness.saved, pipeline=pipeline,
+                       phases=phases, tokens=self.spans.tokens, metrics_log=self.spans.log_path,
+                       stop_to_idle=stop_to_idle)
+        if self.bench:
+            summary["benchmark"] = self._write_benchmark_report(summary)
+        if "prompt_eval" in phases:
+            summary["prompt_eval"] = self._prompt_eval_report(phases["prompt_eval"])
+        if self.breaker and self.breaker.report():
+            summary["circuit_breaker"] = self.breaker.report()
+            self._set_status(f"Circuit breaker skipped the rest of {len(summary['circuit_breaker'])} model(s): "
+                             f"{', '.join(summary['circuit_breaker'])}", error=True)
+        self._set_status(self._pipeline_report(pipeline))
+        if hosts:
+            summary["hosts"] = hosts
+            for url, h in hosts.items():
+                dropped = f" · dropped out: {h['dropped']}" if h["dropped"] else ""
+                self._set_status(f"{host_label(url)}: {h['models']} model(s), {h['cells']} cell(s), "
+                                 f"{h['tokens']:.0f} tokens at {h['tps']:.1f} tok/s{dropped}")
+        if phases:
+            slowest = sorted(phases.items(), key=lambda kv: kv[1]["total"], reverse=True)[:3]
+            self._set_status("Time by phase (p95): " + ", ".join(
+                f"{phase} {s['total']:.1f}s ({s['p95']:.2f}s)" for phase, s in slowest))
+        if cfg.adaptive_waits:
+            self._set_status(f"Load/unload waits took {self.readiness.actual:.1f}s "
+                             f"(fixed sleeps: ~{self.readiness.fixed:.1f}s, saved {self.readiness.saved:.1f}s).")
+        if self._stop_flag:
+            kept = "models unloaded" if self._stop_unload else "model kept loaded"
+            self._set_status(f"Stopped: idle {stop_to_idle:.2f}s after the stop request ({kept}).")
+        else:
+            matrix = f" × {n_cells} prompts" if n_cells > 1 else ""
+            saved = f" Adaptive waits saved {self.readiness.saved:.1f}s." if cfg.adaptive_waits else ""
+            failed = (f" {len(self._failed_models)} model(s) failed, {self._failed_cells} cell(s) without output."
+                      if self._failed_models else "")
+            self._set_status(f"Batch complete! {done}/{total} models{matrix} processed.{saved}{failed}",
+                             error=bool(failed))
+        self.events.finished(summary)
+        return summary
+
+    def _wait_idle(self) -> float:
+        """Seconds from the stop request until nothing is in flight and, when
+        stopping with unload, every host has cleared its models."""
+        for host in self._hosts or [self]:
+            for thread in list(host._unload_threads):
+                thread.join(UNLOAD_TIMEOUT)
+        idle = time.time() - self._cancel.cancelled_at
+        self.spans.add("stop_to_idle", idle, start=self._cancel.cancelled_at, unload=self._stop_unload)
+        return idle
+
+    def _prompt_eval_report(self, phase: dict) -> dict:
+        """Per-request prompt processing time and how much of the prompt the
+        server took from its prefix cache, so the gain of ordering shows."""
+        prompt = sum(t["prompt"] for t in self.spans.tokens.values())
+        cached = sum(t["cached_prompt"] for t in self.spans.tokens.values())
+        report = dict(phase, mean=round(phase["total"] / phase["count"], 4), prompt_tokens=prompt,
+                      cached_prompt_tokens=cached)
+        reuse = f", {cached / prompt:.0%} of prompt tokens from the prefix cache" if cached and prompt else ""
+        self._set_status(f"Prompt eval: {report['mean']:.3f}s mean, {phase['p50']:.3f}s p50, "
+                         f"{phase['p95']:.3f}s p95 over {phase['count']} request(s){reuse}.")
+        return report
+
+    def _export_metrics(self):
+        if not self.config.metrics_textfile:
+            return
+        try:
+            self.spans.write_textfile(self.config.metrics_textfile)
+        except OSError as e:
+            self._set_status(f"Could not write metrics textfile: {e}", error=True)
 
-    # ──────────────────────────────────────────────
-    #  UI thread-safe helpers
-    # ──────────────────────────────────────────────
-    def _set_status(self, msg: str, error: bool = False):
-        color = "#E74C3C" if error else "#3498DB"
-        self.root.after(0, lambda: self.status_var.set(f"Status: {msg}"))
-        self.root.after(0, lambda: self.status_label.configure(text_color=color))
-
-    def _set_label(self, model_id: str, text: str, color: str):
-        lbl = self._model_labels.get(model_id)
-        if lbl:
-            self.root.after(0, lambda: lbl.configure(text=text, text_color=color))
-
-    def _highlight_model(self, model_id: str, active: bool):
-        row = self._model_rows.get(model_id)
-        if row:
-            bg = ("#D6EAF8", "#2C3E50") if active else "transparent"
-            try:
-                self.root.after(0, lambda: row.configure(fg_color=bg))
-            except Exception:
-                pass
+    @staticmethod
+    def _pipeline_report(pipeline: dict) -> str:
+        parts = [f"{name} {m['busy']:.1f}s/{m['count']}" for name, m in pipeline.items()]
+        write = pipeline["write"]
+        bottleneck = max(pipeline, key=lambda name: pipeline[name]["busy"])
+        return (f"Pipeline: {', '.join(parts)} · writer queue max {write['max_depth']}, "
+                f"blocked {write['blocked']:.1f}s · busiest stage: {bottleneck}")
+
+    def _fetch_model_sizes(self, models: list[str]) -> bool:
+        """Fill config.model_sizes from the catalog for any model missing one."""
+        cfg = self.config
+        if all(m in cfg.model_sizes for m in models):
+            return True
+        try:
+            for m in self.client.fetch_catalog():
+                if m["size_bytes"]:
+                    cfg.model_sizes.setdefault(m["id"], m["size_bytes"])
+            return True
+        except Exception:
+            return False
 
-    def _update_counter(self, done: int, total: int, processed: int):
-        pct = processed / total
-        self.root.after(0, lambda: self.progress_bar.set(pct))
-        self.root.after(0, lambda: self.counter_var.set(f"Models: {total} total, {done} done"))
+    def _plan_groups(self, models: list[str]) -> list[list[str]]:
+        cfg = self.config
+        if not cfg.memory_budget_gb:
+            return [[m] for m in models]
+        if not self._fetch_model_sizes(models):
+            self._set_status("Could not fetch model sizes, running one at a time.", error=True)
+        groups = plan_memory_groups(models, cfg.model_sizes, int(cfg.memory_budget_gb * 1024**3),
+                                    int(cfg.model_overhead_gb * 1024**3))
+        shared = sum(len(g) for g in groups if len(g) > 1)
+        if shared:
+            self._set_status(f"Memory budget {cfg.memory_budget_gb:g} GB: {len(models)} models in "
+                             f"{len(groups)} group(s), {shared} co-loaded.")
+        return groups
+
+    def _footprint(self, model_id: str) -> int:
+        size = self.config.model_sizes.get(model_id)
+        if not size:
+            # Unknown size: assume it needs the whole budget
+            return int(self.config.memory_budget_gb * 1024**3)
+        return size + int(self.config.model_overhead_gb * 1024**3)
+
+    def _make_room(self, to_load: list[str]):
+        """Unload resident models, oldest first, until the models about to be
+        loaded fit into the memory budget next to whatever stays."""
+        budget = int(self.config.memory_budget_gb * 1024**3)
+        loaded = [m["id"] for m in self.client.get_loaded_models(max_age=LMStudioClient.STATE_TTL)]
+        # Models loaded by someone else count against the budget too
+        victims = [m for m in self._resident if m in loaded] + [m for m in loaded if m not in self._resident]
+        victims = [m for m in victims if m not in to_load]
+        used = sum(self._footprint(m) for m in victims)
+        need = sum(self._footprint(m) for m in to_load if m not in loaded)
+        unloaded = False
+        while victims and used + need > budget:
+            victim = victims.pop(0)
+            if self._unload_model(victim):
+                used -= self._footprint(victim)
+                unloaded = True
+        if unloaded:
+            self._post_unload_delay(True)
+
+    def _run_distributed(self, models: list[str]) -> dict[str, dict]:
+        """Spread the models over config.server_url and config.servers, one
+        worker thread per host, each with its own client and loaded-model
+        state. Writer, stores, journal and progress stay shared. Returns
+        per-host throughput keyed by server URL."""
+        cfg = self.config
+        events = self.events
+        self._hosts = [self] + [self._spawn_host(url) for url in cfg.servers if url != cfg.server_url]
+        self.events = HostEvents(events, cfg.server_url)
+        if cfg.memory_budget_gb:
+            self._set_status("Memory budget scheduling is not used across several hosts.", error=True)
+        for model_id in models:
+            self._set_label(model_id, "waiting", "⏳ waiting…")
+        self._pause_event.wait()
+
+        work = WorkQueue([job for job in map(self._plan_model, models) if job] if not self._stop_flag else [])
+        events.status(f"Distributing {len(models)} model(s) over {len(self._hosts)} hosts: "
+                      f"{', '.join(host_label(h.config.server_url) for h in self._hosts)}")
+        threads = [threading.Thread(target=host._host_worker, args=(work,), name=f"host-{i}", daemon=True)
+                   for i, host in enumerate(self._hosts)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        for item in work.leftovers():
+            job = item["job"]
+            if item["saved"]:
+                self.writer.submit(self._finish_model, job, item["saved"], WorkQueue.aggregate_tps(item))
+            elif self._stop_flag:
+                self._set_label(job["model"], "waiting", "")
+            else:
+                self._set_label(job["model"], "load_fail", "✗ no host could load it")
+                self._record_failure(job["model"], len(job["cells"]))
+            if not self._stop_flag:
+                self._mark_done(job["model"])
+        if self._stop_flag:
+            events.status("Batch aborted by user.")
+        for host in self._hosts[1:]:
+            host.client.close()
+        self.events = events
+        return {host.config.server_url: host.host_stats for host in self._hosts}
+
+    def _spawn_host(self, url: str) -> "BatchRunner":
+        host = BatchRunner(replace(self.config, server_url=url, servers=[]), events=HostEvents(self.events, url))
+        host._parent = self
+        for name in ("writer", "spans", "results", "cache", "journal", "stages", "readiness", "bench", "profiles",
+                     "residency", "deadlines", "breaker", "_pause_event", "_session_id", "_filename_fmt", "_cells", "_resumed"):
+            setattr(host, name, getattr(self, name))
+        return host
+
+    def _host_worker(self, work: WorkQueue):
+        """One host's side of a distributed run: take jobs until there is
+        nothing left it can do. Its last model stays loaded between jobs, in
+        case cells handed back by another host make it the best taker."""
+        url = self.config.server_url
+        start = time.time()
+        try:
+            available = {m["id"] for m in self.client.fetch_catalog()}
+        except Exception as e:
+            self._drop_out(f"unreachable ({e})")
+            return
+        loaded = [m["id"] for m in self.client.get_loaded_models(max_age=LMStudioClient.STATE_TTL)]
+        self._resident = [m for m in loaded if m in self.config.models]
+        self._known_empty = not loaded
+        if self.residency:
+            self._claim_warm()
+        try:
+            while not self._stop_flag:
+                self._pause_event.wait()
+                job = work.take(url, self._resident, available, should_stop=lambda: self._stop_flag)
+                if job is None or not self._run_share(work, job):
+                    break
+            self._release_resident()
+        finally:
+            stats = self.host_stats
+            stats["tps"] = stats["tokens"] / stats["busy"] if stats["busy"] > 0 else 0.0
+            stats["wall"] = time.time() - start
+
+    def _run_share(self, work: WorkQueue, job: dict) -> bool:
+        """Load the job's model if needed and drain its cells a chunk at a
+        time. Returns False when this host stopped responding."""
+        cfg = self.config
+        url = cfg.server_url
+        model_id = job["model"]
+        if not job["cached"] and model_id not in self._resident:
+            self._set_label(model_id, "loading", "⟳ loading…")
+            if not self._load_model(model_id):
+                alive = self._stop_flag or self._host_alive()
+                work.release(model_id, url, failed=True)
+                if not alive:
+                    self._drop_out(f"stopped responding while loading {model_id}")
+                elif not self._stop_flag:
+                    self._set_status(f"Could not load {model_id}, leaving it to the other hosts.", error=True)
+                return alive
+
+        self.host_stats["models"] += 1
+        if not job["cached"]:
+            self._warm_up(model_id)
+            self._note_deadline(model_id)
+        chunk = max(1, cfg.concurrency)
+        while not self._stop_flag:
+            cells = work.next_cells(model_id, chunk)
+            if not cells:
+                break
+            start = time.time()
+            saved, agg_tps, failed = self._generate_cells(
+                model_id, cells, chunk, self._session_id, cfg.output_folder, self._filename_fmt, cfg.file_ext,
+                len(cfg.prompts) > 1, cfg.max_wait,
+                lambda frac, n=len(cells): self._report_progress(model_id, work.fraction(model_id, frac, n)))
+            wall = time.time() - start
+            requeue = []
+            if failed and not self._host_alive():
+                # Hand the cells this host failed back; their error placeholders get overwritten
+                requeue = [cell for cell, _ in failed]
+                lost = {id(fut) for _, fut in failed}
+                saved = [fut for fut in saved if id(fut) not in lost]
+            work.completed(model_id, cells, saved, requeue)
+            work.add_rate(model_id, url, agg_tps * wall, wall)
+            self.host_stats["cells"] += len(cells) - len(requeue)
+            self.host_stats["tokens"] += agg_tps * wall
+            self.host_stats["busy"] += wall
+            if requeue:
+                work.release(model_id, url)
+                self._drop_out(f"stopped responding while generating with {model_id}")
+                return False
 
-    def _restore_ui(self):
-        self.root.after(0, lambda: self.start_btn.configure(state="normal"))
-        self.root.after(0, lambda: self.pause_btn.configure(state="disabled", text="⏸ Pause"))
-        self.root.after(0, lambda: self.stop_btn.configure(state="disabled"))
-        self.root.after(0, lambda: self.open_folder_btn.configure(state="normal"))
-        self._pause_event.set()
+        item = work.release(model_id, url)
+        if item:
+            self.writer.submit(self._finish_model, job, item["saved"], WorkQueue.aggregate_tps(item))
+            self._mark_done(model_id)
+        return True
 
-    # ──────────────────────────────────────────────
-    #  Button callbacks
-    # ──────────────────────────────────────────────
-    def _browse_folder(self):
-        folder = filedialog.askdirectory()
-        if folder:
-            self.folder_var.set(folder)
-
-    def _stop_batch(self):
-        # Override behavior: Break the batch instantly, force unload everything to kill current generation
-        self._set_status("Abort requested! Killing generation and clearing memory...")
-        self._stop_flag = True
-        self._pause_event.set()
-        
-        # Fire off an asynchronous force-unload to break the current generation block
-        threading.Thread(target=self._force_unload_all, daemon=True).start()
-
-    def _start_batch(self):
-        sys_prompt    = self.sys_prompt_text.get("1.0", tk.END).strip()
-        prompt        = self.prompt_text.get("1.0", tk.END).strip()
-        output_folder = self.folder_var.get().strip()
-        filename_fmt  = self.filename_fmt_var.get().strip()
-        
-        raw_max_wait  = self.max_wait_var.get().strip()
-        max_wait = None
-        if raw_max_wait and raw_max_wait != "0":
-            try:
-                max_wait = float(raw_max_wait)
-            except ValueError:
-                messagebox.showerror("Error", "Invalid Max Wait Time.")
+    def _host_alive(self) -> bool:
+        try:
+            self.client.list_models_v0()
+            return True
+        except Exception:
+            return False
+
+    def _drop_out(self, reason: str):
+        self.host_stats["dropped"] = reason
+        self._resident.clear()
+        self._set_status(f"Host dropped out: {reason}", error=True)
+
+    def _plan_model(self, model_id: str) -> dict | None:
+        """Work out what a model still needs: the cells left to run (after a
+        resume) and whether it has to be loaded at all. Returns None when
+        the model is already complete."""
+        cells = self._cells
+        model_cells = cells
+        if self._resumed:
+            finished_cells = self._resumed["saved"].get(model_id, set())
+            model_cells = [c for c in cells if cell_key(*c) not in finished_cells]
+            if model_id in self._resumed["finished"] or not model_cells:
+                self._set_label(model_id, "done", "✓ done (resumed)")
+                self._mark_done(model_id)
+                return None
+
+        cached = self.config.reuse_cached and self._all_cached(model_id, model_cells)
+        return {"model": model_id, "cells": model_cells, "already_saved": len(cells) - len(model_cells),
+                "cached": cached, "needs_load": not cached and model_id not in self._resident}
+
+    def _load_job(self, job: dict, exclusive: bool) -> bool:
+        model_id = job["model"]
+        if self._stop_flag:
+            return False
+        if job["cached"]:
+            # Every cell is a cache hit: no need to load the model at all
+            self._set_status(f"All {len(job['cells'])} response(s) for {model_id} cached, skipping load.")
+            return True
+        if not job["needs_load"]:
+            # Left resident by an earlier group or the interrupted run we are resuming
+            self._set_status(f"{model_id} is still loaded, reusing it.")
+            return True
+
+        self._set_label(model_id, "loading", "⟳ loading…")
+        ok = self._load_model(model_id, exclusive=exclusive)
+        if not ok or self._stop_flag:
+            if not self._stop_flag:
+                self._set_label(model_id, "load_fail", "✗ load fail")
+                self._record_failure(model_id, len(job["cells"]))
+            else:
+                self._set_label(model_id, "waiting", "")
+            self._mark_done(model_id)
+            return False
+        return True
+
+    def _generate_model(self, job: dict):
+        cfg = self.config
+        model_id = job["model"]
+        concurrency = max(1, cfg.concurrency)
+
+        if not job["cached"]:
+            self._warm_up(model_id)
+            self._note_deadline(model_id)
+        pending, agg_tps, _ = self._generate_cells(model_id, job["cells"], concurrency, self._session_id,
+                                                cfg.output_folder, self._filename_fmt, cfg.file_ext,
+                                                len(cfg.prompts) > 1, cfg.max_wait,
+                                                lambda frac: self._report_progress(model_id, frac))
+        # Queued behind this model's own writes, so the batch thread can move
+        # on to unloading while the files are still being saved
+        self.writer.submit(self._finish_model, job, pending, agg_tps)
+
+    def _finish_model(self, job: dict, pending: list[Future], agg_tps: float):
+        model_id = job["model"]
+        concurrency = max(1, self.config.concurrency)
+        n_cells = len(self._cells)
+        saved = sum(1 for fut in pending if fut.result()) + job["already_saved"]
+        throughput = f" · {agg_tps:.1f} tok/s" if concurrency > 1 and not job["cached"] else ""
+        if job["cached"]:
+            throughput = " (cached)"
+        if saved == n_cells:
+            self._set_label(model_id, "done", f"✓ done{throughput}")
+            self._journal("model_done", model=model_id)
+        elif self._stop_flag:
+            # Cut short by stop(): what is missing gets redone on resume, it didn't fail
+            self._set_label(model_id, "stopped", f"■ stopped ({saved}/{n_cells} saved)")
+            self._journal("model_stopped", model=model_id, saved=saved)
+        else:
+            if self.breaker and self.breaker.tripped(model_id):
+                state = "partial" if saved else "save_fail"
+                self._set_label(model_id, state, f"✗ skipped after repeated failures ({saved}/{n_cells} saved)")
+            elif saved:
+                self._set_label(model_id, "partial", f"✗ {saved}/{n_cells} saved")
+            else:
+                self._set_label(model_id, "save_fail", "✗ failed")
+            self._journal("model_failed", model=model_id, saved=saved)
+            self._record_failure(model_id, n_cells - saved)
+        if concurrency > 1:
+            self._set_status(f"{model_id}: {saved}/{n_cells} cells, aggregate {agg_tps:.2f} tok/s "
+                             f"across {concurrency} parallel requests.")
+
+    def _warm_up(self, model_id: str):
+        """Benchmark mode: throwaway requests right after the load, so the
+        timed repeats don't include cold-start effects."""
+        cfg = self.config
+        if not self.bench or cfg.warmup <= 0 or not cfg.prompts:
+            return
+        p = cfg.prompts[0]
+        payload = self._build_payload(model_id, p["system"], p["prompt"], (cfg.sweep or [None])[0])
+        self._set_label(model_id, "generating", "⟳ warming up…")
+        for i in range(cfg.warmup):
+            if self._stop_flag:
                 return
+            with self.spans.span("warmup", model=model_id, attempt=i + 1) as span:
+                _, stats = self._generate(model_id, payload, cfg.max_wait, observe=False)
+                span["status"] = stats["status"]
 
-        if not prompt:
-            messagebox.showerror("Error", "User Prompt cannot be empty.")
+    def _note_deadline(self, model_id: str):
+        cfg = self.config
+        if not self.deadlines:
             return
-        if not output_folder:
-            messagebox.showerror("Error", "Output folder cannot be empty.")
+        deadline = self.deadlines.deadline(model_id, cfg.max_wait, cfg.max_tokens)
+        if deadline != cfg.max_wait:
+            self._set_status(f"{model_id}: generation deadline {format_duration(deadline)} from observed throughput "
+                             f"({cfg.deadline_factor:g}× expected time).")
+
+    def _write_benchmark_report(self, summary: dict) -> dict:
+        """Write <session>_benchmark.json next to the outputs and report noisy models."""
+        cfg = self.config
+        models = self.bench.report()
+        report = {"session_id": summary["session_id"], "created": time.time(),
+                  "settings": {"warmup": cfg.warmup, "repeats": cfg.repeats, "max_cv": cfg.max_cv,
+                               "prompts": len(cfg.prompts), "max_tokens": cfg.max_tokens,
+                               "temperature": cfg.temperature, "sweep": cfg.sweep,
+                               "servers": [cfg.server_url, *cfg.servers]},
+                  "models": models}
+        path = os.path.join(cfg.output_folder, f"{summary['session_id']}_benchmark.json")
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+        except OSError as e:
+            self._set_status(f"Could not write benchmark report: {e}", error=True)
+            path = None
+        for model_id, r in models.items():
+            o = r["overall"]
+            if o["decode_tps"]["n"]:
+                noisy = f" · NOISY ({', '.join(r['noisy'])} over {100 * cfg.max_cv:.0f}% CV)" if r["noisy"] else ""
+                self._set_status(f"{model_id}: decode {o['decode_tps']['median']:.1f} tok/s median "
+                                 f"(sd {o['decode_tps']['stddev']:.1f}), TTFT p95 {o['ttft']['p95']:.3f}s, "
+                                 f"latency p95 {o['latency']['p95']:.2f}s{noisy}")
+        return {"path": path, "models": models}
+
+    def _claim_warm(self) -> str | None:
+        """Adopt the model an earlier batch kept warm on this server, so a job
+        that needs it skips the load. A model idle past its TTL is unloaded
+        instead; one this batch doesn't use is cleared by the first load."""
+        url = self.config.server_url
+        try:
+            model_id, expired = self.residency.claim(url)
+        except OSError as e:
+            self._set_status(f"Warm model state unavailable: {e}", error=True)
+            return None
+        if expired:
+            idle = time.time() - expired["parked"]
+            self._set_status(f"Unloading {expired['model']}: idle {format_duration(idle)}, "
+                             f"past its {format_duration(expired['ttl'])} keep-warm TTL.")
+            self._unload_model(expired["model"])
+            return None
+        loaded = self.client.get_loaded_models(max_age=LMStudioClient.STATE_TTL)
+        if not model_id or model_id not in [m["id"] for m in loaded]:
+            return None
+        if model_id not in self._resident:
+            self._resident.append(model_id)
+        self._currently_loaded_model = model_id
+        self._known_empty = False
+        self._set_status(f"{model_id} was kept warm by the previous batch.")
+        return model_id
+
+    def _release_resident(self):
+        """End of a run: unload what is still resident, except that with
+        keep_warm the most recently loaded model is parked for the next batch.
+        After a stop without unload nothing is unloaded, and the model in use
+        is parked so the next batch can pick up where this one stopped."""
+        cfg = self.config
+        cancelled = self._stop_flag and not self._stop_unload
+        warm = None
+        if (cancelled or cfg.keep_warm and not self._stop_flag) and self.residency and self._resident:
+            warm = self._resident[-1]
+        if not cancelled:
+            for model_id in list(self._resident):
+                if model_id != warm:
+                    self._unload_model(model_id)
+        if not warm:
             return
-        if not os.path.isdir(output_folder):
-            messagebox.showerror("Error", "Output folder does not exist.")
+        try:
+            self.residency.park(cfg.server_url, warm, cfg.idle_ttl)
+        except OSError as e:
+            self._set_status(f"Could not keep {warm} warm: {e}", error=True)
+            self._unload_model(warm)
             return
-        if "{model}" not in filename_fmt:
-            if not messagebox.askyesno("Warning", "Filename format lacks {model} placeholder.\nOverwrites may occur.\nContinue?"):
-                return
+        self._set_status(f"Keeping {warm} loaded for the next batch "
+                         f"(unloaded after {format_duration(cfg.idle_ttl)} idle).")
 
-        selected_count = sum(1 for v in self._model_vars.values() if v.get())
-        if selected_count == 0:
-            messagebox.showerror("Error", "No models selected.")
+    def _post_unload_delay(self, unload_ok: bool):
+        delay = self.config.delay
+        if delay <= 0:
             return
+        if self.config.adaptive_waits and unload_ok:
+            # Memory release was already confirmed by the server
+            self.readiness.record(0.0, delay)
+        else:
+            self._set_status(f"Waiting {delay}s…")
+            with self.spans.span("delay"):
+                self._cancel.wait(delay)
+
+    def _report_progress(self, model_id: str, fraction: float):
+        if self._parent:
+            return self._parent._report_progress(model_id, fraction)
+        with self._progress_lock:
+            self._fractions[model_id] = fraction
+            done, processed = self._done, sum(self._fractions.values())
+        self.events.progress(done, len(self.config.models), processed)
+
+    def _mark_done(self, model_id: str):
+        if self._parent:
+            return self._parent._mark_done(model_id)
+        with self._progress_lock:
+            self._done += 1
+            self._fractions[model_id] = 1.0
+            done, processed = self._done, sum(self._fractions.values())
+        self.events.progress(done, len(self.config.models), processed)
+
+    def _record_failure(self, model_id: str, cells: int):
+        """Count a model that ended without all of its cells saved, for the
+        summary and the headless exit code."""
+        if self._parent:
+            return self._parent._record_failure(model_id, cells)
+        with self._progress_lock:
+            self._failed_models.add(model_id)
+            self._failed_cells += cells
+
+    def _adopt_resident(self, model_id: str | None):
+        """After a crash, find out what the server still has loaded. The model
+        the interrupted run left resident is kept if it is still there, so a
+        resume doesn't reload it; anything else gets cleared on the next load."""
+        loaded = [m["id"] for m in self.client.get_loaded_models(max_age=LMStudioClient.STATE_TTL)]
+        if model_id and model_id in loaded:
+            self._currently_loaded_model = model_id
+            self._resident = [model_id]
+            self._known_empty = False
+            if len(loaded) > 1:
+                for m in self.client.get_loaded_models(max_age=LMStudioClient.STATE_TTL):
+                    if m["id"] != model_id:
+                        self.client.unload(m["id"], m["instance_id"])
+        else:
+            self._known_empty = not loaded
+
+    def _generate_cells(self, model_id: str, cells: list[tuple[dict, int | None]], concurrency: int,
+                        session_id: str, output_folder: str, filename_fmt: str, file_ext: str,
+                        tag_prompt: bool, max_wait: float | None, on_progress) -> tuple[list[Future], float, list]:
+        """Run all (prompt, sample) cells against the resident model with up to
+        `concurrency` requests in flight. Each cell is handed to the writer
+        stage as soon as it completes. Returns one future per cell (True once
+        a successful generation is saved), the aggregate throughput (completion tokens
+        across all requests / wall time) and the (cell, future) pairs whose
+        generation failed."""
+        n_cells = len(cells)
+        results: list[dict | None] = [None] * n_cells
+        completed = 0
+        start_time = time.time()
 
-        self._stop_flag = False
-        self._pause_event.set()
-        self.progress_bar.set(0)
-        self.open_folder_btn.configure(state="disabled")
-        self.start_btn.configure(state="disabled")
-        self.pause_btn.configure(state="normal", text="⏸ Pause")
-        self.stop_btn.configure(state="normal")
-
-        for mid, lbl in self._model_labels.items():
-            if self._model_vars[mid].get():
-                lbl.configure(text="⬤ queued", text_color="gray")
-            else:
-                lbl.configure(text="", text_color="gray")
-
-        threading.Thread(
-            target=self._run_batch,
-            args=(sys_prompt, prompt, output_folder, filename_fmt, max_wait),
-            daemon=True
-        ).start()
-
-    def _toggle_pause(self):
-        if self._pause_event.is_set():
-            self._pause_event.clear()
-            self.pause_btn.configure(text="▶ Resume")
-            self._set_status("Paused (will wait after current operation).")
+        def run(idx: int):
+            self._pause_event.wait()
+            if self._stop_flag:
+                return resolved(False), None
+            if self.breaker and self.breaker.tripped(model_id):
+                return resolved(False), {"status": "skipped", "time_taken": 0.0, "tps": 0.0}
+            p, sample, params = cells[idx]
+            return self._process_prompt(model_id, p, sample, session_id, output_folder,
+                                        filename_fmt, file_ext, tag_prompt, max_wait, params)
+
+        def collect(idx: int, saved: Future, stats: dict | None):
+            nonlocal completed
+            completed += 1
+            results[idx] = {"saved": saved, "stats": stats}
+            on_progress(completed / n_cells)
+            if (self.breaker and stats and not stats.get("cached") and stats["status"] in ("ok", "error", "timeout")
+                    and self.breaker.record(model_id, stats["status"] == "ok")):
+                self._set_status(f"Circuit breaker: {model_id} failed {self.breaker.threshold} generations in a "
+                                 f"row, skipping its remaining cells.", error=True)
+            if concurrency > 1 and not self._stop_flag:
+                self._set_label(model_id, "generating", f"⟳ generating {completed}/{n_cells}…")
+
+        if concurrency > 1 and n_cells > 1:
+            self._set_label(model_id, "generating", f"⟳ generating ×{min(concurrency, n_cells)}…")
+            with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="gen") as pool:
+                futures = {pool.submit(run, idx): idx for idx in range(n_cells)}
+                for fut in as_completed(futures):
+                    collect(futures[fut], *fut.result())
         else:
-            self._pause_event.set()
-            self.pause_btn.configure(text="⏸ Pause")
-            self._set_status("Resumed.")
-
-    def _open_output_folder(self):
-        folder = self._last_output_folder or self.folder_var.get().strip()
-        if not folder or not os.path.isdir(folder):
-            messagebox.showerror("Error", "Output folder not found.")
+            for idx in range(n_cells):
+                if self._stop_flag:
+                    break
+                progress = f" {idx + 1}/{n_cells}" if n_cells > 1 else ""
+                self._set_label(model_id, "generating", f"⟳ generating{progress}…")
+                saved, stats = run(idx)
+                collect(idx, saved, stats)
+
+        wall = time.time() - start_time
+        tokens = sum(r["stats"].get("completion_tokens", 0) for r in results
+                     if r and r["stats"] and not r["stats"].get("cached"))
+        saved = [r["saved"] for r in results if r]
+        failed = [(cells[idx], r["saved"]) for idx, r in enumerate(results)
+                  if r and r["stats"] and r["stats"]["status"] != "ok"]
+        return saved, (tokens / wall) if wall > 0 else 0.0, failed
+
+    def _all_cached(self, model_id: str, cells: list[tuple[dict, int | None]]) -> bool:
+        if not self.cache:
+            return False
+        return all(self.cache.contains(ResponseCache.fingerprint(
+                       self._build_payload(model_id, p["system"], p["prompt"], params), sample))
+                   for p, sample, params in cells)
+
+    def _process_prompt(self, model_id: str, p: dict, sample: int | None, session_id: str, output_folder: str,
+                        filename_fmt: str, file_ext: str, tag_prompt: bool, max_wait: float | None,
+                        params: dict | None = None) -> tuple[Future, dict | None]:
+        """Generate one (model, prompt, sample, params) cell and queue it for the writer
+        stage. Returns a future that resolves to whether a successful
+        generation was saved, plus the generation stats. In streaming mode the file is opened up
+        front and tokens are appended as they arrive."""
+        safe_name = self._sanitize(model_id)
+        # Ensure extension isn't duplicated
+        base_filename = (filename_fmt.replace("{model}", safe_name)
+                                     .replace("{session}", session_id)
+                                     .replace("{prompt}", self._sanitize(p["id"]))
+                                     .replace("{sample}", str(sample or 1))
+                                     .replace("{params}", params_label(params)))
+        if not base_filename.endswith(file_ext):
+            base_filename += file_ext
+        filepath = os.path.join(output_folder, base_filename)
+        prompt_id = p["id"] if tag_prompt else None
+        if sample:
+            prompt_id = f"{p['id']} (sample {sample})"
+        stats = None
+        payload = self._build_payload(model_id, p["system"], p["prompt"], params)
+        cache_key = ResponseCache.fingerprint(payload, sample)
+        write_files = self.config.write_files
+        cell = {"model": model_id, "cell": cell_key(p, sample, params), "file": filepath if write_files else None,
+                "file_ext": file_ext, "session": session_id, "prompt": p["id"], "sample": sample,
+                "prompt_id": prompt_id, "params": params, "cache_key": cache_key}
+
+        try:
+            hit = self.cache.get(cache_key) if self.cache and self.config.reuse_cached else None
+            if hit:
+                stats = dict(hit["stats"], cached=True)
+                return self.writer.submit(self._write_cell, cell, hit["content"], stats, True), stats
+
+            start = time.time()
+            if self.config.stream and write_files:
+                skip_thinking = self.config.skip_thinking
+                parser = ReasoningParser()
+                side = {"file": None, "first_answer": None, "reasoning": [], "answer": []}
+                with open(filepath, "w", encoding="utf-8") as f:
+                    self._write_header(f, file_ext, model_id, session_id, prompt_id, params)
+                    last_flush = [0.0]
+
+                    def write(text):
+                        f.write(text)
+                        # Keep the file readable while generating without flushing every token
+                        if time.time() - last_flush[0] > 0.5:
+                            f.flush()
+                            last_flush[0] = time.time()
+
+                    def route(segments):
+                        for kind, seg in segments:
+                            side[kind].append(seg)
+                            if kind == "reasoning":
+                                if self.config.reasoning_file:
+                                    if side["file"] is None:
+                                        side["file"] = open(self._reasoning_path(filepath, file_ext), "w", encoding="utf-8")
+                                        self._write_header(side["file"], file_ext, model_id, session_id,
+                                                           prompt_id, params)
+                                    side["file"].write(seg)
+                                continue
+                            if side["first_answer"] is None:
+                                if not seg.strip():
+                                    continue
+                                side["first_answer"] = time.time()
+                                seg = seg.lstrip() if skip_thinking else seg
+                            if skip_thinking:
+                                write(seg)
+
+                    def on_token(text):
+                        if not skip_thinking:
+                            write(text)
+                        route(parser.feed(text))
+                        self.events.token(model_id, cell["cell"], text)
+
+                    try:
+                        content, stats = self._generate(model_id, payload, max_wait, on_token=on_token)
+                        route(parser.finish())
+                    finally:
+                        if side["file"]:
+                            side["file"].close()
+                    self.stages["generate"].record(time.time() - start)
+                    self._add_reasoning_stats(stats, parser, start, side["first_answer"])
+                    self._generate_span(cell, stats, start)
+                    self._journal("generated", model=model_id, cell=cell["cell"], status=stats["status"])
+                    self._write_footer(f, file_ext, stats)
+
+                # Nothing was streamed (error placeholder): rewrite the finished cell. Likewise when
+                # reasoning under a pre-opened <think> outlasted the parser's holdback and went out
+                # as answer: the whole-text split is what the results store gets, so the files match it
+                rewrite = not last_flush[0]
+                if not rewrite and (skip_thinking or self.config.reasoning_file):
+                    reasoning, answer, _ = split_reasoning(content)
+                    rewrite = (reasoning, answer) != ("".join(side["reasoning"]), "".join(side["answer"]))
+                return self.writer.submit(self._write_cell, cell, content, stats, rewrite), stats
+
+            on_token = (lambda text: self.events.token(model_id, cell["cell"], text)) if self.config.stream else None
+            content, stats = self._generate(model_id, payload, max_wait, on_token=on_token)
+            self.stages["generate"].record(time.time() - start)
+            if not self.config.stream:
+                self.events.token(model_id, cell["cell"], content)
+            self._generate_span(cell, stats, start)
+            self._journal("generated", model=model_id, cell=cell["cell"], status=stats["status"])
+            if self._stop_flag:
+                return resolved(False), stats
+            return self.writer.submit(self._write_cell, cell, content, stats, True), stats
+        except Exception as e:
+            self._set_status(f"Save failed for {model_id}: {e}", error=True)
+            return resolved(False), stats
+
+    def _generate_span(self, cell: dict, stats: dict, start: float):
+        if stats.get("prompt_eval") is not None:
+            self.spans.add("prompt_eval", stats["prompt_eval"], start=start, model=cell["model"], cell=cell["cell"])
+        if self.bench:
+            params = cell["params"]
+            self.bench.add(cell["model"], f"{cell['prompt']} @{params_label(params)}" if params else cell["prompt"],
+                           stats)
+        self.spans.add("generate", time.time() - start, start=start, model=cell["model"], cell=cell["cell"],
+                       status=stats["status"], prompt_tokens=stats.get("prompt_tokens"),
+                       completion_tokens=stats.get("completion_tokens"),
+                       cached_prompt_tokens=stats.get("cached_prompt_tokens"), ttft=stats.get("ttft"),
+                       reasoning_tokens=stats.get("reasoning_tokens"), reasoning_time=stats.get("reasoning_time"))
+
+    @staticmethod
+    def _add_reasoning_stats(stats: dict, parser: ReasoningParser, start: float | None = None,
+                             first_answer_at: float | None = None):
+        """Add reasoning/answer token counts (and, for streamed runs, the time
+        from the first token to the first answer token) to a stats dict."""
+        if not parser.reasoning_chars:
             return
-        if sys.platform == "win32":
-            os.startfile(folder)
-        elif sys.platform == "darwin":
-            subprocess.Popen(["open", folder])
+        reasoning, answer = parser.token_split(stats.get("completion_tokens", 0))
+        stats.update(reasoning_tokens=reasoning, answer_tokens=answer, reasoning_truncated=parser.truncated)
+        if start is not None and "ttft" in stats:
+            end = first_answer_at or (start + stats["time_taken"])
+            stats["reasoning_time"] = max(0.0, end - (start + stats["ttft"]))
+
+    def _write_cell(self, cell: dict, content: str, stats: dict, write_file: bool) -> bool:
+        """Writer stage: filter, serialize and save one finished cell, then
+        cache it and mark it saved in the journal. Runs on the writer thread.
+        Returns True only for a successful generation: error and partial
+        cells are written but still count as missing."""
+        with self.spans.span("save", model=cell["model"], cell=cell["cell"], cached=stats.get("cached")):
+            return self._save_cell(cell, content, stats, write_file)
+
+    def _save_cell(self, cell: dict, content: str, stats: dict, write_file: bool) -> bool:
+        model_id = cell["model"]
+        try:
+            reasoning, answer, parser = split_reasoning(content)
+            if "reasoning_tokens" not in stats:
+                self._add_reasoning_stats(stats, parser)
+            text = answer.strip() if self.config.skip_thinking else content
+            if write_file and cell["file"]:
+                self._write_output(cell["file"], cell["file_ext"], model_id, cell["session"], cell["prompt_id"],
+                                   text, stats, cell["params"])
+                if self.config.reasoning_file and reasoning.strip():
+                    with open(self._reasoning_path(cell["file"], cell["file_ext"]), "w", encoding="utf-8") as f:
+                        self._write_header(f, cell["file_ext"], model_id, cell["session"], cell["prompt_id"],
+                                           cell["params"])
+                        f.write(reasoning.strip())
+            if self.results:
+                self.results.add(cell["session"], model_id, cell["prompt"], cell["sample"], text, stats,
+                                 self.config.model_sizes.get(model_id), cell["file"], cell["params"])
+            if stats.get("cached"):
+                self._journal("saved", model=model_id, cell=cell["cell"], file=cell["file"], cached=True)
+                return True
+            if self.cache and stats["status"] == "ok":
+                self.cache.put(cell["cache_key"], model_id, content, stats)
+            # Partial (timed out / aborted) and failed cells are redone on resume
+            if stats["status"] != "ok":
+                return False
+            self._journal("saved", model=model_id, cell=cell["cell"], file=cell["file"])
+            return True
+        except Exception as e:
+            self._set_status(f"Save failed for {model_id}: {e}", error=True)
+            return False
+
+    @staticmethod
+    def _reasoning_path(filepath: str, file_ext: str) -> str:
+        base = filepath[:-len(file_ext)] if filepath.endswith(file_ext) else filepath
+        return f"{base}_reasoning{file_ext}"
+
+    @classmethod
+    def _write_output(cls, filepath: str, file_ext: str, model_id: str, session_id: str,
+                      prompt_id: str | None, content: str, stats: dict, params: dict | None = None):
+        with open(filepath, "w", encoding="utf-8") as f:
+            cls._write_header(f, file_ext, model_id, session_id, prompt_id, params)
+            f.write(content)
+            cls._write_footer(f, file_ext, stats)
+
+    @staticmethod
+    def _write_header(f, file_ext: str, model_id: str, session_id: str, prompt_id: str | None,
+                      params: dict | None = None):
+        sampling = ", ".join(f"{k}={v}" for k, v in params.items()) if params else None
+        # Write markdown headers if format is markdown
+        if file_ext == ".md":
+            f.write(f"# Model: {model_id}\n")
+            f.write(f"**Session:** {session_id}\n\n")
+            if prompt_id:
+                f.write(f"**Prompt:** {prompt_id}\n\n")
+            if sampling:
+                f.write(f"**Parameters:** {sampling}\n\n")
+            f.write("---\n\n")
         else:
-            subprocess.Popen(["xdg-open", folder])
+            f.write(f"Model: {model_id}\n")
+            f.write(f"Session: {session_id}\n")
+            if prompt_id:
+                f.write(f"Prompt: {prompt_id}\n")
+            if sampling:
+                f.write(f"Parameters: {sampling}\n")
+            f.write("=" * 60 + "\n")
+
+    @staticmethod
+    def _write_footer(f, file_ext: str, stats: dict):
+        metrics = [
+            ("Generation Time", f"{stats['time_taken']:.2f}s"),
+            ("Tokens Per Second (TPS)", f"{stats['tps']:.2f}"),
+        ]
+        if "ttft" in stats:
+            metrics += [
+                ("Time To First Token", f"{stats['ttft']:.2f}s"),
+                ("Prompt Eval Time", f"{stats['prompt_eval']:.2f}s"),
+                ("Decode TPS", f"{stats['decode_tps']:.2f}"),
+            ]
+        elif stats.get("prompt_eval") is not None:
+            metrics.append(("Prompt Eval Time", f"{stats['prompt_eval']:.2f}s"))
+        if stats.get("attempts"):
+            metrics.append(("Attempts", str(stats["attempts"])))
+        if stats.get("cached_prompt_tokens"):
+            metrics.append(("Cached Prompt Tokens", f"{stats['cached_prompt_tokens']} of {stats.get('prompt_tokens', 0)}"))
+        if stats.get("reasoning_tokens"):
+            share = 100 * stats["reasoning_tokens"] / max(1, stats.get("completion_tokens") or 0)
+            metrics.append(("Reasoning Tokens", f"{stats['reasoning_tokens']} ({share:.0f}% of output)"))
+            if "reasoning_time" in stats:
+                metrics.append(("Reasoning Time", f"{stats['reasoning_time']:.2f}s"))
+            if stats.get("reasoning_truncated"):
+                metrics.append(("Reasoning", "unterminated (cut off before the closing tag)"))
+        if stats.get("cached"):
+            metrics.append(("Source", "response cache"))
+        if stats.get("status") != "ok" and "ttft" in stats:
+            metrics.append(("Status", f"Partial output ({stats['status']}: {stats['detail']})"))
+
+        if file_ext == ".md":
+            f.write("\n\n---\n\n")
+            f.write("\n\n".join(f"*{label}:* {value}" for label, value in metrics) + "\n")
+        else:
+            f.write("\n\n" + "-" * 60 + "\n")
+            f.write("".join(f"{label}: {value}\n" for label, value in metrics))
 
     @staticmethod
     def _sanitize(name: str) -> str:
@@ -722,7 +3376,370 @@ class LMStudioBatchApp:
         return name
 
 
+# ──────────────────────────────────────────────
+#  Command line
+# ──────────────────────────────────────────────
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="lm_batch_runner",
+        description="Batch-run prompts across LM Studio models. Without a command the GUI is launched.")
+    sub = parser.add_subparsers(dest="command")
+
+    sub.add_parser("gui", help="Launch the GUI (default)")
+
+    models = sub.add_parser("models", help="List the models in the LM Studio catalog")
+    models.add_argument("--server", default="http://localhost:1234", help="LM Studio base URL")
+
+    resume = sub.add_parser("resume", help="Resume an interrupted session from its journal")
+    resume.add_argument("journal", help="<session>_journal.jsonl from the session's output folder")
+    resume.add_argument("--server", nargs="+", metavar="URL",
+                        help="LM Studio base URL(s) (default: the ones the session used)")
+
+    report = sub.add_parser("report", help="Leaderboard of models ranked by throughput and latency")
+    report.add_argument("--db", default=DEFAULT_RESULTS_PATH, help="Results store (default: %(default)s)")
+    scope = report.add_mutually_exclusive_group()
+    scope.add_argument("--session", help="Only this session (default: every session in the store)")
+    scope.add_argument("--latest", action="store_true", help="Only the most recent session")
+    report.add_argument("--markdown", action="store_true", help="Print a Markdown table")
+    report.add_argument("-o", "--output", help="Write the report to this file instead of stdout")
+
+    export = sub.add_parser("export", help="Write one output file per stored response of a session")
+    export.add_argument("session", help="Session id (see 'report')")
+    export.add_argument("-o", "--output", required=True, help="Output folder (created if missing)")
+    export.add_argument("--db", default=DEFAULT_RESULTS_PATH, help="Results store (default: %(default)s)")
+    export.add_argument("--format", choices=[".md", ".txt"], default=".md", help="Output file format")
+    export.add_argument("--filename-fmt", default="{session}_{model}_{prompt}_s{sample}",
+                        help="Placeholders: {model}, {session}, {prompt}, {sample}, {params}")
+
+    profiles = sub.add_parser("profiles", help="Show, set or clear per-model load profiles")
+    profiles.add_argument("model", nargs="?", help="Model to set or clear (default: list every profile)")
+    profiles.add_argument("options", nargs="*", metavar="KEY=VALUE",
+                          help=f"Load options: {', '.join(LOAD_PROFILE_KEYS)}")
+    profiles.add_argument("--clear", action="store_true", help="Remove the model's profile")
+    profiles.add_argument("--path", default=DEFAULT_PROFILES_PATH, help="Profile store (default: %(default)s)")
+
+    evict = sub.add_parser("evict", help="Unload models that --keep-warm runs left loaded")
+    evict.add_argument("--server", metavar="URL", help="Only this server (default: every server with a warm model)")
+    evict.add_argument("--path", default=DEFAULT_RESIDENCY_PATH, help="Warm model state (default: %(default)s)")
+
+    run = sub.add_parser("run", help="Run a batch headless")
+    run.add_argument("--server", nargs="+", default=["http://localhost:1234"], metavar="URL",
+                     help="LM Studio base URL; give several to spread the models over those hosts")
+    run.add_argument("--models", nargs="+", metavar="MODEL",
+                     help="Model ids to run, in order (default: every model in the catalog)")
+    src = run.add_mutually_exclusive_group(required=True)
+    src.add_argument("--prompt", help="Single user prompt")
+    src.add_argument("--prompt-file", help="Prompt set (.jsonl/.csv with prompt, optional system and id)")
+    run.add_argument("--system", default="", help="System prompt (default for prompt-set rows without one)")
+    run.add_argument("-o", "--output", required=True, help="Output folder (created if missing)")
+    run.add_argument("--format", choices=[".md", ".txt"], default=".md", help="Output file format")
+    run.add_argument("--filename-fmt", default="{session}_{model}_response",
+                     help="Placeholders: {model}, {session}, {prompt}, {sample}, {params}")
+    run.add_argument("--skip-thinking", action="store_true",
+                     help="Strip reasoning (<think>…</think> and similar blocks) from the output")
+    run.add_argument("--reasoning-file", action="store_true",
+                     help="Save each response's reasoning to a <file>_reasoning side file")
+    run.add_argument("--max-tokens", type=int, default=-1)
+    run.add_argument("--temperature", type=float, help="Default: model default")
+    run.add_argument("--max-wait", type=float, default=3600, help="Generation timeout in seconds (0 = infinite)")
+    run.add_argument("--no-adaptive-deadlines", action="store_true",
+                     help="Give every generation --max-wait instead of a per-model deadline from observed throughput")
+    run.add_argument("--deadline-factor", type=float, default=3.0,
+                     help="Safety factor on expected tokens ÷ observed TPS (default: %(default)g)")
+    run.add_argument("--min-deadline", type=float, default=60.0, metavar="SECONDS",
+                     help="Shortest per-model deadline (default: %(default)g)")
+    run.add_argument("--retries", type=int, default=2,
+                     help="Extra attempts for transient load/generation failures (default: %(default)s)")
+    run.add_argument("--retry-backoff", type=float, default=2.0, metavar="SECONDS",
+                     help="Delay before the first retry, doubled for each further one (default: %(default)g)")
+    run.add_argument("--breaker", type=int, default=3, metavar="N",
+                     help="Skip a model's remaining cells after N failed generations in a row (0 = never)")
+    run.add_argument("--delay", type=int, default=5, help="Seconds to wait after each unload")
+    run.add_argument("--fixed-waits", action="store_true",
+                     help="Use fixed sleeps around load/unload instead of adaptive polling")
+    run.add_argument("--stream", action="store_true", help="Stream responses and report TTFT")
+    run.add_argument("--reuse-cache", action="store_true",
+                     help="Serve identical requests from the response cache; models whose every cell is cached are not loaded")
+    run.add_argument("--no-cache", action="store_true", help="Neither read nor write the response cache")
+    run.add_argument("--cache-max-mb", type=int, default=512, help="Response cache size limit (LRU eviction)")
+    run.add_argument("--concurrency", type=int, default=1, help="Parallel requests per loaded model")
+    run.add_argument("--samples", type=int, default=1, help="Generations per prompt")
+    run.add_argument("--benchmark", action="store_true",
+                     help="Benchmark mode: warmup requests, then timed streamed repeats of every prompt; "
+                          "writes <session>_benchmark.json with mean/median/p95/stddev per model")
+    run.add_argument("--warmup", type=int, default=1, help="Benchmark: discarded requests after each load")
+    run.add_argument("--repeats", type=int, default=5, help="Benchmark: timed repeats of every prompt")
+    run.add_argument("--max-cv", type=float, default=0.15,
+                     help="Benchmark: flag results whose stddev/mean exceeds this (default: %(default)s)")
+    run.add_argument("--sweep", metavar="SPEC",
+                     help="Run every sampling parameter set under one load: a grid such as "
+                          "'temperature=0.2,0.7 top_p=0.9,1' or a JSON list of objects "
+                          f"({', '.join(SWEEP_PARAMS)})")
+    run.add_argument("--results-db", default=DEFAULT_RESULTS_PATH, metavar="PATH",
+                     help="Results store every generation is appended to (default: %(default)s)")
+    run.add_argument("--no-results", action="store_true", help="Don't record generations in the results store")
+    run.add_argument("--no-files", action="store_true",
+                     help="Only record to the results store, no per-response output files")
+    run.add_argument("--no-metrics-log", action="store_true",
+                     help="Don't write <session>_metrics.jsonl timing spans to the output folder")
+    run.add_argument("--metrics-textfile", metavar="PATH",
+                     help="Keep a Prometheus textfile snapshot of per-phase timings and token counts at PATH")
+    run.add_argument("--profiles", default=DEFAULT_PROFILES_PATH, metavar="PATH",
+                     help="Per-model load profiles, updated with the profile that loaded (default: %(default)s)")
+    run.add_argument("--no-load-fallback", action="store_true",
+                     help="Give up on a failed load instead of retrying with smaller context / less offload")
+    run.add_argument("--no-prefix-order", action="store_true",
+                     help="Send prompts in prompt-set order instead of grouping shared prompt prefixes")
+    run.add_argument("--keep-warm", action="store_true",
+                     help="Leave the last model loaded so the next batch can reuse it (default: unload every model)")
+    run.add_argument("--idle-ttl", type=float, default=600.0, metavar="SECONDS",
+                     help="Unload a model kept warm once it has been idle this long (default: %(default)g)")
+    run.add_argument("--memory-budget", type=float, metavar="GB",
+                     help="Co-load models whose sizes fit in this RAM/VRAM budget and run them concurrently")
+    run.add_argument("--model-overhead", type=float, default=0.5, metavar="GB",
+                     help="Extra memory assumed per loaded model when packing (context/KV cache)")
+    return parser
+
+
+def config_from_args(args: argparse.Namespace, client: LMStudioClient) -> BatchConfig:
+    if args.prompt_file:
+        prompts = load_prompt_set(args.prompt_file)
+        if not prompts:
+            raise ValueError("Prompt set is empty.")
+        for p in prompts:
+            if p["system"] is None:
+                p["system"] = args.system
+    else:
+        prompts = [{"id": "prompt", "system": args.system, "prompt": args.prompt}]
+
+    models = args.models or [m["id"] for m in client.fetch_catalog()]
+    os.makedirs(args.output, exist_ok=True)
+    return BatchConfig(
+        models=models,
+        prompts=prompts,
+        output_folder=args.output,
+        server_url=args.server[0],
+        servers=args.server[1:],
+        filename_fmt=args.filename_fmt,
+        file_ext=args.format,
+        skip_thinking=args.skip_thinking,
+        reasoning_file=args.reasoning_file,
+        max_tokens=args.max_tokens,
+        temperature=args.temperature,
+        max_wait=args.max_wait or None,
+        adaptive_deadlines=not args.no_adaptive_deadlines,
+        deadline_factor=args.deadline_factor,
+        min_deadline=args.min_deadline,
+        retries=max(0, args.retries),
+        retry_backoff=args.retry_backoff,
+        breaker_threshold=max(0, args.breaker),
+        delay=args.delay,
+        adaptive_waits=not args.fixed_waits,
+        cache_path=None if args.no_cache else DEFAULT_CACHE_PATH,
+        reuse_cached=args.reuse_cache,
+        cache_max_mb=args.cache_max_mb,
+        stream=args.stream,
+        concurrency=args.concurrency,
+        samples=args.samples,
+        sweep=parse_sweep(args.sweep or ""),
+        benchmark=args.benchmark,
+        warmup=args.warmup,
+        repeats=args.repeats,
+        max_cv=args.max_cv,
+        load_profiles_path=args.profiles,
+        load_fallback=not args.no_load_fallback,
+        prefix_order=not args.no_prefix_order,
+        keep_warm=args.keep_warm,
+        idle_ttl=args.idle_ttl,
+        results_db=None if args.no_results else args.results_db,
+        write_files=not args.no_files,
+        metrics_log=not args.no_metrics_log,
+        metrics_textfile=args.metrics_textfile,
+        memory_budget_gb=args.memory_budget,
+        model_overhead_gb=args.model_overhead,
+    )
+
+
+def run_headless(args: argparse.Namespace) -> int:
+    client = LMStudioClient(args.server[0], pool_size=max(10, args.concurrency + 4))
+    try:
+        config = config_from_args(args, client)
+    except Exception as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    return run_config(config, client)
+
+
+def resume_headless(args: argparse.Namespace) -> int:
+    try:
+        config = BatchConfig.from_journal(args.journal)
+    except Exception as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    if args.server:
+        config.server_url, config.servers = args.server[0], args.server[1:]
+    return run_config(config, LMStudioClient(config.server_url, pool_size=max(10, config.concurrency + 4)))
+
+
+def run_config(config: BatchConfig, client: LMStudioClient) -> int:
+    runner = BatchRunner(config, client=client, events=ConsoleEvents())
+    result = {}
+    worker = threading.Thread(target=lambda: result.update(runner.run()), daemon=True)
+    worker.start()
+    try:
+        # join() with a timeout keeps the main thread responsive to Ctrl+C
+        while worker.is_alive():
+            worker.join(0.5)
+    except KeyboardInterrupt:
+        # First Ctrl+C cancels the requests and keeps the model loaded, a second one unloads it too
+        print("Cancelling… press Ctrl+C again to also unload the model.", file=sys.stderr)
+        runner.stop(unload=False)
+        deadline = time.time() + UNLOAD_TIMEOUT
+        while worker.is_alive() and time.time() < deadline:
+            try:
+                worker.join(0.5)
+            except KeyboardInterrupt:
+                runner.stop(unload=True)
+        return 130
+    finally:
+        client.close()
+    if result.get("phases"):
+        print("\n" + SpanRecorder.format_table(result["phases"]), file=sys.stderr)
+    if result.get("benchmark"):
+        print("\n" + BenchmarkStats.format_table(result["benchmark"]["models"]), file=sys.stderr)
+        if result["benchmark"]["path"]:
+            print(f"Benchmark report: {result['benchmark']['path']}", file=sys.stderr)
+    if result.get("stopped") or result.get("failed_models") or result.get("failed_cells"):
+        return 1
+    return 0 if result.get("done") == result.get("total") else 1
+
+
+def report_results(args: argparse.Namespace) -> int:
+    if not os.path.exists(args.db):
+        print(f"No results store at {args.db}", file=sys.stderr)
+        return 1
+    store = ResultsStore(args.db)
+    try:
+        session = args.session
+        if args.latest:
+            sessions = store.sessions()
+            session = sessions[-1] if sessions else None
+        board = store.leaderboard(session)
+    finally:
+        store.close()
+    if not board:
+        print("No successful generations recorded" + (f" for session {session}" if session else "") + ".",
+              file=sys.stderr)
+        return 1
+    title = f"Leaderboard – session {session}" if session else "Leaderboard – all sessions"
+    text = f"{'# ' if args.markdown else ''}{title}\n\n{ResultsStore.format_leaderboard(board, args.markdown)}\n"
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text, end="")
+    return 0
+
+
+def export_results(args: argparse.Namespace) -> int:
+    """Recreate the per-response file view of a session from the results store."""
+    store = ResultsStore(args.db)
+    try:
+        rows = store.rows(args.session)
+    finally:
+        store.close()
+    if not rows:
+        print(f"Session {args.session} not found in {args.db}", file=sys.stderr)
+        return 1
+    os.makedirs(args.output, exist_ok=True)
+    for r in rows:
+        name = (args.filename_fmt.replace("{model}", BatchRunner._sanitize(r["model_id"]))
+                                 .replace("{session}", r["session"])
+                                 .replace("{prompt}", BatchRunner._sanitize(r["prompt_id"]))
+                                 .replace("{sample}", str(r["sample"] or 1))
+                                 .replace("{params}", params_label(r["params"])))
+        if not name.endswith(args.format):
+            name += args.format
+        stats = {k: r[k] for k in ("status", "time_taken", "tps", "ttft", "prompt_eval", "decode_tps")
+                 if r[k] is not None}
+        stats.update(cached=bool(r["cached"]), detail="")
+        stats.setdefault("time_taken", 0.0)
+        stats.setdefault("tps", 0.0)
+        BatchRunner._write_output(os.path.join(args.output, name), args.format, r["model_id"], r["session"],
+                                  r["prompt_id"], r["content"], stats, r["params"])
+    print(f"Wrote {len(rows)} file(s) to {args.output}", file=sys.stderr)
+    return 0
+
+
+def list_models(args: argparse.Namespace) -> int:
+    client = LMStudioClient(args.server)
+    try:
+        catalog = client.fetch_catalog()
+    except Exception as e:
+        print(f"Error connecting to LM Studio: {e}", file=sys.stderr)
+        return 1
+    finally:
+        client.close()
+    for m in catalog:
+        print(f"{m['id']}\t{m['size_str']}" if m["size_str"] else m["id"])
+    return 0
+
+
+def manage_profiles(args: argparse.Namespace) -> int:
+    try:
+        store = LoadProfiles(args.path)
+        if args.model and args.clear:
+            store.set(args.model, None)
+        elif args.model:
+            store.set(args.model, parse_load_profile(args.options))
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    for model_id, entry in store.entries().items():
+        if args.model and model_id != args.model:
+            continue
+        line = f"{model_id}\t{describe_profile(entry.get('profile', {}))}"
+        if "succeeded" in entry and entry["succeeded"] != entry.get("profile"):
+            line += f"\t(last loaded with {describe_profile(entry['succeeded'])})"
+        print(line)
+    return 0
+
+
+def evict_warm(args: argparse.Namespace) -> int:
+    residency = ModelResidency(args.path)
+    servers = [args.server] if args.server else list(residency.entries())
+    for server_url in servers:
+        model_id = residency.evict(server_url)
+        if model_id:
+            print(f"{server_url}\tunloaded {model_id}")
+    return 0
+
+
+def launch_gui() -> int:
+    # Deferred so headless runs never pay for (or require) Tk/CustomTkinter
+    import lm_batch_gui
+    lm_batch_gui.main()
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_arg_parser().parse_args(argv)
+    if args.command == "run":
+        return run_headless(args)
+    if args.command == "resume":
+        return resume_headless(args)
+    if args.command == "models":
+        return list_models(args)
+    if args.command == "report":
+        return report_results(args)
+    if args.command == "export":
+        return export_results(args)
+    if args.command == "profiles":
+        return manage_profiles(args)
+    if args.command == "evict":
+        return evict_warm(args)
+    return launch_gui()
+
+
 if __name__ == "__main__":
-    root = ctk.CTk()
-    app  = LMStudioBatchApp(root)
-    root.mainloop()
+    sys.exit(main())